@@ -0,0 +1,3 @@
+"""
+Benchmarks of the framework - scripts, run from the repository's root directory (see their docstrings).
+"""
@@ -0,0 +1,101 @@
+"""
+Benchmark for running several hypotheses of the same turn (e.g. the top-k programs of the NLU) on copies of a dialogue
+context: one turn after the other, each on a copy made by `make_copy_with_pack`, vs. `OpenDFDialogue.copy_contexts`
+and `OpenDFDialogue.run_turn_batch` (with one thread, and with several threads).
+
+The context is the context of a long dialogue, made of the turns of the dialogues of an examples file (see
+`bench_snapshot.run_long_dialogue`), and the hypotheses are the (distinct) turns of the examples file.
+
+With the (default) in-memory SQLite database, `run_turn_batch` runs the turns one after the other whatever the number
+of threads (see `threads_share_connection`) - the threads are measured with a database file or server (see
+`DF_DB_PATH` in opendf/defs.py).
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_batch_turns.py -t 30 -k 20 -w 4
+"""
+import argparse
+import importlib.machinery
+import logging
+import time
+
+from benchmarks.bench_snapshot import run_long_dialogue
+from opendf.applications import SMCalFlowEnvironment
+from opendf.defs import config_log
+from opendf.main import OpenDFDialogue
+
+logger = logging.getLogger(__name__)
+
+
+def describe_results(results):
+    return [(type(ex).__name__ if ex else None, answers) for _, ex, _, answers in results]
+
+
+def run_one_by_one(dialogue, d_context, hypotheses):
+    results = []
+    for p_exp in hypotheses:
+        copy = d_context.make_copy_with_pack()
+        try:
+            results.append(dialogue.run_single_turn(p_exp, copy, False, copy.goals[-1] if copy.goals else None))
+        except Exception as ex:
+            results.append((None, ex, copy, []))
+    return results
+
+
+def run_batch(dialogue, d_context, hypotheses, workers):
+    copies = OpenDFDialogue.copy_contexts(d_context, len(hypotheses))
+    return dialogue.run_turn_batch(list(zip(copies, hypotheses)), workers=workers)
+
+
+def run_benchmark(examples_file, n_turns, k, workers, rounds):
+    dialogs = importlib.machinery.SourceFileLoader("dialogs", examples_file).load_module().dialogs
+    hypotheses = list(dict.fromkeys(t for d in dialogs for t in d))[:k]
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.CRITICAL)  # the turns are quite verbose, and some hypotheses fail
+    try:
+        with SMCalFlowEnvironment() as environment:
+            dialogue = OpenDFDialogue()
+            d_context = run_long_dialogue(examples_file, n_turns, environment)
+            logger.info(f"context: {n_turns} turns, {len(d_context.idx_to_node)} nodes; "
+                        f"{len(hypotheses)} hypotheses")
+            methods = [('one by one (make_copy_with_pack)', lambda: run_one_by_one(dialogue, d_context, hypotheses)),
+                       ('run_turn_batch, 1 thread', lambda: run_batch(dialogue, d_context, hypotheses, 1)),
+                       (f'run_turn_batch, {workers} threads', lambda: run_batch(dialogue, d_context, hypotheses,
+                                                                                workers))]
+            expected = None
+            for name, run in methods:
+                best = None
+                for _ in range(rounds):
+                    start = time.perf_counter()
+                    results = describe_results(run())
+                    t = time.perf_counter() - start
+                    best = t if best is None or t < best else best
+                expected = expected if expected is not None else results
+                logger.info(f"{name:<35} {best * 1000:9.1f} ms   {best * 1000 / len(hypotheses):7.2f} ms per "
+                            f"hypothesis   same results: {results == expected}")
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for running the hypotheses of a turn on copies of the dialogue context.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to take the turns from")
+    parser.add_argument("--turns", "-t", type=int, default=30, help="number of turns of the dialogue (the context)")
+    parser.add_argument("--hypotheses", "-k", type=int, default=20, help="number of hypotheses")
+    parser.add_argument("--workers", "-w", type=int, default=4, help="number of threads for the parallel batch")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.turns, arguments.hypotheses, arguments.workers,
+                      arguments.rounds)
+    finally:
+        logging.shutdown()
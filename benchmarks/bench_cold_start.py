@@ -0,0 +1,84 @@
+"""
+Benchmark for the cold start of a process: importing `opendf.main` and loading the node types of SMCalFlow.
+
+Each run is a new Python process (started with `-X importtime`), with the startup options (precomputed parser tables,
+lazy sample nodes) either on (the default) or off. Reports the median times over the runs, and the modules with the
+largest cumulative import time.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_cold_start.py -r 10
+"""
+import argparse
+import json
+import logging
+import os
+import statistics
+import subprocess
+import sys
+
+from opendf.defs import config_log
+
+logger = logging.getLogger(__name__)
+
+CHILD_CODE = """
+import json, time
+start = time.perf_counter()
+import opendf.main
+imported = time.perf_counter()
+from opendf.applications import SMCalFlowEnvironment
+SMCalFlowEnvironment().load_node_factory()
+loaded = time.perf_counter()
+print(json.dumps({'import': imported - start, 'node_types': loaded - imported}))
+"""
+
+MODES = {
+    'startup options on': {'PRECOMPUTED_PARSER_TABLES': 'true', 'LAZY_SAMPLE_NODES': 'true'},
+    'startup options off': {'PRECOMPUTED_PARSER_TABLES': 'false', 'LAZY_SAMPLE_NODES': 'false'},
+}
+
+
+def run_child(variables):
+    env = dict(os.environ, **variables)
+    process = subprocess.run([sys.executable, "-X", "importtime", "-c", CHILD_CODE], env=env, capture_output=True,
+                             text=True, check=True)
+    timings = json.loads(process.stdout.strip().splitlines()[-1])
+    imports = {}  # { module : cumulative import time in seconds }
+    for line in process.stderr.splitlines():
+        if line.startswith("import time:") and "|" in line:
+            _, cumulative, module = line[len("import time:"):].split("|")
+            if cumulative.strip().isdigit():
+                imports[module.strip()] = int(cumulative) / 1e6
+    return timings, imports
+
+
+def run_benchmark(rounds, top):
+    imports = {}
+    for name, variables in MODES.items():
+        results = [run_child(variables) for _ in range(rounds)]
+        t_import = statistics.median(t['import'] for t, _ in results)
+        t_types = statistics.median(t['node_types'] for t, _ in results)
+        logger.info(f"{name:<20}  import opendf.main: {t_import * 1000:7.1f} ms   load node types: "
+                    f"{t_types * 1000:7.1f} ms   total: {(t_import + t_types) * 1000:7.1f} ms")
+        imports = results[-1][1]
+    logger.info("largest cumulative import times:")
+    for module, t in sorted(imports.items(), key=lambda x: -x[1])[:top]:
+        logger.info(f"    {t * 1000:7.1f} ms  {module}")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the cold start of a process (import and node type loading).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--rounds", "-r", type=int, default=10, help="number of processes per mode")
+    parser.add_argument("--top", "-t", type=int, default=10, help="number of modules to show")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.rounds, arguments.top)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,138 @@
+"""
+Benchmark for the reuse of one database connection per turn (`turn_database_connection`), with one connection per
+query (the original behaviour) vs. one connection per turn. Reports the number of connection checkouts, the number of
+queries and the time of:
+  - `dialogues`: the dialogues of an examples file, each in a new context;
+  - `clash checks`: the checks of the suggestion search of `SimpleEventFactory` (`check_clash`: is the location free,
+    is each attendee free) for the slots of a week, in one turn.
+
+With the default in-memory SQLite database a checkout is cheap (the engine keeps a single connection); a SQLite file,
+whose engine opens a new connection for each checkout, is closer to a database server:
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_connection_scope.py -r 3
+DF_DB_PATH=sqlite+pysqlite:////tmp/opendf_bench.db PYTHONPATH=$(pwd) python benchmarks/bench_connection_scope.py
+"""
+import argparse
+import importlib.machinery
+import logging
+import time
+from contextlib import nullcontext
+from datetime import timedelta
+
+from sqlalchemy import event
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log, EnvironmentDefinition, get_system_datetime
+from opendf.main import OpenDFDialogue
+from opendf.utils.database_utils import connection_scope
+
+logger = logging.getLogger(__name__)
+
+
+def run_dialogues(environment, dialogs):
+    dialogue = OpenDFDialogue()
+    answers = []
+    for turns in dialogs:
+        Database.get_instance().clear_cache()
+        d_context = environment.get_new_context()
+        gl = None
+        for p_exp in turns:
+            try:
+                gl, _, d_context, turn_answers = dialogue.run_single_turn(p_exp, d_context, False, gl)
+                answers.append(turn_answers)
+            except Exception as ex:
+                answers.append(type(ex).__name__)
+    return answers
+
+
+def check_clashes(database, attendees, location):
+    """
+    Checks, as `SimpleEventFactory.check_clash`, the clashes of the 30 minutes slots of the 7 days after the system
+    date, within the scope of a turn (if `turn_database_connection`).
+
+    :return: the free slots
+    :rtype: List[datetime]
+    """
+    day = get_system_datetime().replace(hour=0, minute=0, second=0, microsecond=0)
+    slots = [day + timedelta(minutes=30 * i) for i in range(7 * 48)]
+    free = []
+    with connection_scope() if EnvironmentDefinition.get_instance().turn_database_connection else nullcontext():
+        for start in slots:
+            end = start + timedelta(minutes=30)
+            if database.is_location_free(location, start, end) and \
+                    all(database.is_recipient_free(i, start, end) for i in attendees):
+                free.append(start)
+    return free
+
+
+def run_benchmark(examples_file, rounds):
+    dialogs = importlib.machinery.SourceFileLoader("dialogs", examples_file).load_module().dialogs
+    environment_definitions = EnvironmentDefinition.get_instance()
+    turn_database_connection = environment_definitions.turn_database_connection
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.CRITICAL)  # the dialogues are quite verbose
+    try:
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            engine = database.engine
+            attendees = [e.recipient.identifier for e in database.get_events()[0].attendees]
+            location = database.get_events()[0].location.name
+            workloads = [('dialogues', lambda: run_dialogues(environment, dialogs)),
+                         ('clash checks', lambda: check_clashes(database, attendees, location))]
+            counts = {'checkout': 0, 'before_cursor_execute': 0}
+
+            def counter(name):
+                def count(*args):
+                    counts[name] += 1
+                return count
+
+            listeners = [(engine.pool, 'checkout', counter('checkout')),
+                         (engine, 'before_cursor_execute', counter('before_cursor_execute'))]
+            for target, name, listener in listeners:
+                event.listen(target, name, listener)
+            try:
+                for workload, run in workloads:
+                    expected = None
+                    for reuse in [False, True]:
+                        environment_definitions.turn_database_connection = reuse
+                        best = None
+                        for _ in range(rounds):
+                            counts.update({name: 0 for name in counts})
+                            start = time.perf_counter()
+                            result = run()
+                            t = time.perf_counter() - start
+                            best = t if best is None or t < best else best
+                        expected = expected if expected is not None else result
+                        mode = 'one connection per turn ' if reuse else 'one connection per query'
+                        logger.info(f"{workload:<12} {mode}  {counts['checkout']:6d} checkouts  "
+                                    f"{counts['before_cursor_execute']:6d} queries  {best * 1000:9.1f} ms   "
+                                    f"same result: {result == expected}")
+            finally:
+                for target, name, listener in listeners:
+                    event.remove(target, name, listener)
+    finally:
+        environment_definitions.turn_database_connection = turn_database_connection
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the reuse of one database connection per turn.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to run")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.rounds)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,127 @@
+"""
+Benchmark for the entity cache shared by the dialogues (`entity_cache_size`), which keeps the entries of the DB
+entities and the templates of their graphs: with the cache disabled (each dialogue reads the entries, and constructs
+and evaluates the graphs), vs. enabled (the graphs are instantiated from the templates). Reports the number of SQL
+queries, the number of graphs instantiated from templates and the time of:
+  - `event graphs`: the graphs of all the events of a calendar, each time in a new context (as many users of the same
+    DB would);
+  - `dialogues`: the dialogues of an examples file, each in a new context.
+
+Each workload is run once to fill the cache (which is not cleared afterwards), then `rounds` times; the contexts built
+in both modes must be the same (nodes, ids, results).
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_entity_cache.py -n 1000 -r 3
+"""
+import argparse
+import importlib.machinery
+import logging
+import time
+
+from sqlalchemy import event
+
+from benchmarks.bench_event_queries import add_calendar
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log
+from opendf.main import OpenDFDialogue
+from opendf.utils.database_utils import connection_scope
+
+logger = logging.getLogger(__name__)
+
+
+def describe_context(d_context):
+    return [(i, nd.typename(), nd.evaluated, nd.data, nd.result.id if nd.result is not None else None,
+             [(name, child.id) for name, child in nd.inputs.items()]) for i, nd in d_context.idx_to_node.items()]
+
+
+def build_event_graphs(environment, identifiers, n_contexts):
+    database = Database.get_instance()
+    descriptions = []
+    for _ in range(n_contexts):
+        d_context = environment.get_new_context()
+        with connection_scope():  # as in a turn
+            database.get_event_graphs(identifiers, d_context)
+        descriptions.append(describe_context(d_context))
+    return descriptions
+
+
+def run_dialogues(environment, dialogs):
+    dialogue = OpenDFDialogue()
+    descriptions = []
+    for turns in dialogs:
+        d_context = environment.get_new_context()
+        gl = None
+        for p_exp in turns:
+            try:
+                gl, _, d_context, _ = dialogue.run_single_turn(p_exp, d_context, False, gl)
+            except Exception as ex:
+                descriptions.append(type(ex).__name__)
+        descriptions.append(describe_context(d_context))
+    return descriptions
+
+
+def run_benchmark(examples_file, n_events, n_contexts, rounds):
+    dialogs = importlib.machinery.SourceFileLoader("dialogs", examples_file).load_module().dialogs
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.CRITICAL)  # the dialogues are quite verbose
+    try:
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            cache = database.entity_cache
+            size = cache.size
+            add_calendar(database, n_events)
+            identifiers = [e.identifier for e in database._get_event_entries('all')]
+            workloads = [('event graphs', lambda: build_event_graphs(environment, identifiers, n_contexts)),
+                         ('dialogues', lambda: run_dialogues(environment, dialogs))]
+            queries = []
+            listener = lambda *args: queries.append(None)
+            event.listen(database.engine, 'before_cursor_execute', listener)
+            try:
+                for name, run in workloads:
+                    expected = None
+                    for enabled in [False, True]:
+                        cache.size = size if enabled else 0
+                        database.clear_cache()
+                        run()  # fills the cache
+                        best, hits = None, cache.hits
+                        for _ in range(rounds):
+                            queries.clear()
+                            start = time.perf_counter()
+                            result = run()
+                            t = time.perf_counter() - start
+                            best = t if best is None or t < best else best
+                        expected = expected if expected is not None else result
+                        logger.info(f"{name:<12} cache {'enabled ' if enabled else 'disabled'}  {len(queries):6d} "
+                                    f"queries  {(cache.hits - hits) // rounds:6d} cache hits  {best * 1000:9.1f} ms"
+                                    f"   same contexts: {result == expected}")
+            finally:
+                event.remove(database.engine, 'before_cursor_execute', listener)
+                cache.size = size
+            logger.info(f"{len(cache)} entities in the cache, {cache.evictions} evicted")
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the entity cache shared by the dialogues (entries and graph templates).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to run")
+    parser.add_argument("--events", "-n", type=int, default=1000, help="number of events added to the calendar")
+    parser.add_argument("--contexts", "-c", type=int, default=5,
+                        help="number of contexts the event graphs are built in, in each round")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.events, arguments.contexts, arguments.rounds)
+    finally:
+        logging.shutdown()
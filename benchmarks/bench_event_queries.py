@@ -0,0 +1,130 @@
+"""
+Benchmark for reading events from the SMCalFlow database: the number of SQL queries and the latency, with the original
+implementation (one query for the attendees of each event, and one for each event graph) vs. the current one (the
+attendees of all the events, and the entries of all the event graphs, are read together).
+
+Adds a calendar of random events to the stub database, then measures:
+  - `get_events`: all the events of the current user (`Database.get_events`);
+  - `get_time_overlap_events`: the events overlapping one day;
+  - `FindEvents`: a dialogue turn searching for the events with a given subject (a new context each time, so the
+    event graphs are constructed).
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_event_queries.py -n 10000
+"""
+import argparse
+import logging
+import random
+import time
+from datetime import timedelta
+
+from sqlalchemy import event, insert, select
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log, get_system_datetime
+from opendf.main import OpenDFDialogue
+from test.df.legacy import legacy_database
+
+logger = logging.getLogger(__name__)
+
+SUBJECTS = ['sync', 'review', 'lunch', 'standup', 'planning', 'interview', 'retro', 'demo', 'training', 'call']
+
+
+def add_calendar(database, n_events, seed=0):
+    """
+    Adds `n_events` random events (each with the current user and up to 3 other attendees) to the database, in the
+    60 days around the system date.
+    """
+    rnd = random.Random(seed)
+    with database.engine.connect() as connection:
+        recipients = [row.id for row in connection.execute(select(Database.RECIPIENT_TABLE.columns.id))]
+        locations = [row.id for row in connection.execute(select(Database.LOCATION_TABLE.columns.id))]
+        first_id = database._get_maximum_event_id() + 1
+        start = get_system_datetime().replace(minute=0, second=0, microsecond=0) - timedelta(days=30)
+        events, attendees = [], []
+        for identifier in range(first_id, first_id + n_events):
+            starts_at = start + timedelta(hours=rnd.randrange(60 * 24), minutes=rnd.choice([0, 15, 30, 45]))
+            events.append({'id': identifier, 'subject': rnd.choice(SUBJECTS), 'location_id': rnd.choice(locations),
+                           'organizer_id': database.get_current_recipient_id(), 'starts_at': starts_at,
+                           'ends_at': starts_at + timedelta(minutes=rnd.choice([15, 30, 60, 90]))})
+            others = rnd.sample(recipients, rnd.randint(0, 3))
+            for recipient in set(others + [database.get_current_recipient_id()]):
+                attendees.append({'event_id': identifier, 'recipient_id': recipient, 'show_as_status': 'Busy',
+                                  'response_status': rnd.choice(['Accepted', 'NotResponded'])})
+        connection.execute(insert(Database.EVENT_TABLE), events)
+        connection.execute(insert(Database.EVENT_HAS_ATTENDEE_TABLE), attendees)
+        connection.commit()
+    database.clear_cache()
+
+
+def measure(database, func, rounds):
+    queries = []
+    listener = lambda *args: queries.append(None)
+    event.listen(database.engine, 'before_cursor_execute', listener)
+    try:
+        best, result = None, None
+        for _ in range(rounds):
+            queries.clear()
+            database.clear_cache()
+            start = time.perf_counter()
+            result = func()
+            t = time.perf_counter() - start
+            best = t if best is None or t < best else best
+        return best, len(queries), result
+    finally:
+        event.remove(database.engine, 'before_cursor_execute', listener)
+
+
+def run_benchmark(n_events, rounds):
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)  # the dialogues are quite verbose
+    try:
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            add_calendar(database, n_events)
+            day = get_system_datetime().replace(hour=0, minute=0, second=0, microsecond=0)
+            dialogue = OpenDFDialogue()
+
+            def find_events():
+                _, _, d_context, _ = dialogue.run_single_turn('FindEvents(Event?(subject=LIKE(Str(sync))))',
+                                                               environment.get_new_context(), False, None)
+                return len(d_context.goals[-1].res.inputs) if d_context.goals else 0
+
+            workloads = [
+                ('get_events', lambda: [e.identifier for e in database.get_events()]),
+                ('get_time_overlap_events', lambda: [
+                    (e.identifier, [a.recipient.identifier for a in e.attendees])
+                    for e in database.get_time_overlap_events(day, day + timedelta(days=1), [])]),
+                ('FindEvents', find_events),
+            ]
+            for name, func in workloads:
+                with legacy_database(database):
+                    t_old, q_old, r_old = measure(database, func, rounds)
+                t_new, q_new, r_new = measure(database, func, rounds)
+                size = len(r_new) if isinstance(r_new, list) else r_new
+                logger.info(f"{name:<24} {size:6d} events   original: {q_old:6d} queries {t_old * 1000:9.1f} ms   "
+                            f"current: {q_new:4d} queries {t_new * 1000:9.1f} ms   speedup: {t_old / t_new:5.1f}x   "
+                            f"same result: {r_old == r_new}")
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for reading events from the SMCalFlow database (number of queries and latency).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--events", "-n", type=int, default=10000, help="number of events added to the calendar")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.events, arguments.rounds)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,73 @@
+"""
+Benchmark for building the graphs of DB rows directly (`Node.call_construct_values_eval`) vs. formatting and parsing
+their P-expressions (`Node.call_construct_eval`).
+
+Builds the event graphs (and the recipient graphs) of the stub SMCalFlow database both ways, and reports the rows per
+second. The P-expression cache is disabled, since DB rows rarely repeat.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_graph_builder.py -n 200
+"""
+import argparse
+import logging
+import time
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.applications.smcalflow.domain import event_to_str_node, event_to_values, recipient_to_str_node, \
+    recipient_to_values
+from opendf.defs import config_log, EnvironmentDefinition, NODE_COLOR_DB
+from opendf.graph.nodes.node import Node
+
+logger = logging.getLogger(__name__)
+
+environment_definitions = EnvironmentDefinition.get_instance()
+
+
+def time_it(build, entries, environment):
+    d_context = environment.get_new_context()
+    start = time.perf_counter()
+    for entry in entries:
+        build(entry, d_context)
+    return time.perf_counter() - start
+
+
+def run_benchmark(n_rows):
+    environment_definitions.pexp_cache_size = 0
+    with SMCalFlowEnvironment() as environment:
+        database = Database.get_instance()
+        events = [database.get_event_entry(e.res.get_dat('id'))
+                  for e in database.find_events_that_match(None, environment.get_new_context())]
+        recipients = [a.recipient for e in events for a in e.attendees]
+        for name, entries, to_str, to_values in [('Event', events, event_to_str_node, event_to_values),
+                                                 ('Recipient', recipients, recipient_to_str_node, recipient_to_values)]:
+            entries = (entries * (n_rows // len(entries) + 1))[:n_rows]
+
+            def parsed(entry, d_context):
+                Node.call_construct_eval(to_str(entry), d_context, constr_tag=NODE_COLOR_DB)
+
+            def direct(entry, d_context):
+                Node.call_construct_values_eval(*to_values(entry), d_context, constr_tag=NODE_COLOR_DB)
+
+            t_parsed = time_it(parsed, entries, environment)
+            t_direct = time_it(direct, entries, environment)
+            logger.info(f"{name:<10} {n_rows} rows   P-expression: {n_rows / t_parsed:8.0f} rows/s   "
+                        f"direct: {n_rows / t_direct:8.0f} rows/s   speedup: {t_parsed / t_direct:5.2f}x")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for building the graphs of DB rows directly vs. from P-expressions.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--n_rows", "-n", type=int, default=200, help="number of rows to build")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.n_rows)
+    finally:
+        logging.shutdown()
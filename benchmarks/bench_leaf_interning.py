@@ -0,0 +1,102 @@
+"""
+Benchmark for the sharing of the terminal nodes of DB graphs (`intern_leaf_nodes`).
+
+For each mode (interning off / on), reports the number of nodes, the memory they take and the construction time of:
+  - `events`: the event graphs of the stub database (with their attendees), constructed from their values, as for the
+    results of the DB queries - repeated `rounds` times in the same context, as a dialogue re-reading the DB would;
+  - `dialogue`: one long dialogue, made of the turns of the dialogues of an examples file.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_leaf_interning.py -r 20 -t 60
+"""
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+
+from benchmarks.bench_snapshot import run_long_dialogue
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log, EnvironmentDefinition
+
+logger = logging.getLogger(__name__)
+
+
+def build_event_graphs(environment, rounds):
+    database = Database.get_instance()
+    d_context = environment.get_new_context()
+    identifiers = [e.res.get_dat('id') for e in database.find_events_that_match(None, d_context)]
+    d_context = environment.get_new_context()
+    for _ in range(rounds):
+        database.clear_cache()
+        for identifier in identifiers:
+            database.get_event_graph(identifier, d_context)
+    return d_context
+
+
+def measure(create):
+    """
+    Measures the time and the memory allocated (and kept) by `create()`.
+
+    :return: the created context, the memory (bytes) and the time (seconds)
+    :rtype: Tuple[DialogContext, int, float]
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    start = time.perf_counter()
+    d_context = create()
+    t = time.perf_counter() - start
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return d_context, after - before, t
+
+
+def run_benchmark(examples_file, rounds, n_turns):
+    environment_definitions = EnvironmentDefinition.get_instance()
+    intern_leaf_nodes = environment_definitions.intern_leaf_nodes
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)  # the dialogues are quite verbose
+    try:
+        with SMCalFlowEnvironment() as environment:
+            workloads = [('events', lambda: build_event_graphs(environment, rounds)),
+                         ('dialogue', lambda: run_long_dialogue(examples_file, n_turns, environment))]
+            for name, create in workloads:
+                counts = {}
+                for intern in [False, True]:
+                    environment_definitions.intern_leaf_nodes = intern
+                    Database.get_instance().clear_cache()
+                    d_context, size, t = measure(create)
+                    counts[intern] = len(d_context.idx_to_node)
+                    logger.info(f"{name:<9} interning {'on ' if intern else 'off'}  {counts[intern]:8d} nodes "
+                                f"({len(d_context.interned_nodes):5d} shared)   {size / 2 ** 20:7.1f} MB   "
+                                f"{t * 1000:8.1f} ms")
+                logger.info(f"{name:<9} node count reduced by {1 - counts[True] / counts[False]:.1%}")
+    finally:
+        environment_definitions.intern_leaf_nodes = intern_leaf_nodes
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the sharing of the terminal nodes of DB graphs.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to take the turns from")
+    parser.add_argument("--rounds", "-r", type=int, default=20,
+                        help="number of times the event graphs are constructed (in the same context)")
+    parser.add_argument("--turns", "-t", type=int, default=60, help="number of turns of the dialogue")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.rounds, arguments.turns)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,73 @@
+"""
+Micro-benchmark for `Node.match` vs. the compiled matchers (`Node.compile_match`).
+
+Matches SMCalFlow `Event` constraints against all the nodes of the event graphs of the stub database (like refer does
+with the nodes of the dialog), and reports the matching throughput (candidates/sec) of both versions. The results of
+both versions are compared.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_match.py -r 5
+"""
+import argparse
+import logging
+import time
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log, VIEW
+from opendf.graph.nodes.node import Node
+from test.df.helpers import EVENT_CONSTRAINTS
+
+logger = logging.getLogger(__name__)
+
+
+
+def time_it(func, candidates, repeat):
+    best, res = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func(candidates)
+        t = time.perf_counter() - start
+        best = t if best is None or t < best else best
+    return best, res
+
+
+def run_benchmark(repeat):
+    with SMCalFlowEnvironment() as environment:
+        d_context = environment.get_new_context()
+        events = Database.get_instance().find_events_that_match(None, d_context)
+        candidates = Node.collect_nodes(events)
+        logger.info(f"{len(candidates)} candidates")
+        for sexp in EVENT_CONSTRAINTS:
+            constr, _ = Node.call_construct_eval(sexp, d_context)
+
+            def interpreted(cands):
+                return [n for n in cands if constr.match(n, oview=VIEW.INT, check_level=True)]
+
+            def compiled(cands):
+                matcher = constr.compile_match(oview=VIEW.INT, check_level=True)  # compilation time included
+                return [n for n in cands if matcher(n)]
+
+            t_old, r_old = time_it(interpreted, candidates, repeat)
+            t_new, r_new = time_it(compiled, candidates, repeat)
+            logger.info(f"{sexp[:60]:<60}  match: {len(candidates) / t_old:10.0f}/s   "
+                        f"compiled: {len(candidates) / t_new:10.0f}/s   speedup: {t_old / t_new:5.1f}x   "
+                        f"matches: {len(r_new):3d}   same: {r_old == r_new}")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark for Node.match (interpreted vs compiled) on SMCalFlow Event constraints.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--repeat", "-r", type=int, default=5, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.repeat)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,125 @@
+"""
+Benchmark for the search of the MultiWOZ domains with custom matching (`MultiWozSqlDB.find_elements_that_match`), with
+the original implementation (a graph is built for each row returned by the SQL query, then the graphs are matched) vs.
+the current one (the rows are first checked by the row matcher of the constraint, and the graphs are built only for
+the remaining rows, until enough elements match). Reports the number of rows scanned, of graphs built, and the time of
+each query.
+
+The original implementation matches the first 20 rows of a query, instead of finding up to 20 matches: its result is
+compared with the current one after matching all the rows (which takes the same time, as a graph is built for each row
+anyway).
+
+Random hotels are added to the (empty) MultiWOZ database, unless the data directory of MultiWOZ 2.2 is given - in that
+case, the hotels of the data are used.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_multiwoz_match.py -n 5000
+"""
+import argparse
+import logging
+import random
+import time
+
+from sqlalchemy import insert
+
+from opendf.applications import MultiWOZEnvironment_2_2
+from opendf.applications.multiwoz_2_2.multiwoz_db import MultiWozSqlDB, fill_multiwoz_sql_db
+from opendf.defs import config_log
+from opendf.graph.nodes.node import Node
+from test.df.legacy import legacy_find_elements_that_match
+
+logger = logging.getLogger(__name__)
+
+MAXIMUM_NUMBER_OF_ELEMENTS = 20
+
+QUERIES = [
+    'Hotel?(name=LIKE(Name(cambridge)))',
+    'Hotel?(name=LIKE(Name(house)), area=Area(north))',
+    'Hotel?(area=Area(north))',
+    'Hotel?(area=Area(centre), stars=Stars(4), pricerange=Pricerange(cheap))',
+    'Hotel?(type=Type(guesthouse))',
+    'Hotel?()',
+]
+
+WORDS = ['cambridge', 'acorn', 'alpha', 'milton', 'belfry', 'lodge', 'avalon', 'city', 'centre', 'north', 'park',
+         'bridge', 'gonville', 'lensfield', 'allenbell', 'warkworth', 'finches', 'carolina', 'aylesbray', 'archway']
+
+
+def add_hotels(database, n_hotels, seed=0):
+    rnd = random.Random(seed)
+    rows = []
+    for identifier in range(n_hotels):
+        name = ' '.join(rnd.sample(WORDS, rnd.randint(1, 3)) + [rnd.choice(['hotel', 'guest house', 'lodge'])])
+        rows.append({'id': identifier, 'name': name, 'area': rnd.choice(['north', 'south', 'east', 'west', 'centre']),
+                     'stars': str(rnd.randint(0, 5)), 'pricerange': rnd.choice(['cheap', 'moderate', 'expensive']),
+                     'type': rnd.choice(['hotel', 'guesthouse']), 'parking': rnd.choice(['yes', 'no', None]),
+                     'internet': rnd.choice(['yes', 'no', None]), 'phone': str(1223000000 + identifier)})
+    with database.engine.connect() as connection:
+        connection.execute(insert(MultiWozSqlDB.HOTEL_TABLE), rows)
+        connection.commit()
+    database.clear_cache()
+
+
+def run_benchmark(n_hotels, data_directory, rounds):
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)
+    try:
+        environment = MultiWOZEnvironment_2_2()
+        environment.load_node_factory()
+        database = MultiWozSqlDB.get_instance()
+        database.clear_database()
+        if data_directory:
+            fill_multiwoz_sql_db(data_directory, environment.get_new_context(), domains=['hotel'])
+        else:
+            add_hotels(database, n_hotels)
+        for p_exp in QUERIES:
+            measures = []
+            for legacy in [True, False]:
+                best, result = None, None
+                for _ in range(rounds):
+                    database.clear_cache()
+                    d_context = environment.get_new_context()
+                    operator = Node.call_construct(p_exp, d_context)[0]
+                    start = time.perf_counter()
+                    if legacy:
+                        values, rows = legacy_find_elements_that_match(database, operator, d_context,
+                                                                       maximum_number_of_elements=0)
+                        values = values[:MAXIMUM_NUMBER_OF_ELEMENTS]
+                        graphs = rows
+                    else:
+                        values = database.find_elements_that_match(
+                            operator, d_context, maximum_number_of_elements=MAXIMUM_NUMBER_OF_ELEMENTS)
+                        _, rows, graphs, _ = database.last_match_stats
+                    t = time.perf_counter() - start
+                    best = t if best is None or t < best else best
+                    result = [value.get_dat('name') for value in values]
+                measures.append((rows, graphs, best, result))
+            (rows, g_old, t_old, r_old), (_, g_new, t_new, r_new) = measures
+            logger.info(f"{rows:6d} rows   original: {g_old:6d} graphs {t_old * 1000:9.1f} ms   current: {g_new:6d} "
+                        f"graphs {t_new * 1000:9.1f} ms   {len(r_new):3d} matches   same result: {r_old == r_new}   "
+                        f"{p_exp}")
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the search of the MultiWOZ domains with custom matching (rows scanned vs. graphs "
+                    "built).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--hotels", "-n", type=int, default=5000, help="number of random hotels added to the database")
+    parser.add_argument("--data_directory", "-d", type=str, default=None,
+                        help="the data directory of MultiWOZ 2.2, whose hotels are used instead of the random ones")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.hotels, arguments.data_directory, arguments.rounds)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,111 @@
+"""
+Measures the memory used by nodes - reports the memory (MB) per 100k nodes, and the time to create a node.
+
+Two workloads are measured:
+  - `types`: nodes of the (SMCalFlow) node types, created directly by the node factory - the per node overhead;
+  - `graphs`: the event graphs of the stub database, constructed from their P-expressions (like graphs built from DB
+    results) - nodes with their inputs, tags and results.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_node_memory.py -n 100000
+"""
+import argparse
+import gc
+import logging
+import time
+import tracemalloc
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.applications.smcalflow.domain import event_to_str_node
+from opendf.defs import config_log
+from opendf.graph.node_factory import NodeFactory
+from opendf.graph.nodes.node import Node
+
+logger = logging.getLogger(__name__)
+
+NODE_TYPES = ['Str', 'Int', 'Bool', 'Event', 'Recipient', 'Attendee', 'DateTime', 'Date', 'Time', 'FindEvents',
+              'AND', 'LIKE', 'refer', 'PersonName', 'LocationKeyphrase']
+
+
+def measure(create):
+    """
+    Measures the memory allocated (and kept) by `create()`.
+
+    :return: the memory (bytes) and the number of created nodes
+    :rtype: Tuple[int, int]
+    """
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    nodes = create()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, len(nodes)
+
+
+def measure_time(create, rounds=3):
+    """
+    Measures the time of `create()` (without tracing the memory) - the best of `rounds`.
+
+    :return: the time (seconds) per created node
+    :rtype: float
+    """
+    best = None
+    for _ in range(rounds):
+        gc.collect()
+        start = time.perf_counter()
+        nodes = create()
+        t = (time.perf_counter() - start) / len(nodes)
+        best = t if best is None or t < best else best
+    return best
+
+
+def run_benchmark(n_nodes):
+    node_fact = NodeFactory.get_instance()
+    with SMCalFlowEnvironment() as environment:
+        d_context = environment.get_new_context()
+
+        def create_types():
+            return [node_fact.create_node_from_type_name(d_context, NODE_TYPES[i % len(NODE_TYPES)], False)
+                    for i in range(n_nodes)]
+
+        database = Database.get_instance()
+        events = [database.get_event_entry(e.res.get_dat('id'))
+                  for e in database.find_events_that_match(None, d_context)]
+        sexps = [event_to_str_node(e) for e in events]
+
+        def create_graphs():
+            nodes = []
+            while len(nodes) < n_nodes:
+                for sexp in sexps:
+                    g, _ = Node.call_construct(sexp, d_context)
+                    nodes.extend(g.topological_order())
+            d_context.clear()
+            return nodes
+
+        for name, create in [('types', create_types), ('graphs', create_graphs)]:
+            size, n = measure(create)
+            t = measure_time(create)
+            logger.info(f"{name:<8} {n:8d} nodes   {size / 2 ** 20:8.1f} MB   "
+                        f"{size / n * 100000 / 2 ** 20:8.1f} MB per 100k nodes   {size / n:6.0f} bytes per node   "
+                        f"{t * 1e6:6.2f} us per node")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Measures the memory used by nodes.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--n_nodes", "-n", type=int, default=100000, help="number of nodes to create")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.n_nodes)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,113 @@
+"""
+Benchmark for the order scores of the candidates of refer / revise (`Node.score_by_order`, `Node.rank_by_order`).
+
+Compares the original implementation with the current one (a queue instead of `list.insert(0, ...)`, and the BFS of
+`parent_nodes` stops once all the goals were reached), and checks that the scores are the same:
+ - on a synthetic graph, registered in a context, ranking sets of candidates of different sizes;
+ - on a long dialogue, made of the turns of an examples file - reporting how many candidates were ranked, and the time
+   spent scoring them.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_order_scores.py -n 10000 -t 60
+"""
+import argparse
+import logging
+import random
+import time
+from contextlib import contextmanager
+
+from benchmarks.bench_snapshot import run_long_dialogue
+from opendf.applications import SMCalFlowEnvironment
+from opendf.defs import config_log
+from opendf.graph.dialog_context import DialogContext
+from opendf.graph.nodes.node import Node
+from test.df.helpers import make_random_graph, prepare_graph
+from test.df.legacy import legacy_score_by_order
+
+logger = logging.getLogger(__name__)
+
+
+def make_context(n_nodes):
+    goals = prepare_graph(make_random_graph(n_nodes, n_goals=40))
+    d_context = DialogContext()
+    nodes = Node.collect_nodes(goals, follow_detached=True)
+    for nd in sorted(nodes, key=lambda n: n.id):
+        nd.id = None
+        d_context.register_node(nd)
+    d_context.goals = goals
+    return d_context, nodes
+
+
+def run_synthetic(n_nodes, rounds):
+    d_context, nodes = make_context(n_nodes)
+    rnd = random.Random(0)
+    for n_candidates in [5, 50, 500]:
+        t_old, t_new, same = 0.0, 0.0, True
+        for _ in range(rounds):
+            candidates = rnd.sample(nodes, min(n_candidates, len(nodes)))
+            start = time.perf_counter()
+            old = sorted(candidates, key=lambda n: legacy_score_by_order(n, d_context.goals, True))
+            t_old += time.perf_counter() - start
+            start = time.perf_counter()
+            new = Node.rank_by_order(candidates, d_context.goals, True)
+            t_new += time.perf_counter() - start
+            same = same and old == new
+        logger.info(f"{len(nodes):6d} nodes, {n_candidates:4d} candidates   legacy: {t_old / rounds * 1000:9.2f}ms   "
+                    f"current: {t_new / rounds * 1000:8.2f}ms   speedup: {t_old / t_new:6.1f}x   same: {same}")
+
+
+@contextmanager
+def timed_scores(func):
+    """
+    Replaces `Node.score_by_order` by `func` in the `with` block, counting and timing its calls.
+
+    :return: a dict, which gets the number of calls ('calls') and their total time in seconds ('time')
+    :rtype: Dict[str, float]
+    """
+    counts = {'calls': 0, 'time': 0.0}
+    score_by_order = Node.score_by_order
+
+    def timed(node, goals, follow_res, exc=-50):
+        start = time.perf_counter()
+        s = func(node, goals, follow_res, exc)
+        counts['time'] += time.perf_counter() - start
+        counts['calls'] += 1
+        return s
+
+    Node.score_by_order = timed
+    try:
+        yield counts
+    finally:
+        Node.score_by_order = score_by_order
+
+
+def run_dialogue(examples_file, n_turns):
+    with SMCalFlowEnvironment() as environment:
+        for name, func in [('legacy', legacy_score_by_order), ('current', Node.score_by_order)]:
+            with timed_scores(func) as counts:
+                d_context = run_long_dialogue(examples_file, n_turns, environment)
+            logger.info(f"{name:>8}: {n_turns} turns, {len(d_context.idx_to_node)} nodes, {counts['calls']} scores "
+                        f"in {counts['time'] * 1000:.1f}ms")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the order scores of refer / revise candidates (legacy vs current).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--nodes", "-n", type=int, default=10000, help="number of nodes in the synthetic graph")
+    parser.add_argument("--rounds", "-r", type=int, default=5, help="number of rankings of each size")
+    parser.add_argument("--examples", "-e", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file, whose turns make the dialogue")
+    parser.add_argument("--turns", "-t", type=int, default=60, help="number of turns of the dialogue")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_synthetic(arguments.nodes, arguments.rounds)
+        run_dialogue(arguments.examples, arguments.turns)
+    finally:
+        logging.shutdown()
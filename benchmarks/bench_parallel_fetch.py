@@ -0,0 +1,119 @@
+"""
+Benchmark for the parallel evaluation (`EnvironmentDefinition.parallel_eval`): the rows of the MultiWOZ searches
+(`FindHotel`, `FindRestaurant`... - see `Node.fetch`) of a graph with several tasks are read in parallel, before the
+sequential evaluation builds their graphs. Evaluates the same graph sequentially and in parallel, and checks that the
+results and the exceptions are the same.
+
+Random hotels and restaurants are added to the MultiWOZ database, which must be a file (an in-memory SQLite database
+can't be used by several threads). The round trip to a database server can be simulated by a delay added to each query.
+
+to run (from the repository's root directory):
+DF_DB_PATH=sqlite+pysqlite:////tmp/bench.db PYTHONPATH=$(pwd) python benchmarks/bench_parallel_fetch.py -t 8 -l 5
+"""
+import argparse
+import logging
+import random
+import time
+
+import sqlalchemy
+from sqlalchemy import insert
+
+from opendf.applications import MultiWOZEnvironment_2_2
+from opendf.applications.multiwoz_2_2.multiwoz_db import MultiWozSqlDB
+from opendf.defs import config_log, EnvironmentDefinition
+from opendf.graph.eval import recursive_eval
+from opendf.graph.nodes.node import Node
+from opendf.utils.database_utils import threads_share_connection
+
+logger = logging.getLogger(__name__)
+
+AREAS = ['north', 'south', 'east', 'west', 'centre']
+FOODS = ['chinese', 'italian', 'indian', 'british', 'french']
+WORDS = ['cambridge', 'acorn', 'alpha', 'milton', 'city', 'park', 'bridge', 'golden', 'royal', 'garden']
+
+
+def add_rows(database, n_rows, seed=0):
+    rnd = random.Random(seed)
+    hotels, restaurants = [], []
+    for identifier in range(n_rows):
+        hotels.append({'id': identifier, 'name': ' '.join(rnd.sample(WORDS, 2) + ['hotel']),
+                       'area': rnd.choice(AREAS), 'type': 'hotel', 'stars': str(rnd.randint(0, 5))})
+        restaurants.append({'id': identifier, 'name': ' '.join(rnd.sample(WORDS, 2)), 'area': rnd.choice(AREAS),
+                            'food': rnd.choice(FOODS), 'pricerange': rnd.choice(['cheap', 'moderate', 'expensive'])})
+    with database.engine.connect() as connection:
+        connection.execute(insert(MultiWozSqlDB.HOTEL_TABLE), hotels)
+        connection.execute(insert(MultiWozSqlDB.RESTAURANT_TABLE), restaurants)
+        connection.commit()
+    database.clear_cache()
+
+
+def make_p_exp(n_tasks):
+    tasks = []
+    for i in range(n_tasks):
+        if i % 2:
+            tasks.append('FindRestaurant(Restaurant?(food=LIKE(Food(%s)), area=Area(%s)))' %
+                         (FOODS[i % len(FOODS)], AREAS[i % len(AREAS)]))
+        else:
+            tasks.append('FindHotel(Hotel?(name=LIKE(Name(%s)), area=Area(%s)))' %
+                         (WORDS[i % len(WORDS)], AREAS[i % len(AREAS)]))
+    return 'AND(%s)' % ', '.join(tasks)
+
+
+def run_benchmark(n_rows, n_tasks, latency, rounds):
+    environment = MultiWOZEnvironment_2_2()
+    environment.load_node_factory()
+    database = MultiWozSqlDB.get_instance()
+    if threads_share_connection():
+        logger.error('the database is in memory - set DF_DB_PATH to a file (see the docstring)')
+        return
+    database.clear_database()
+    add_rows(database, n_rows)
+    delay = lambda *args: time.sleep(latency / 1000)
+    sqlalchemy.event.listen(database.engine, 'before_cursor_execute', delay)
+    environment_definitions = EnvironmentDefinition.get_instance()
+    p_exp = make_p_exp(n_tasks)
+    try:
+        measures = []
+        for parallel in [False, True]:
+            best, result = None, None
+            for _ in range(rounds):
+                database.clear_cache()
+                d_context = environment.get_new_context()
+                graph, _ = Node.call_construct(p_exp, d_context)
+                start = time.perf_counter()
+                ok, exs = recursive_eval(graph, [], [], parallel=parallel)
+                t = time.perf_counter() - start
+                best = t if best is None or t < best else best
+                result = (ok, [(e.node.id, e.message) for e in exs], len(d_context.idx_to_node),
+                          [(n.id, n.res.id, n.res.show()) for n in graph.inputs.values()])
+            measures.append((best, result))
+        (t_seq, r_seq), (t_par, r_par) = measures
+        logger.info(f"{n_tasks:3d} tasks  {n_rows:6d} rows  latency {latency:5.1f} ms   sequential: "
+                    f"{t_seq * 1000:8.1f} ms   parallel ({environment_definitions.parallel_eval_workers} workers): "
+                    f"{t_par * 1000:8.1f} ms   speedup: {t_seq / t_par:5.2f}x   same result: {r_seq == r_par}")
+    finally:
+        sqlalchemy.event.remove(database.engine, 'before_cursor_execute', delay)
+        database.clear_database()
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the parallel fetch of the MultiWOZ searches (sequential vs parallel evaluation).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--rows", "-n", type=int, default=2000, help="number of hotels and of restaurants")
+    parser.add_argument("--tasks", "-t", type=int, default=4, help="number of searches in the graph")
+    parser.add_argument("--latency", "-l", type=float, default=5.0,
+                        help="delay added to each query, in ms (round trip to a database server)")
+    parser.add_argument("--rounds", "-r", type=int, default=5, help="number of evaluations of each mode")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        logging.getLogger('opendf').setLevel(logging.ERROR)
+        run_benchmark(arguments.rows, arguments.tasks, arguments.latency, arguments.rounds)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,99 @@
+"""
+Benchmark for the cache of parsed P-expressions (`ast_cache`) and the P-expression templates (`PExpTemplate`).
+
+Replays the SMCalFlow dialogues of an examples file with the cache disabled and enabled, and reports the running
+time and the hit rate of the cache. Then compares, for the P-expressions seen during the replay, parsing with
+copying the cached trees; and, for the attendee P-expressions built from DB rows, formatting and parsing the string
+with binding the values to a template.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_pexp_cache.py -r 3
+"""
+import argparse
+import importlib.machinery
+import logging
+import time
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import ATTENDEE_TEMPLATE
+from opendf.defs import config_log, EnvironmentDefinition
+from opendf.main import run_dialogue
+from opendf.parser.pexp_parser import ast_cache, parser, node_reference
+
+logger = logging.getLogger(__name__)
+
+environment_definitions = EnvironmentDefinition.get_instance()
+
+
+def replay(dialogs, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        for i in range(len(dialogs)):
+            run_dialogue(i, dialogs, SMCalFlowEnvironment(), draw_graph=False)
+    return time.perf_counter() - start
+
+
+def time_it(func, items):
+    start = time.perf_counter()
+    for item in items:
+        func(item)
+    return time.perf_counter() - start
+
+
+def run_benchmark(examples_file, rounds, n_templates):
+    dialogs = importlib.machinery.SourceFileLoader("dialogs", examples_file).load_module().dialogs
+    cache_size = environment_definitions.pexp_cache_size
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)  # the dialogues are quite verbose
+    try:
+        environment_definitions.pexp_cache_size = 0
+        replay(dialogs, 1)  # warm up
+        t_off = replay(dialogs, rounds)
+        environment_definitions.pexp_cache_size = cache_size
+        ast_cache.clear()
+        t_on = replay(dialogs, rounds)
+    finally:
+        opendf_logger.setLevel(level)
+    logger.info(f"replay of {len(dialogs)} dialogues x {rounds}:  no cache: {t_off:6.2f}s   cache: {t_on:6.2f}s   "
+                f"speedup: {t_off / t_on:5.2f}x")
+    info = ast_cache.info()
+    logger.info(f"cache: {info['hits']} hits   {info['misses']} misses   hit rate: {info['hit_rate']:.1%}   "
+                f"size: {info['size']}/{info['max_size']}")
+
+    expressions = list(ast_cache.trees)
+    t_parse = time_it(parser.parse, expressions)
+    t_clone = time_it(ast_cache.parse, expressions)
+    logger.info(f"{len(expressions)} cached P-expressions:  parse: {t_parse * 1000:8.1f} ms   "
+                f"cached copy: {t_clone * 1000:8.1f} ms   speedup: {t_parse / t_clone:5.1f}x")
+
+    rows = [(i, ['Accepted', 'Declined', 'NotResponded'][i % 3], ['Busy', 'Free'][i % 2], 1000 + i)
+            for i in range(n_templates)]
+    t_parse = time_it(lambda r: parser.parse(f"Attendee(recipient=$#{r[0]}, response={r[1]}, show={r[2]}, "
+                                             f"eventid={r[3]})"), rows)
+    t_bind = time_it(lambda r: ATTENDEE_TEMPLATE.bind(recipient=node_reference(r[0]), response=r[1], show=r[2],
+                                                      eventid=r[3]), rows)
+    logger.info(f"{n_templates} attendee rows:  format+parse: {t_parse * 1000:8.1f} ms   "
+                f"template bind: {t_bind * 1000:8.1f} ms   speedup: {t_parse / t_bind:5.1f}x")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the cache of parsed P-expressions and the P-expression templates.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to replay")
+    parser.add_argument("--rounds", "-r", type=int, default=3, help="number of times to replay the dialogues")
+    parser.add_argument("--n_templates", "-n", type=int, default=10000,
+                        help="number of attendee rows for the template comparison")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.rounds, arguments.n_templates)
+    finally:
+        logging.shutdown()
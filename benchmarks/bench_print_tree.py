@@ -0,0 +1,96 @@
+"""
+Micro-benchmark for `Node.print_tree` / `Node.compr_tree`.
+
+Compares the original recursive implementation (list based `seen`, recursive string concatenation) with the current
+iterative one, on synthetic graphs, and also times writing the P-expressions straight to a file (`Node.write_tree`).
+Both the speed and the resulting P-expressions are compared.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_print_tree.py -n 10000
+"""
+import argparse
+import logging
+import sys
+import tempfile
+import time
+
+from opendf.defs import config_log
+from opendf.graph.nodes.node import Node
+from test.df.helpers import make_random_graph, make_chain_graph, prepare_graph
+from test.df.legacy import legacy_print_tree, legacy_compr_tree
+
+logger = logging.getLogger(__name__)
+
+
+def print_goals(print_tree, goals):
+    seen, res = None, []
+    for g in goals:
+        s, seen = print_tree(g, None, seen=seen, with_res=True)
+        res.append(s)
+    return res
+
+
+def compr_goals(compr_tree, goals):
+    seen, res = None, []
+    for g in goals:
+        s, seen = compr_tree(g, seen)
+        res.append(s)
+    return res
+
+
+def time_it(func, repeat):
+    best, res = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func()
+        t = time.perf_counter() - start
+        best = t if best is None or t < best else best
+    return best, res
+
+
+def write_goals(goals):
+    with tempfile.TemporaryFile('w+') as f:
+        seen = None
+        for g in goals:
+            seen = g.write_tree(f, None, seen=seen, with_res=True)
+        return f.tell()
+
+
+def run_benchmark(n_nodes, repeat):
+    old_limit = sys.getrecursionlimit()
+    sys.setrecursionlimit(max(old_limit, 10 * n_nodes))  # the legacy version needs this for deep graphs
+    try:
+        for name, goals in [('random', make_random_graph(n_nodes)), ('chain', make_chain_graph(n_nodes))]:
+            goals = prepare_graph(goals)
+            for func, legacy, current in [('print_tree', lambda: print_goals(legacy_print_tree, goals),
+                                           lambda: print_goals(Node.print_tree, goals)),
+                                          ('compr_tree', lambda: compr_goals(legacy_compr_tree, goals),
+                                           lambda: compr_goals(Node.compr_tree, goals))]:
+                t_old, r_old = time_it(legacy, repeat)
+                t_new, r_new = time_it(current, repeat)
+                logger.info(f"{name:>8} {func}: {sum(len(s) for s in r_new):9d} chars   legacy: "
+                            f"{t_old * 1000:9.2f}ms   iterative: {t_new * 1000:8.2f}ms   speedup: "
+                            f"{t_old / t_new:7.1f}x   same output: {r_old == r_new}")
+            t_write, size = time_it(lambda: write_goals(goals), repeat)
+            logger.info(f"{name:>8} write_tree: {size:9d} chars to a file {t_write * 1000:8.2f}ms")
+    finally:
+        sys.setrecursionlimit(old_limit)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Micro-benchmark for Node.print_tree / Node.compr_tree (legacy recursive vs iterative).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--nodes", "-n", type=int, default=10000, help="number of nodes in the synthetic graphs")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.nodes, arguments.repeat)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,129 @@
+"""
+Benchmark for the binary snapshots of the dialog context (`snapshot_context` / `restore_context`) vs. pickling the
+whole context (as `main.py --output`) and vs. `pack_context` / `unpack_context` (then pickled).
+
+Runs one long dialogue, made of the turns of the dialogues of an examples file (repeated until the requested number of
+turns), and reports, for each method, the size of the serialized context and the time to save and to restore it.
+Then reports the cost of storing the context after every turn - as a snapshot, or as a delta checkpoint
+(`ContextCheckpointer`).
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_snapshot.py -t 30
+"""
+import argparse
+import importlib.machinery
+import logging
+import pickle
+import time
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.defs import config_log
+from opendf.graph.snapshot import snapshot_context, restore_context, ContextCheckpointer, restore_checkpoints
+from opendf.main import OpenDFDialogue
+
+logger = logging.getLogger(__name__)
+
+
+def run_long_dialogue(examples_file, n_turns, environment, after_turn=None):
+    dialogs = importlib.machinery.SourceFileLoader("dialogs", examples_file).load_module().dialogs
+    turns = [t for d in dialogs for t in d]
+    turns = (turns * (n_turns // len(turns) + 1))[:n_turns]
+    d_context = environment.get_new_context()
+    dialogue = OpenDFDialogue()
+    gl = None
+    for i, p_exp in enumerate(turns):
+        gl, _, d_context, _ = dialogue.run_single_turn(p_exp, d_context, False, gl)
+        if after_turn:
+            after_turn(i + 1, d_context)
+    return d_context
+
+
+def time_it(func, arg, rounds):
+    start = time.perf_counter()
+    for _ in range(rounds):
+        result = func(arg)
+    return result, (time.perf_counter() - start) / rounds
+
+
+def run_checkpoints(examples_file, n_turns, environment):
+    checkpoints = []
+    checkpointer = None
+    sizes = {'snapshot': 0, 'delta': 0}
+    times = {'snapshot': 0.0, 'delta': 0.0}
+
+    def after_turn(turn, d_context):
+        nonlocal checkpointer
+        if checkpointer is None:
+            checkpointer = ContextCheckpointer(d_context)
+        start = time.perf_counter()
+        snapshot = snapshot_context(d_context)
+        t_snapshot = time.perf_counter() - start
+        start = time.perf_counter()
+        checkpoints.append(checkpointer.checkpoint())
+        t_delta = time.perf_counter() - start
+        sizes['snapshot'] += len(snapshot)
+        sizes['delta'] += len(checkpoints[-1])
+        times['snapshot'] += t_snapshot
+        times['delta'] += t_delta
+        if turn == 1 or turn % max(n_turns // 5, 1) == 0:
+            logger.info(f"turn {turn:4d}  {len(d_context.idx_to_node):6d} nodes   snapshot: {len(snapshot):7d} bytes "
+                        f"{t_snapshot * 1000:7.2f} ms   delta: {len(checkpoints[-1]):7d} bytes "
+                        f"{t_delta * 1000:7.2f} ms")
+
+    run_long_dialogue(examples_file, n_turns, environment, after_turn)
+    logger.info(f"total, {n_turns} turns:  snapshot: {sizes['snapshot']:9d} bytes {times['snapshot'] * 1000:8.2f} ms   "
+                f"delta: {sizes['delta']:9d} bytes {times['delta'] * 1000:8.2f} ms")
+    start = time.perf_counter()
+    restore_checkpoints(checkpoints, environment.get_new_context())
+    logger.info(f"replay of the {len(checkpoints)} checkpoints: {(time.perf_counter() - start) * 1000:.2f} ms")
+
+
+def run_benchmark(examples_file, n_turns, rounds):
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)  # the dialogues are quite verbose
+    try:
+        with SMCalFlowEnvironment() as environment:
+            d_context = run_long_dialogue(examples_file, n_turns, environment)
+            logger.info(f"{n_turns} turns, {len(d_context.idx_to_node)} nodes, {len(d_context.goals)} goals")
+            methods = [
+                ('pickle', lambda c: pickle.dumps(c, protocol=pickle.HIGHEST_PROTOCOL), pickle.loads),
+                ('pack_context+pickle', lambda c: pickle.dumps(c.pack_context(), protocol=pickle.HIGHEST_PROTOCOL),
+                 lambda b: pickle.loads(b).unpack_context()),
+                ('snapshot', lambda c: snapshot_context(c, compress=False),
+                 lambda b: restore_context(b, environment.get_new_context())),
+                ('snapshot (zlib)', snapshot_context, lambda b: restore_context(b, environment.get_new_context())),
+            ]
+            for name, save, load in methods:
+                try:
+                    data, t_save = time_it(save, d_context, rounds)
+                    _, t_load = time_it(load, data, rounds)
+                except Exception as e:
+                    logger.info(f"{name:<20} failed: {type(e).__name__}: {e}")
+                    continue
+                logger.info(f"{name:<20} size: {len(data):9d} bytes   save: {t_save * 1000:8.2f} ms   "
+                            f"restore: {t_load * 1000:8.2f} ms")
+            run_checkpoints(examples_file, n_turns, environment)
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for the binary snapshots of the dialog context.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--examples_file", "-ef", type=str, default="opendf/examples/main_examples.py",
+                        help="the examples file with the dialogues to take the turns from")
+    parser.add_argument("--turns", "-t", type=int, default=30, help="number of turns of the dialogue")
+    parser.add_argument("--rounds", "-r", type=int, default=5, help="number of times to save/restore the context")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.examples_file, arguments.turns, arguments.rounds)
+    finally:
+        logging.shutdown()
@@ -0,0 +1,102 @@
+"""
+Benchmark for the deduplication of refer matches (`merge_equivalent`) and for `Node.compare_graphs`, against the
+original implementations (pairwise `equivalent_obj` calls, and comparing the `print_tree` strings of both graphs).
+
+The graphs are the event and recipient graphs of the stub database, constructed several times in one context (like the
+results of repeated DB searches): the matches to deduplicate are all of them (with duplicates), and all the pairs of
+event graphs are compared - with the structure ids (see `Node.struct_id`) computed again before all the comparisons, and
+with the ids kept in the nodes from the previous comparisons.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/bench_struct_id.py -c 10
+"""
+import argparse
+import logging
+import time
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.applications.smcalflow.domain import event_to_str_node
+from opendf.defs import config_log, NODE_COLOR_DB
+from opendf.graph.nodes.framework_functions import merge_equivalent
+from opendf.graph.nodes.node import Node
+from test.df.legacy import legacy_compare_graphs, legacy_merge_equivalent
+
+logger = logging.getLogger(__name__)
+
+
+def make_db_graphs(d_context, copies):
+    """
+    Constructs the event graphs of the stub database `copies` times, and gets the recipient graphs.
+
+    :return: the event graphs, and the recipient graphs
+    :rtype: Tuple[List[Node], List[Node]]
+    """
+    database = Database.get_instance()
+    entries = [database.get_event_entry(e.res.get_dat('id')) for e in database.find_events_that_match(None, d_context)]
+    events = []
+    for _ in range(copies):
+        for entry in entries:
+            g, _ = Node.call_construct_eval(event_to_str_node(entry), d_context, constr_tag=NODE_COLOR_DB)
+            events.append(g)
+    recipients = [n for g in events for n in g.topological_order() if n.typename() == 'Recipient']
+    return events, recipients
+
+
+def time_it(func, repeat):
+    best, res = None, None
+    for _ in range(repeat):
+        start = time.perf_counter()
+        res = func()
+        t = time.perf_counter() - start
+        best = t if best is None or t < best else best
+    return best, res
+
+
+def compare_all(compare, graphs):
+    return [compare(g1, g2) for g1 in graphs for g2 in graphs]
+
+
+def compare_all_cold(graphs):
+    for nd in Node.collect_nodes(graphs):  # the structure ids are computed again, as after changes of the graphs
+        nd.clear_struct_ids()
+    return compare_all(Node.compare_graphs, graphs)
+
+
+def run_benchmark(copies, repeat):
+    with SMCalFlowEnvironment() as environment:
+        d_context = environment.get_new_context()
+        events, recipients = make_db_graphs(d_context, copies)
+        for name, nodes in [('events', events + events), ('recipients', recipients)]:
+            t_old, r_old = time_it(lambda: legacy_merge_equivalent(nodes), repeat)
+            t_new, r_new = time_it(lambda: merge_equivalent(nodes), repeat)
+            logger.info(f"merge_equiv {name:<10} {len(nodes):6d} -> {len(r_new):6d} nodes   pairwise: "
+                        f"{t_old * 1000:9.2f}ms   by key: {t_new * 1000:8.2f}ms   speedup: {t_old / t_new:7.1f}x   "
+                        f"same result: {r_old == r_new}")
+        t_old, r_old = time_it(lambda: compare_all(legacy_compare_graphs, events), repeat)
+        t_cold, r_cold = time_it(lambda: compare_all_cold(events), repeat)
+        t_new, r_new = time_it(lambda: compare_all(Node.compare_graphs, events), repeat)
+        logger.info(f"compare_graphs {len(r_new):6d} pairs ({sum(r_new)} equal)   print_tree: {t_old * 1000:9.2f}ms   "
+                    f"structure ids computed: {t_cold * 1000:8.2f}ms   speedup: {t_old / t_cold:7.1f}x   "
+                    f"kept: {t_new * 1000:8.2f}ms   speedup: {t_old / t_new:7.1f}x   same result: "
+                    f"{r_old == r_cold == r_new}")
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Benchmark for merge_equivalent and Node.compare_graphs (vs. the original implementations).",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--copies", "-c", type=int, default=10,
+                        help="number of times the event graphs of the stub database are constructed")
+    parser.add_argument("--repeat", "-r", type=int, default=3, help="number of repetitions (best time is reported)")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_benchmark(arguments.copies, arguments.repeat)
+    finally:
+        logging.shutdown()
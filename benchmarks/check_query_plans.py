@@ -0,0 +1,95 @@
+"""
+Checks the query plans of the SMCalFlow database: runs `EXPLAIN QUERY PLAN` (SQLite) or `EXPLAIN` (Postgres) on the
+queries of a standard suite, and flags the full scans (of a table, or of a whole index).
+
+The suite is made of:
+  - the queries produced by `generate_sql` for a set of constraints (as used by `FindEvents`, `FindManager`...);
+  - the queries of the hot `Database` methods (time / location overlaps, free time of attendees...).
+
+A calendar of random events is added to the stub database, and the time of each query is measured with the indexes of
+the schema, and without them (the indexes are dropped, then re-created).
+
+Full scans are expected (and reported as `full scan`, instead of `FULL SCAN`) for the `LIKE` constraints (a pattern
+starting with `%` cannot be searched in an index) and for the constraints on the time of the day only.
+
+to run (from the repository's root directory):
+PYTHONPATH=$(pwd) python benchmarks/check_query_plans.py -n 10000
+"""
+import argparse
+import logging
+
+from benchmarks.bench_event_queries import add_calendar
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import config_log
+from test.df.helpers import constraint_workloads, database_suite, check_plans
+
+logger = logging.getLogger(__name__)
+
+
+def drop_indexes(database):
+    indexes = [index for table in Database.metadata.sorted_tables for index in table.indexes]
+    with database.engine.connect() as connection:
+        for index in indexes:
+            index.drop(connection)
+        connection.commit()
+    return indexes
+
+
+def create_indexes(database, indexes):
+    with database.engine.connect() as connection:
+        for index in indexes:
+            index.create(connection)
+        connection.commit()
+
+
+def run_check(n_events):
+    opendf_logger = logging.getLogger('opendf')
+    level = opendf_logger.level
+    opendf_logger.setLevel(logging.ERROR)
+    try:
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            add_calendar(database, n_events)
+            workloads = constraint_workloads(database, environment.get_new_context()) + database_suite(database)
+
+            indexed = check_plans(database, workloads)
+            indexes = drop_indexes(database)
+            try:
+                # (the plans are not checked again: SQLite may reuse the prepared EXPLAIN statements)
+                not_indexed = check_plans(database, workloads, explain=False)
+            finally:
+                create_indexes(database, indexes)
+
+            unexpected = 0
+            for (name, t_new, scans), (_, t_old, _), (_, _, expect_indexed) in zip(indexed, not_indexed, workloads):
+                status = 'ok'
+                if scans:
+                    status = 'FULL SCAN' if expect_indexed else 'full scan'
+                    unexpected += 1 if expect_indexed else 0
+                logger.info(f"{status:<9}  without indexes: {t_old * 1000:8.2f} ms   with indexes: "
+                            f"{t_new * 1000:8.2f} ms   {name}")
+                for scan in scans:
+                    logger.info(f"{'':<11}{scan}")
+            logger.info(f"{sum(1 for _, _, scans in indexed if scans)} of {len(workloads)} queries with full scans "
+                        f"({unexpected} unexpected), {n_events} events added")
+    finally:
+        opendf_logger.setLevel(level)
+
+
+def create_arguments_parser():
+    parser = argparse.ArgumentParser(
+        description="Checks the query plans of the SMCalFlow database, and flags the full scans.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter
+    )
+    parser.add_argument("--events", "-n", type=int, default=10000, help="number of events added to the calendar")
+    return parser
+
+
+if __name__ == "__main__":
+    try:
+        arguments = create_arguments_parser().parse_args()
+        config_log('INFO')
+        run_check(arguments.events)
+    finally:
+        logging.shutdown()
@@ -2,14 +2,15 @@
 Package containing logic concerning different applications on top of the dataflow graph.
 """
 import abc
+import importlib
 from typing import List
 
-from opendf.applications.multiwoz_2_2.domain import fill_multiwoz_db, MultiWOZContext
-from opendf.applications.multiwoz_2_2.multiwoz_db import fill_multiwoz_sql_db, MultiWozSqlDB
 from opendf.applications.fill_type_info import fill_type_info
 from opendf.defs import use_database
 from opendf.graph.dialog_context import DialogContext
 from opendf.graph.node_factory import NodeFactory
+from opendf.graph.nodes.node import Node
+from opendf.utils.utils import get_subclasses
 
 
 class EnvironmentClass(abc.ABC):
@@ -87,7 +88,14 @@ class SMCalFlowEnvironment(EnvironmentClass):
         node_fact = NodeFactory.get_instance()
         nodes = self.SIMPLIFICATION_NODES if self.simplification else self.DEFAULT_NODES
         nodes = list(nodes) + self.additional_paths
-        fill_type_info(node_fact, node_paths=nodes)
+        all_nodes = None
+        if not self.simplification:
+            # the simplification nodes redefine some of the types (e.g. Str, AND) - leave them out, if they were
+            #  imported in this process (e.g. by the simplification entry point)
+            for path in nodes:
+                importlib.import_module(path)
+            all_nodes = [t for t in get_subclasses(Node) if 'opendf.applications.simplification' not in t.__module__]
+        fill_type_info(node_fact, all_nodes, node_paths=nodes)
 
     def __enter__(self):
         from opendf.applications.smcalflow.database import populate_stub_database, Database
@@ -143,7 +151,8 @@ class MultiWOZEnvironment_2_2(EnvironmentClass):
              "opendf.applications.multiwoz_2_2.nodes.hospital",
              ]
 
-    def get_new_context(self) -> MultiWOZContext:
+    def get_new_context(self) -> "MultiWOZContext":
+        from opendf.applications.multiwoz_2_2.domain import MultiWOZContext
         return MultiWOZContext()
 
     def __init__(self, d_context=None, data_path=None, domains=None, clean_database=False):
@@ -159,6 +168,8 @@ class MultiWOZEnvironment_2_2(EnvironmentClass):
         fill_type_info(node_fact, node_paths=self.NODES)
 
     def load_data(self):
+        from opendf.applications.multiwoz_2_2.domain import fill_multiwoz_db
+        from opendf.applications.multiwoz_2_2.multiwoz_db import fill_multiwoz_sql_db
         if use_database:
             fill_multiwoz_sql_db(self.data_path, self.d_context, domains=self.domains)
         else:
@@ -170,6 +181,7 @@ class MultiWOZEnvironment_2_2(EnvironmentClass):
         return self
 
     def __exit__(self, exc_type, exc_val, exc_tb):
+        from opendf.applications.multiwoz_2_2.multiwoz_db import MultiWozSqlDB
         if use_database and self.clean_database:
             database = MultiWozSqlDB.get_instance()
             database.clear_database()
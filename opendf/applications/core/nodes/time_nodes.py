@@ -931,17 +931,15 @@ class DateTime(Node):
         if Pdt is not None:
             yr, mn, dy, hr, mt, dw = Pdatetime_to_values(Pdt)
         if 'date' in self.inputs:  # TODO: should create date if not ...
-            if yr is not None:
-                self.inputs['date'].inputs['year'].data = yr
-            if mn is not None:
-                self.inputs['date'].inputs['month'].data = mn
-            if dy is not None:
-                self.inputs['date'].inputs['day'].data = dy
+            for nm, val in [('year', yr), ('month', mn), ('day', dy)]:
+                if val is not None:
+                    self.inputs['date'].inputs[nm].set_data(val)
+            self.inputs['date'].mark_changed()
         if 'time' in self.inputs:  # TODO: should create time if not ...
-            if hr is not None:
-                self.inputs['time'].inputs['hour'].data = hr
-            if mt is not None:
-                self.inputs['time'].inputs['minute'].data = mt
+            for nm, val in [('hour', hr), ('minute', mt)]:
+                if val is not None:
+                    self.inputs['time'].inputs[nm].set_data(val)
+            self.inputs['time'].mark_changed()
 
     def func_FN(self, obj, fname=None, farg=None, op=None, mode=None):
         if fname == 'holiday':
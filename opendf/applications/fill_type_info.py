@@ -8,6 +8,7 @@ import importlib
 
 # from opendf.applications.smcalflow.nodes.functions import *
 from opendf.graph.nodes.framework_functions import *
+from opendf.graph.node_factory import SampleNodes
 from opendf.utils.utils import get_subclasses
 # from opendf.applications.sandbox.sandbox import *
 
@@ -34,10 +35,14 @@ def fill_type_info(node_factory, all_nodes=None, node_paths=()):
     node_factory.node_types = node_types  # fill node_fact BEFORE making sample nodes
 
     # sample nodes: dictionary name -> instance of a node of that type
-    sample_nodes = {t.__name__: t() for t in all_nodes}
-    # sample_nodes['Any'] = Node()
-    sample_nodes['Node'] = Node()
-    node_factory.sample_nodes = sample_nodes
+    if environment_definitions.lazy_sample_nodes:
+        node_factory.sample_nodes = SampleNodes(node_types)
+        node_factory.clear_leaf_types()  # set on first use
+    else:
+        sample_nodes = {t.__name__: t() for t in all_nodes}
+        # sample_nodes['Any'] = Node()
+        sample_nodes['Node'] = Node()
+        node_factory.sample_nodes = sample_nodes
+        node_factory.set_leaf_types()
 
-    node_factory.set_leaf_types()
     node_factory.init_lists()
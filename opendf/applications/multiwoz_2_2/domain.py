@@ -52,6 +52,20 @@ class MultiWOZContext(DialogContext):
         self._add_new_turn()
         self.completed_tasks = []
 
+    def get_snapshot_data(self):
+        data = super().get_snapshot_data()
+        data.update(agent_text=self.agent_text, agent_dialog_acts=self.agent_dialog_acts, agent_turn=self.agent_turn,
+                    dialog_state=self.dialog_state, completed_tasks=self.completed_tasks)
+        return data
+
+    def set_snapshot_data(self, data):
+        super().set_snapshot_data(data)
+        self.agent_text = data['agent_text']
+        self.agent_dialog_acts = data['agent_dialog_acts']
+        self.agent_turn = data['agent_turn']
+        self.dialog_state = data['dialog_state']
+        self.completed_tasks = data['completed_tasks']
+
     def update_last_turn_frame(self, frame):
         frames = self.dialog_state["turns"][-1]["frames"]
         service_frame: Optional[Dict] = get_frame_for_service(frame["service"], frames)
@@ -121,12 +135,15 @@ class MultiWOZDB:
     def find_hotels_that_match(self, operator):
         if operator is None:
             return list(self.hotels)
-        return list(filter(operator.match, self.hotels))
+        return list(filter(operator.compile_match(), self.hotels))
 
-    def find_elements_that_match(self, operator, d_context, match_miss=False):
+    def find_elements_that_match(self, operator, d_context, match_miss=False, rows=None):
         if operator is None:
             return self.all_elements
-        return list(filter(lambda x: operator.match(x, match_miss=match_miss), self.all_elements))
+        return list(filter(operator.compile_match(match_miss=match_miss), self.all_elements))
+
+    def fetch_rows(self, operator, match_miss=False):
+        return None  # the elements are in memory - nothing to read in advance (see `MultiWozSqlDB.fetch_rows`)
 
 
 def fill_multiwoz_db(data_directory, d_context: DialogContext, domains=None):
@@ -3,22 +3,71 @@ Class to handle a SQL database for MultiWOZ.
 """
 import datetime
 import json
+import logging
 import os
 import time
+from collections import namedtuple
 from typing import Optional, Dict, Tuple
 
 import sqlalchemy
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, ForeignKey, DateTime, insert, \
+from sqlalchemy import MetaData, Table, Column, Integer, String, ForeignKey, DateTime, insert, \
     Boolean, select, func, update, delete, text, and_, or_, not_, cast, Date, Float
 
 from opendf.applications.multiwoz_2_2.domain import FILE_NAMES
-from opendf.defs import database_connection, database_log, database_future, EnvironmentDefinition
+from opendf.defs import database_connection, EnvironmentDefinition, posname, TAG_NO_MATCH
 from opendf.exceptions.python_exception import SingletonClassException
 from opendf.graph.dialog_context import DialogContext
 from opendf.graph.nodes.node import Node
+from opendf.utils.database_utils import create_database_engine, scoped_connection, EntityCache
 
 environment_definition = EnvironmentDefinition.get_instance()
 
+logger = logging.getLogger(__name__)
+
+# the number of rows returned by the SQL query of a search, of graphs built for them, and of matching elements
+MatchStats = namedtuple('MatchStats', ['domain', 'rows', 'graphs', 'matches'])
+
+
+class ColumnValue:
+    """
+    Stands for the (leaf type) node of a column value in the `func_EQ` / `func_LIKE` functions of the constraints, which
+    compare the data of their argument (`ref.dat` / `ref.res.dat`) - see `MultiWozSqlDB.compile_row_matcher`.
+    """
+    __slots__ = ('dat',)
+
+    def __init__(self, dat):
+        self.dat = dat
+
+    @property
+    def res(self):
+        return self
+
+
+def _requires_tags(node):
+    return any(TAG_NO_MATCH not in t for t in node.tags)
+
+
+def _value_check(constraint):
+    """
+    Gets the check of a column value against the constraint of its field, if it can be done on the value alone:
+        - `LIKE(X)` - `X.func_LIKE` (e.g. the token scoring of `Name.func_LIKE`);
+        - a leaf type holding a value, e.g. `Area(north)` - the `func_EQ` of the value.
+
+    :return: the check, or `None`
+    :rtype: Callable[[Any], bool] or None
+    """
+    if constraint.typename() == 'LIKE':
+        like = constraint.input_view(posname(1))
+        return (lambda value: like.func_LIKE(ColumnValue(value))) if like is not None else None
+    if constraint.is_operator() or type(constraint).match is not Node.match or constraint.data is not None or \
+            list(constraint.inputs) != [posname(1)] or _requires_tags(constraint):
+        return None
+    leaf = constraint.input_view(posname(1))
+    if leaf.is_operator() or type(leaf).match is not Node.match or leaf.data is None or leaf.res is not leaf or \
+            _requires_tags(leaf):
+        return None
+    return lambda value: leaf.func_EQ(ColumnValue(value))
+
 
 class MultiWozSqlDB:
     __instance = None
@@ -154,11 +203,22 @@ class MultiWozSqlDB:
             connection_string = database_connection
         MultiWozSqlDB.__instance = self
         self.engine: sqlalchemy.engine.base.Engine = \
-            create_engine(connection_string, echo=database_log, future=database_future)
+            create_database_engine(connection_string)
         self._create_database()
+        self.last_match_stats: Optional[MatchStats] = None  # of the last search of a CUSTOM_MATCH domain
+
+        # cache of the graph templates of the entities, shared by the dialogues - keyed by (domain, id)
+        self.entity_cache = EntityCache()  # the venues are not changed after the database is filled - no ttl
+
+    def connect(self):
+        """
+        Gets a connection to the database, to be used in a `with` statement: the connection of the current
+        `connection_scope` (e.g. of the turn), if any; otherwise, a new connection.
 
-        # cache for the node representation of the entities
-        # self.cached_graphs: Dict[str, Dict[int, Node]] = {}
+        :return: the connection context
+        :rtype: ContextManager[sqlalchemy.engine.base.Connection]
+        """
+        return scoped_connection(self.engine)
 
     def erase_database(self):
         """
@@ -169,8 +229,7 @@ class MultiWozSqlDB:
         self.metadata.clear()  # clear the tables known by the metadata
 
     def clear_cache(self):
-        # self.cached_graphs: Dict[str, Dict[int, Node]] = {}
-        pass
+        self.entity_cache.clear()
 
     def clear_database(self):
         """
@@ -191,29 +250,33 @@ class MultiWozSqlDB:
         """
         self.metadata.create_all(self.engine)
 
-    def find_elements_that_match(self, operator, d_context, match_miss=False, maximum_number_of_elements=20):
+    def find_elements_that_match(self, operator, d_context, match_miss=False, maximum_number_of_elements=20,
+                                 rows=None):
+        """
+        Finds the elements which match the constraint `operator`: the graphs of the rows of its SQL query are built in
+        `d_context` (and matched, for the `CUSTOM_MATCH` domains).
+
+        :param rows: the rows, if they were read in advance by `fetch_rows` (with the same arguments)
+        :type rows: List[Any] or None
+        :return: the matching elements
+        :rtype: List[Node]
+        """
         values = []
         typename = operator.typename()
-        custom_match = typename in self.CUSTOM_MATCH
         try:
             if operator is not None:
-                selection = operator.generate_sql(match_miss=match_miss)
-                # unconstrained searches can return a very large number of objects, limit it to 20 by now
-                if maximum_number_of_elements and not custom_match:
-                    selection = selection.limit(maximum_number_of_elements)
+                if rows is not None:
+                    return self._elements_from_rows(operator, rows, d_context, match_miss, maximum_number_of_elements)
+                selection = self._select_elements(operator, match_miss, maximum_number_of_elements)
                 if selection is not None:
-                    values = self._find_recipient_from_operator_query(operator, selection, d_context)
-
-                filtered_values = []
-                if custom_match:
-                    for i, value in enumerate(values):
-                        if maximum_number_of_elements and i >= maximum_number_of_elements:
-                            break
-                        if operator.match(value, match_miss=match_miss):
-                            filtered_values.append(value)
-                    return filtered_values
-                else:
-                    return values
+                    with self.connect() as connection:
+                        result = connection.execute(selection)
+                        try:  # the rows are read as needed - a custom match may stop before the last row
+                            return self._elements_from_rows(operator, result, d_context, match_miss,
+                                                            maximum_number_of_elements)
+                        finally:
+                            result.close()
+                return values
         except Exception as ex:
             if environment_definition.raise_db_optimization_exception:
                 raise ex
@@ -222,26 +285,145 @@ class MultiWozSqlDB:
         if table_name is None:
             return None
         selection = select(table_name)
-        with self.engine.connect() as connection:
+        matcher = operator.compile_match(match_miss=match_miss)
+        with self.connect() as connection:
             for i, row in enumerate(connection.execute(selection)):
                 # unconstrained searches can return a very large number of objects, limit it to 20 by now
                 if maximum_number_of_elements and i >= maximum_number_of_elements:
                     break
-                value = operator.graph_from_row(row, d_context)
-                if operator is None or operator.match(value, match_miss=match_miss):
+                value = self._graph_from_row(operator, row, d_context)
+                if matcher(value):
                     values.append(value)
 
         return values
 
-    def _find_recipient_from_operator_query(self, operator, selection, d_context):
-        values = []
-        with self.engine.connect() as connection:
-            for i, row in enumerate(connection.execute(selection)):
-                value = operator.graph_from_row(row, d_context)
+    def fetch_rows(self, operator, match_miss=False, maximum_number_of_elements=20):
+        """
+        Reads the rows of the SQL query of `operator`, for `find_elements_that_match` - without building their graphs,
+        so it can run in another thread (see `Node.fetch`). In another thread, the query does not use the connection of
+        the turn (see `connection_scope`), so it does not see what the turn wrote to the database.
+
+        Note - all the rows are read, while `find_elements_that_match` itself stops reading the rows of a custom match
+        once enough elements matched.
+
+        :return: the rows, or `None` if `operator` has no SQL query
+        :rtype: List[Any] or None
+        """
+        selection = self._select_elements(operator, match_miss, maximum_number_of_elements)
+        if selection is None:
+            return None
+        with self.connect() as connection:
+            return list(connection.execute(selection))
+
+    def _select_elements(self, operator, match_miss, maximum_number_of_elements):
+        """
+        Generates the SQL query of `operator` - limited, unless its domain is matched again after the query.
+
+        :return: the query, or `None` if `operator` has no SQL query
+        :rtype: Any
+        """
+        selection = operator.generate_sql(match_miss=match_miss)
+        # unconstrained searches can return a very large number of objects, limit it to 20 by now
+        if maximum_number_of_elements and operator.typename() not in self.CUSTOM_MATCH:
+            selection = selection.limit(maximum_number_of_elements)
+        return selection
+
+    def _elements_from_rows(self, operator, rows, d_context, match_miss, maximum_number_of_elements):
+        """
+        Builds the graphs of the `rows` of the SQL query of `operator` - only of the matching rows, for the
+        `CUSTOM_MATCH` domains (see `_find_custom_matches`).
+
+        :return: the elements
+        :rtype: List[Node]
+        """
+        if operator.typename() in self.CUSTOM_MATCH:
+            return self._find_custom_matches(operator, rows, d_context, match_miss, maximum_number_of_elements)
+        return [self._graph_from_row(operator, row, d_context) for row in rows]
+
+    @staticmethod
+    def compile_row_matcher(operator, match_miss=False):
+        """
+        Compiles the constraint of a domain into a matcher of the raw rows of its table, for the inputs which can be
+        checked on the column values alone (see `_value_check`): a missing value (an empty column), the equality to a
+        leaf value (e.g. `area=Area(north)`) and `LIKE` (e.g. `name=LIKE(Name(...))`).
+
+        The row matcher rejects a row only if its graph (see `graph_from_row`) would not match the constraint; the
+        graphs of the other rows must still be matched with `compile_match`.
+
+        :return: the row matcher, or `None` if no input of the constraint can be checked on the rows
+        :rtype: Callable[[Any], bool] or None
+        """
+        table = MultiWozSqlDB.TABLE_BY_DOMAIN.get(operator.typename())
+        if table is None or operator.is_operator() or type(operator).match is not Node.match:
+            return None
+        checks = []
+        for nm in operator.inputs:
+            if nm not in operator.signature or nm not in table.columns:
+                continue
+            sig, constraint = operator.signature[nm], operator.input_view(nm)
+            if sig.prop or sig.custom or constraint.typename() == 'Clear' or constraint.res is not constraint:
+                continue
+            miss_ok = (sig.match_miss and match_miss) or constraint.typename() == 'Empty'
+            checks.append((nm, miss_ok, None if sig.excl_match else _value_check(constraint)))
+        if not checks:
+            return None
+
+        def row_matcher(row):
+            for name, miss_ok, check in checks:
+                value = row[name]
+                if not value:  # not in the graph
+                    if not miss_ok:
+                        return False
+                elif check is not None:
+                    try:
+                        if not check(value):
+                            return False
+                    except Exception:  # the check needs more than the data of the node - left to the graph match
+                        pass
+            return True
+
+        return row_matcher
+
+    def _find_custom_matches(self, operator, rows, d_context, match_miss, maximum_number_of_elements):
+        """
+        Finds the elements of a `CUSTOM_MATCH` domain, among the `rows` of its SQL query (a superset of the matching
+        rows - read as needed), in two phases: the rows are checked by the row matcher of the constraint (see
+        `compile_row_matcher`), without building their graphs; then the graphs of the remaining rows are built and
+        matched, until `maximum_number_of_elements` elements match. The number of rows and graphs are kept in
+        `last_match_stats`.
+
+        :return: the matching elements
+        :rtype: List[Node]
+        """
+        row_matcher = self.compile_row_matcher(operator, match_miss)
+        matcher = operator.compile_match(match_miss=match_miss)
+        values, scanned, graphs = [], 0, 0
+        for row in rows:
+            scanned += 1
+            if row_matcher is not None and not row_matcher(row):
+                continue
+            value = self._graph_from_row(operator, row, d_context)
+            graphs += 1
+            if matcher(value):
                 values.append(value)
+                if maximum_number_of_elements and len(values) >= maximum_number_of_elements:
+                    break
 
+        self.last_match_stats = MatchStats(operator.typename(), scanned, graphs, len(values))
+        logger.debug('%s: %d rows scanned, %d graphs built, %d matches', *self.last_match_stats)
         return values
 
+    def _graph_from_row(self, operator, row, d_context):
+        """
+        Creates the graph of the `row` of the table of `operator` (see `graph_from_row`) - a new graph for each query,
+        instantiated from the template of the entity, if it is in the entity cache.
+
+        :return: the graph
+        :rtype: Node
+        """
+        return self.entity_cache.graph(d_context, operator.typename(), row.id,
+                                       lambda: operator.graph_from_row(row, d_context))
+
 
 LOADED_DATA = set()
 
@@ -461,3 +643,4 @@ def fill_multiwoz_sql_db(data_directory, d_context: DialogContext, domains=None)
             load_taxis()
         if "train" in domains:
             load_trains(connection)
+    multiwoz_db.clear_cache()
@@ -136,16 +136,13 @@ class Attraction(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             value = row[field]
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Attraction({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Attraction', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -181,11 +178,18 @@ class Attraction(MultiWOZDomain):
 
 
 class FindAttraction(Node):
+    parallel_fetch = True  # the rows of the search are read in advance (see fetch)
+
     def __init__(self):
         super().__init__(Attraction)
         self.signature.add_sig(posname(1), Attraction, alias='attraction')
         self.inc_count('max_inform_name', 1)
 
+    def fetch(self):
+        if posname(1) in self.inputs:
+            return multiwoz_db.fetch_rows(self.inputs[posname(1)])
+        return None
+
     def exec(self, all_nodes=None, goals=None):
         context = self.context
         if posname(1) in self.inputs:
@@ -194,7 +198,7 @@ class FindAttraction(Node):
             att, _ = self.call_construct('Attraction?()', context)
             att.connect_in_out(posname(1), self)
 
-        results = results0 = multiwoz_db.find_elements_that_match(att, att.context)
+        results = results0 = multiwoz_db.find_elements_that_match(att, att.context, rows=self.fetched())
         nresults = nresults0 = len(results)
 
         self.filter_and_set_result(results)  # initially set result to single result, if single, or don't
@@ -330,7 +334,7 @@ class FindAttraction(Node):
     def filter_and_set_result(self, results, filter_name=None):
         if filter_name:
             f, _ = self.call_construct('Attraction?(name=LIKE(Name(%s)))' % escape_string(filter_name), self.context)
-            results = [r for r in results if f.match(r)]
+            results = list(filter(f.compile_match(), results))
         if len(results)==1:
             self.set_result(results[0])
             results[0].call_eval(add_goal=False)  # not necessary, but adds color
@@ -420,7 +424,7 @@ class FindAttraction(Node):
                 txt = 'what is the %s of the attraction?' % slot  # todo - make nicer
                 pexp = 'get_attraction_info('
                 if attr:
-                    references = get_refer_match(ctx, Node.collect_nodes(ctx.goals), ctx.goals, pos1='Attraction?()')
+                    references = get_refer_match(ctx, ctx.reachable_nodes(), ctx.goals, pos1='Attraction?()')
                     rr = 'refer(Attraction?())' if references and references[0]==attr else id_sexp(attr)
                     pexp += 'attraction=%s, ' % rr
                 pexp += slot + ')'
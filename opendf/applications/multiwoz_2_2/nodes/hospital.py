@@ -51,16 +51,13 @@ class Hospital(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             value = row[field]
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Hospital({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Hospital', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -221,7 +218,7 @@ class FindHospital(Node):
     def filter_and_set_result(self, results, filter_name=None):
         if filter_name:
             f, _ = self.call_construct('Hospital?(department=LIKE(Department(%s)))' % filter_name, self.context)
-            results = [r for r in results if f.match(r)]
+            results = list(filter(f.compile_match(), results))
         if len(results)==1:
             self.set_result(results[0])
             results[0].call_eval(add_goal=False)  # not necessary, but adds color
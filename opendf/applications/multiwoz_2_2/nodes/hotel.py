@@ -192,18 +192,15 @@ class Hotel(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             if self.signature[field].custom:
                 continue
             value = row[field]
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Hotel({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Hotel', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -245,7 +242,7 @@ class Hotel(MultiWOZDomain):
 def filter_hotel_name_and_set_result(nd, results, filter_name=None):
     if filter_name:
         f, _ = nd.call_construct('Hotel?(name=LIKE(Name(%s)))' % filter_name, nd.context)
-        results = [r for r in results if f.match(r)]
+        results = list(filter(f.compile_match(), results))
     if len(results)==1:
         nd.set_result(results[0])
         results[0].call_eval(add_goal=False)  # not necessary, but adds color
@@ -470,7 +467,7 @@ class BookHotel(Node):
                 txt = 'what is the %s of the hotel?' % slot  # todo - make nicer
                 pexp = 'get_hotel_info('
                 if rest:
-                    references = get_refer_match(ctx, Node.collect_nodes(ctx.goals), ctx.goals, pos1='Hotel?()')
+                    references = get_refer_match(ctx, ctx.reachable_nodes(), ctx.goals, pos1='Hotel?()')
                     rr = 'refer(Hotel?())' if references and references[0]==rest else id_sexp(rest)
                     pexp += 'hotel=%s, ' % rr
                 pexp += slot + ')'
@@ -557,10 +554,17 @@ class BookHotel(Node):
 # and the logic of exec should then be able to handle these actions (generate result AND message)
 # def find_hotel(find, hotel, all_nodes=None, goals=None):
 class FindHotel(Node):
+    parallel_fetch = True  # the rows of the search are read in advance (see fetch)
+
     def __init__(self):
         super().__init__(Hotel)
         self.signature.add_sig(posname(1), Hotel, alias='hotel')
 
+    def fetch(self):
+        if posname(1) in self.inputs:
+            return multiwoz_db.fetch_rows(self.inputs[posname(1)])
+        return None
+
     def exec(self, all_nodes=None, goals=None):
         context = self.context
         if posname(1) in self.inputs:
@@ -569,7 +573,7 @@ class FindHotel(Node):
             hotel, _ = self.call_construct('Hotel?()', context)
             hotel.connect_in_out(posname(1), self)
 
-        results = results0 = multiwoz_db.find_elements_that_match(hotel, hotel.context)
+        results = results0 = multiwoz_db.find_elements_that_match(hotel, hotel.context, rows=self.fetched())
         nresults = nresults0 = len(results)
 
         # update_mwoz_state(hotel, context)   # initial state from last turn / prev pexp in this turn
@@ -718,7 +722,7 @@ class FindHotel(Node):
     def filter_and_set_result(self, results, filter_name=None):
         if filter_name:
             f, _ = self.call_construct('Hotel?(name=LIKE(Name(%s)))' % filter_name, self.context)
-            results = [r for r in results if f.match(r)]
+            results = list(filter(f.compile_match(), results))
         if len(results)==1:
             self.set_result(results[0])
             results[0].call_eval(add_goal=False)  # not necessary, but adds color
@@ -282,6 +282,7 @@ TIME_REGEX = re.compile(r"([0-9]+):([0-9]+)")
 
 
 class MWOZTime(Node):  # type
+    pure_eval = True
 
     def __init__(self, typ=None):
         typ = typ if typ else type(self)
@@ -591,7 +592,7 @@ def get_extract_exps(domain, context, general, extracted, extracted_book, extrac
     has_req = len(extracted_req) > 0
     domain = domain.lower()
     Domain = domain.capitalize()
-    exists = get_refer_match(context, Node.collect_nodes(context.goals), context.goals,
+    exists = get_refer_match(context, context.reachable_nodes(), context.goals,
                              type='Find%s' % Domain, no_fallback=True)  # do NOT create a new one!
     if extracted or (not extracted_book and not has_req and not OMIT_GET_INFO):
         inner_node_str = f"{Domain}?({', '.join(extracted)})"
@@ -842,7 +843,7 @@ def add_refer(nd, opts, avoid_parents=None, prob=0, synonyms=None):
         synonyms = synonyms if synonyms else {}
         os = []
         ctx = nd.context
-        nodes, goals = Node.collect_nodes(ctx.goals), ctx.goals
+        nodes, goals = ctx.reachable_nodes(), ctx.goals
         for o in opts:
             if random.random() > prob:
                 os.append(o)
@@ -1087,7 +1088,7 @@ def extract_find_domain(utterance, slots, context, domain, input_map, prefix, bo
             continue
 
         if context and value not in utterance:
-            references = get_refer_match(context, Node.collect_nodes(context.goals), context.goals,
+            references = get_refer_match(context, context.reachable_nodes(), context.goals,
                                          role=role, params={'fallback_type': 'SearchCompleted', 'role': role})
             if references and references[0].dat == value:
                 if role in book_roles:
@@ -43,16 +43,13 @@ class Police(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             value = row[field]
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Police({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Police', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -74,11 +71,18 @@ class Police(MultiWOZDomain):
 
 
 class FindPolice(Node):
+    parallel_fetch = True  # the rows of the search are read in advance (see fetch)
+
     def __init__(self):
         super().__init__(Police)
         self.signature.add_sig(posname(1), Police, alias='police')
         self.inc_count('max_inform', 1)
 
+    def fetch(self):
+        if posname(1) in self.inputs:
+            return multiwoz_db.fetch_rows(self.inputs[posname(1)])
+        return None
+
     def exec(self, all_nodes=None, goals=None):
         context = self.context
         if posname(1) in self.inputs:
@@ -87,7 +91,7 @@ class FindPolice(Node):
             police, _ = self.call_construct('Police?()', context)
             police.connect_in_out(posname(1), self)
 
-        results = results0 = multiwoz_db.find_elements_that_match(police, police.context)
+        results = results0 = multiwoz_db.find_elements_that_match(police, police.context, rows=self.fetched())
         nresults = nresults0 = len(results)
 
         self.filter_and_set_result(results)  # initially set result to single result, if single, or don't
@@ -224,7 +228,7 @@ class FindPolice(Node):
     def filter_and_set_result(self, results, filter_name=None):
         if filter_name:
             f, _ = self.call_construct('Police?(name=LIKE(Name(%s)))' % filter_name, self.context)
-            results = [r for r in results if f.match(r)]
+            results = list(filter(f.compile_match(), results))
         if len(results)==1:
             self.set_result(results[0])
             results[0].call_eval(add_goal=False)  # not necessary, but adds color
@@ -184,18 +184,15 @@ class Restaurant(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             if self.signature[field].custom:
                 continue
             value = row[field]
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Restaurant({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Restaurant', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -234,7 +231,7 @@ class Restaurant(MultiWOZDomain):
 def filter_restaurant_name_and_set_result(nd, results, filter_name=None):
     if filter_name:
         f, _ = nd.call_construct('Restaurant?(name=LIKE(Name(%s)))' % filter_name, nd.context)
-        results = [r for r in results if f.match(r)]
+        results = list(filter(f.compile_match(), results))
     if len(results)==1:
         nd.set_result(results[0])
         results[0].call_eval(add_goal=False)  # not necessary, but adds color
@@ -463,7 +460,7 @@ class BookRestaurant(Node):
                 txt = 'what is the %s of the restaurant?' % slot  # todo - make nicer
                 pexp = 'get_restaurant_info('
                 if rest:
-                    references = get_refer_match(ctx, Node.collect_nodes(ctx.goals), ctx.goals, pos1='Restaurant?()')
+                    references = get_refer_match(ctx, ctx.reachable_nodes(), ctx.goals, pos1='Restaurant?()')
                     rr = 'refer(Restaurant?())' if references and references[0]==rest else id_sexp(rest)
                     pexp += 'restaurant=%s, ' % rr
                 pexp += slot + ')'
@@ -522,10 +519,17 @@ class BookRestaurant(Node):
 
 
 class FindRestaurant(Node):
+    parallel_fetch = True  # the rows of the search are read in advance (see fetch)
+
     def __init__(self):
         super().__init__(Restaurant)
         self.signature.add_sig(posname(1), Restaurant, alias='restaurant')
 
+    def fetch(self):
+        if posname(1) in self.inputs:
+            return multiwoz_db.fetch_rows(self.inputs[posname(1)])
+        return None
+
     def exec(self, all_nodes=None, goals=None):
         context = self.context
         if posname(1) in self.inputs:
@@ -534,7 +538,7 @@ class FindRestaurant(Node):
             restaurant, _ = self.call_construct('Restaurant?()', context)
             restaurant.connect_in_out(posname(1), self)
 
-        results = results0 = multiwoz_db.find_elements_that_match(restaurant, restaurant.context)
+        results = results0 = multiwoz_db.find_elements_that_match(restaurant, restaurant.context, rows=self.fetched())
         nresults = nresults0 = len(results)
 
         self.filter_and_set_result(results)  # initially set result to single result, if single, or don't
@@ -672,7 +676,7 @@ class FindRestaurant(Node):
     def filter_and_set_result(self, results, filter_name=None):
         if filter_name:
             f, _ = self.call_construct('Restaurant?(name=LIKE(Name(%s)))' % escape_string(filter_name), self.context)
-            results = [r for r in results if f.match(r)]
+            results = list(filter(f.compile_match(), results))
         if len(results)==1:
             self.set_result(results[0])
             results[0].call_eval(add_goal=False)  # not necessary, but adds color
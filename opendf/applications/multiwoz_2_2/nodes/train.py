@@ -137,19 +137,16 @@ class Train(MultiWOZDomain):
         return selection
 
     def graph_from_row(self, row, context):
-        params = []
+        values = {}
         for field in self.signature.keys():
             value = row[field]
             if value and field in ['leaveat', 'arriveby']:
                 s = str(value).split()[1].split(':')
                 value = ':'.join(s[:2])
             if value:
-                if isinstance(value, str):
-                    value = escape_string(value)
-                params.append(f"{field}={value}")
+                values[field] = value
 
-        node_str = f"Train({', '.join(params)})"
-        g, _ = Node.call_construct_eval(node_str, context, constr_tag=NODE_COLOR_DB)
+        g, _ = Node.call_construct_values_eval('Train', values, context, constr_tag=NODE_COLOR_DB)
         g.tags[DB_NODE_TAG] = 0
         return g
 
@@ -415,7 +412,7 @@ class BookTrain(Node):
                 txt = 'what is the %s of the train?' % slot  # todo - make nicer
                 pexp = 'get_train_info('
                 if rest:
-                    references = get_refer_match(ctx, Node.collect_nodes(ctx.goals), ctx.goals, pos1='Train?()')
+                    references = get_refer_match(ctx, ctx.reachable_nodes(), ctx.goals, pos1='Train?()')
                     rr = 'refer(Train?())' if references and references[0]==rest else id_sexp(rest)
                     pexp += 'train=%s, ' % rr
                 pexp += slot + ')'
@@ -475,6 +472,8 @@ class BookTrain(Node):
 
 
 class FindTrain(Node):
+    parallel_fetch = True  # the rows of the search are read in advance (see fetch)
+
     def __init__(self):
         super().__init__(Train)
         self.signature.add_sig(posname(1), Train, alias='train')
@@ -490,6 +489,11 @@ class FindTrain(Node):
                     exc.append(f)
         return {f:dfields[f] for f in dfields if f not in exc}
 
+    def fetch(self):
+        if posname(1) in self.inputs:
+            return multiwoz_db.fetch_rows(self.inputs[posname(1)])
+        return None
+
     def exec(self, all_nodes=None, goals=None):
         context = self.context
         if posname(1) in self.inputs:
@@ -498,7 +502,7 @@ class FindTrain(Node):
             train, _ = self.call_construct('Train?()', context)
             train.connect_in_out(posname(1), self)
 
-        results = results0 = multiwoz_db.find_elements_that_match(train, train.context)
+        results = results0 = multiwoz_db.find_elements_that_match(train, train.context, rows=self.fetched())
         nresults = nresults0 = len(results)
 
         # update_mwoz_state(train, context)   # initial state from last turn / prev pexp in this turn
@@ -663,7 +667,7 @@ class FindTrain(Node):
             if rerun_db_search:
                 results = multiwoz_db.find_elements_that_match(f, self.context)
             else:
-                results = [r for r in results if f.match(r)]
+                results = list(filter(f.compile_match(), results))
             # for now, we do a hack for time - this is necessary due to the different meanings of time
             #  depending on user/agent   (solution - return to explicitly using EQ / LE / GE as before)
             for i in ['leaveat', 'arriveby']:
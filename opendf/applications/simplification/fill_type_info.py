@@ -2,6 +2,8 @@
 Collect Node type related information here and store in a format which can be passed to a function which does not
 have to directly know anything about the node types.
 """
+from opendf.defs import EnvironmentDefinition
+from opendf.graph.node_factory import SampleNodes
 from opendf.graph.nodes.node import Node
 from opendf.utils.utils import get_subclasses
 
@@ -14,10 +16,13 @@ def fill_type_info(node_fact):
     node_fact.node_types = node_types  # fill node_fact BEFORE making sample nodes
 
     # sample nodes: dictionary name -> instance of a node of that type
-    sample_nodes = {t.__name__: t() for t in all_nodes}
-    sample_nodes['Any'] = Node()
-    sample_nodes['Node'] = Node()
-    node_fact.sample_nodes = sample_nodes
-
-    node_fact.set_leaf_types()
+    if EnvironmentDefinition.get_instance().lazy_sample_nodes:
+        node_fact.sample_nodes = SampleNodes(node_types)
+        node_fact.clear_leaf_types()  # set on first use
+    else:
+        sample_nodes = {t.__name__: t() for t in all_nodes}
+        sample_nodes['Any'] = Node()
+        sample_nodes['Node'] = Node()
+        node_fact.sample_nodes = sample_nodes
+        node_fact.set_leaf_types()
     node_fact.init_lists()
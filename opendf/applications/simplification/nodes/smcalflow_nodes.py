@@ -31,7 +31,7 @@ connect_assign = False  # keep this False to be safe. Turning on allows transpar
 
 def float_input_to_int(n, i):
     if n and i in n.inputs and n.inputs[i].data is not None and isinstance(n.inputs[i].data, float):
-        n.inputs[i].data = int(n.inputs[i].data)
+        n.inputs[i].set_data(int(n.inputs[i].data))
 
 # check if the context has an assignment with the name n
 def is_assigned(n, d_context):
@@ -2527,7 +2527,7 @@ class NumberPM(Node):
 
 def simplify(self, top, mode):
     if 'number' in self.inputs and isinstance(self.inputs['number'].dat, float):
-        self.inputs['number'].data = int(self.inputs['number'].dat)
+        self.inputs['number'].set_data(int(self.inputs['number'].dat))
     return self, None, mode
 
 
@@ -1,16 +1,18 @@
 """
 Class to interact with a relational database specific for the application.
 """
+import uuid
 from datetime import datetime, timedelta, time, date
-from typing import Sequence, Optional, Dict, List, Tuple
+from operator import attrgetter
+from typing import Sequence, Optional, List
 
 import sqlalchemy
-from sqlalchemy import create_engine, MetaData, Table, Column, Integer, String, ForeignKey, DateTime, insert, \
-    Boolean, select, func, update, delete, text, and_, or_, not_, cast, Date, Float
+from sqlalchemy import MetaData, Table, Column, Integer, String, ForeignKey, DateTime, insert, \
+    Boolean, select, func, update, delete, and_, or_, not_, cast, Date, Float, Index
 
 from opendf.applications.core.nodes.time_nodes import Pdate_to_date_sexp
-from opendf.applications.smcalflow.domain import recipient_to_str_node, event_to_str_node, match_start, match_end, \
-    attendees_to_str_node, TIME_SUITABLE_FOR_SUBJECT, DBevent, DBPerson, WeatherPlace
+from opendf.applications.smcalflow.domain import recipient_to_values, event_to_values, match_start, match_end, \
+    attendee_to_values, TIME_SUITABLE_FOR_SUBJECT, DBevent, DBPerson, WeatherPlace
 from opendf.applications.smcalflow.storage import Storage, RecipientEntry, AttendeeEntry, LocationEntry, EventEntry, \
     HolidayEntry
 
@@ -21,17 +23,36 @@ from opendf.defs import EnvironmentDefinition
 
 environment_definitions = EnvironmentDefinition.get_instance()
 
-from opendf.defs import database_connection, database_log, database_future, NODE_COLOR_DB, DB_NODE_TAG, \
+from opendf.defs import database_connection, NODE_COLOR_DB, DB_NODE_TAG, \
     event_suggestion_period, minimum_slot_interval, minimum_duration, maximum_duration_days, get_system_date, posname, \
     get_system_datetime
 
 from opendf.applications.smcalflow.domain import get_stub_data_from_json
 
-from opendf.utils.database_utils import get_database_handler
-from opendf.utils.utils import to_list, str_to_datetime, id_sexp
+from opendf.utils.database_utils import get_database_handler, create_database_engine, scoped_connection, EntityCache, \
+    current_connection_scope
+from opendf.parser.pexp_parser import PExpTemplate, node_reference
+from opendf.utils.utils import to_list, str_to_datetime
 
 database_handler = get_database_handler()
 
+ATTENDEE_TEMPLATE = PExpTemplate("Attendee(recipient={recipient}, response={response}, show={show}, eventid={eventid})")
+
+
+def attendee_from_row(row, recipient_graph):
+    """
+    Creates the (parsed) P-expression of an attendee from the select row of the attendee table.
+
+    :param row: the row
+    :type row: Any
+    :param recipient_graph: the graph of the recipient of the attendee
+    :type recipient_graph: Node
+    :return: the P-expression tree
+    :rtype: ASTNode
+    """
+    return ATTENDEE_TEMPLATE.bind(recipient=node_reference(recipient_graph.id), response=row.response_status,
+                                  show=row.show_as_status, eventid=row.event_id)[0]
+
 
 def create_recipient_from_row(row):
     """
@@ -133,14 +154,21 @@ def select_event_with_overlap(start, end, selection):
     """
     if isinstance(start, str):
         start = str_to_datetime(start)  # b2
-    if isinstance(start, datetime):
-        start = database_handler.to_database_datetime(start)
-
     if isinstance(end, str):
         end = str_to_datetime(end)  # e2
+    # when start <= end, the overlapping events start before the end and end after the start; this range condition
+    # (implied by the conditions below) can be searched in the index of the event table
+    bounded = isinstance(start, datetime) and isinstance(end, datetime) and start <= end
+
+    if isinstance(start, datetime):
+        start = database_handler.to_database_datetime(start)
     if isinstance(end, datetime):
         end = database_handler.to_database_datetime(end)
 
+    if bounded:
+        selection = selection.where(Database.EVENT_TABLE.columns.starts_at <= end,
+                                    start <= Database.EVENT_TABLE.columns.ends_at)
+
     selection = selection.where(or_(
         # event starts before start AND ends after start
         # starting point is between event's start and end
@@ -201,6 +229,7 @@ class Database(Storage):
         Column("radius", Float),
         Column("always_free", Boolean),
         Column("is_virtual", Boolean),
+        Index("ix_location_name_always_free", "name", "always_free"),
     )
 
     EVENT_TABLE = Table(
@@ -211,15 +240,26 @@ class Database(Storage):
         Column("ends_at", DateTime),
         Column("location_id", ForeignKey("location.id")),
         Column("organizer_id", ForeignKey("recipient.id")),
+        # for the overlap of time intervals (`select_event_with_overlap`): the range on one end is searched, and the
+        # other end is checked in the index
+        Index("ix_event_starts_at_ends_at", "starts_at", "ends_at"),
+        Index("ix_event_ends_at_starts_at", "ends_at", "starts_at"),
+        Index("ix_event_location_id", "location_id"),
+        Index("ix_event_organizer_id", "organizer_id"),
     )
 
+    # `generate_sql` compares the dates of the events (e.g. `date(event.starts_at) = date('2022-01-05')`)
+    Index("ix_event_start_date", database_handler.to_database_date(EVENT_TABLE.columns.starts_at))
+    Index("ix_event_end_date", database_handler.to_database_date(EVENT_TABLE.columns.ends_at))
+
     EVENT_HAS_ATTENDEE_TABLE = Table(
         "event_has_attendee", metadata,
         Column("event_id", ForeignKey("event.id"), nullable=False, primary_key=True),
         Column("recipient_id", ForeignKey("recipient.id"), nullable=False, primary_key=True),
         Column("show_as_status", String),  # e.g. busy, free, away... it should be a foreign key for a table
         #  containing all possible status, for now, it is a string, for simplicity
-        Column("response_status", String)  # e.g. accepted, rejected, not responded... same comment as above
+        Column("response_status", String),  # e.g. accepted, rejected, not responded... same comment as above
+        Index("ix_event_has_attendee_recipient_id_event_id", "recipient_id", "event_id"),
     )
 
     PLACE_FEATURE_TABLE = Table(
@@ -248,6 +288,16 @@ class Database(Storage):
         "holiday", metadata,
         Column("name", String, nullable=False, primary_key=True),
         Column("date", Date, nullable=False, primary_key=True),
+        Index("ix_holiday_date", "date"),
+    )
+
+    # a single row, whose version is incremented in the transaction of every change of the data, and whose token is
+    #  drawn again when the data is erased - see `get_data_version`
+    DATA_VERSION_TABLE = Table(
+        "data_version", metadata,
+        Column("id", Integer, primary_key=True),
+        Column("token", String, nullable=False),
+        Column("version", Integer, nullable=False),
     )
 
     @staticmethod
@@ -272,16 +322,26 @@ class Database(Storage):
             connection_string = database_connection
         Database.__instance = self
         self.engine: sqlalchemy.engine.base.Engine = \
-            create_engine(connection_string, echo=database_log, future=database_future)
+            create_database_engine(connection_string)
         self._create_database()
         self._current_recipient_id: Optional[int] = None
         self._current_recipient_location_id: Optional[int] = None
 
-        # cache for the node representation of the entities
-        self._recipient_graph: Dict[int, Node] = {}
-        self._attendee_graph: Dict[Tuple[int, int], Node] = {}
-        self._event_graph: Dict[int, Node] = {}
-        self._location_graph: Dict[int, Node] = {}
+        # cache of the entries and the graph templates of the entities, shared by the dialogues; the graphs of each
+        #  dialogue are kept in its context (see EntityCache.get_context_graph). The events and the recipients may be
+        #  changed by other processes - the cache is checked against the version of the data (see _sync_entity_cache)
+        self.entity_cache = EntityCache(ttl=environment_definitions.entity_cache_ttl)
+        self._synced_scope = None  # the connection scope in which the cache was last checked
+
+    def connect(self):
+        """
+        Gets a connection to the database, to be used in a `with` statement: the connection of the current
+        `connection_scope` (e.g. of the turn), if any; otherwise, a new connection.
+
+        :return: the connection context
+        :rtype: ContextManager[sqlalchemy.engine.base.Connection]
+        """
+        return scoped_connection(self.engine)
 
     def erase_database(self):
         """
@@ -292,10 +352,23 @@ class Database(Storage):
         self.metadata.clear()  # clear the tables known by the metadata
 
     def clear_cache(self):
-        self._recipient_graph: Dict[int, Node] = {}
-        self._attendee_graph: Dict[Tuple[int, int], Node] = {}
-        self._event_graph: Dict[int, Node] = {}
-        self._location_graph: Dict[int, Node] = {}
+        self.entity_cache.clear()
+
+    def _sync_entity_cache(self):
+        """
+        Clears the entity cache if the data was changed since the cached entities were read - by this process, or by
+        another one (see `get_data_version`). The version is checked once per `connection_scope` (e.g. per turn), or on
+        each call outside of a scope.
+        """
+        scope = current_connection_scope()
+        if scope is not None and scope is self._synced_scope:
+            return
+        version = self.get_data_version()
+        self.entity_cache.sync(version[:2] if version is not None else None)
+        self._synced_scope = scope
+
+    def _invalidate_event(self, identifier):
+        self.entity_cache.invalidate('event', identifier)
 
     def clear_database(self):
         """
@@ -306,6 +379,7 @@ class Database(Storage):
             transaction = connection.begin()
             for table in reversed(self.metadata.sorted_tables):
                 connection.execute(table.delete())
+            self._reset_data_version(connection)
             transaction.commit()
         self.clear_cache()
 
@@ -315,6 +389,21 @@ class Database(Storage):
         lunched and destroy it whenever it finishes, this behaviour must be changed on production phase.
         """
         self.metadata.create_all(self.engine)
+        with self.engine.connect() as connection:
+            if connection.execute(select(self.DATA_VERSION_TABLE.columns.id)).first() is None:
+                self._reset_data_version(connection)
+                connection.commit()
+
+    def _reset_data_version(self, connection):
+        connection.execute(insert(self.DATA_VERSION_TABLE), {"id": 0, "token": uuid.uuid4().hex, "version": 0})
+
+    def _increment_data_version(self, connection):
+        """
+        Increments the version of the data, in the transaction of the change (before it is committed), so that the
+        change and the new version are seen together by the other connections.
+        """
+        version = self.DATA_VERSION_TABLE.columns.version
+        connection.execute(update(self.DATA_VERSION_TABLE).values(version=version + 1))
 
     def get_current_recipient_id(self):
         return self._current_recipient_id
@@ -322,6 +411,20 @@ class Database(Storage):
     def set_current_recipient_id(self, identifier):
         self._current_recipient_id = identifier
 
+    def get_data_version(self):
+        """
+        The version is read from the database (in the connection of the turn, if any), so that the changes made by other
+        processes are seen, provided they also go through this class. The token of the data is part of the version, so
+        that a version kept in a context (e.g. restored from a snapshot) doesn't match another database; and so is the
+        current recipient, since the results of the searches depend on it.
+        """
+        with self.connect() as connection:
+            row = connection.execute(
+                select(self.DATA_VERSION_TABLE.columns.token, self.DATA_VERSION_TABLE.columns.version)).first()
+        if row is None:
+            return None
+        return row.token, row.version, self._current_recipient_id
+
     def get_current_recipient_entry(self):
         return self.get_recipient_entry(self._current_recipient_id)
 
@@ -332,7 +435,7 @@ class Database(Storage):
         return self.get_attendee_graph(None, self._current_recipient_id, d_context)
 
     def get_current_recipient_location(self):
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.LOCATION_TABLE).where(
                 self.LOCATION_TABLE.columns.id == self._current_recipient_location_id)
             for row in connection.execute(selection):
@@ -344,38 +447,56 @@ class Database(Storage):
         self._current_recipient_location_id = value
 
     def get_recipient_entry(self, identifier):
-        with self.engine.connect() as connection:
+        self._sync_entity_cache()
+        recipient_entry = self.entity_cache.get('recipient', identifier)
+        if recipient_entry is not None:
+            return recipient_entry
+        stamp = self.entity_cache.stamp('recipient', identifier)
+        with self.connect() as connection:
             selection = select(self.RECIPIENT_TABLE).where(self.RECIPIENT_TABLE.columns.id == identifier)
             for row in connection.execute(selection):
-                return create_recipient_from_row(row)
+                recipient_entry = create_recipient_from_row(row)
+                self.entity_cache.put('recipient', identifier, recipient_entry, stamp=stamp)
+                return recipient_entry
 
         return None
 
     def get_location_entry(self, identifier) -> LocationEntry:
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.LOCATION_TABLE).where(self.LOCATION_TABLE.columns.id == identifier)
             for row in connection.execute(selection):
                 return LocationEntry(
                     row.id, row.name, row.address, row.latitude, row.longitude,
                     row.radius, row.always_free, row.is_virtual)
 
-    def get_recipient_graph(self, identifier, d_context, update_cache=True):
-        recipient_graph = self._recipient_graph.get(identifier)
+    @staticmethod
+    def _construct_db_graph(typename, values, d_context):
+        graph, _ = Node.call_construct_values_eval(typename, values, d_context, constr_tag=NODE_COLOR_DB)
+        graph.tags[DB_NODE_TAG] = 0
+        return graph
+
+    def get_recipient_graph(self, identifier, d_context, update_cache=True, recipient_entry=None):
+        self._sync_entity_cache()
+        recipient_graph = self.entity_cache.get_context_graph(d_context, 'recipient', identifier)
         if recipient_graph is None:
-            recipient_entry = self.get_recipient_entry(identifier)
+            stamp = self.entity_cache.stamp('recipient', identifier)
+            if recipient_entry is None:  # not read yet
+                recipient_entry = self.get_recipient_entry(identifier)
             if recipient_entry is None:
                 return None
-            string_entry = recipient_to_str_node(recipient_entry)
-            recipient_graph, _ = Node.call_construct_eval(string_entry, d_context, constr_tag=NODE_COLOR_DB)
-            recipient_graph.tags[DB_NODE_TAG] = 0
+            recipient_graph = self.entity_cache.graph(
+                d_context, 'recipient', identifier,
+                lambda: self._construct_db_graph(*recipient_to_values(recipient_entry), d_context))
             if update_cache:
-                self._recipient_graph[identifier] = recipient_graph
+                self.entity_cache.set_context_graph(d_context, 'recipient', identifier, recipient_graph, stamp)
 
         return recipient_graph
 
     def get_attendee_graph(self, event_id, recipient_id, d_context):
-        attendee_graph = self._attendee_graph.get((event_id, recipient_id))
+        self._sync_entity_cache()
+        attendee_graph = self.entity_cache.get_context_graph(d_context, 'attendee', (event_id, recipient_id))
         if attendee_graph is None:
+            stamp = self.entity_cache.stamp('attendee', (event_id, recipient_id))
             recipient_entry = self.get_recipient_entry(recipient_id)
             recipient_graph = self.get_recipient_graph(recipient_id, d_context)
             if recipient_graph is None:
@@ -383,15 +504,13 @@ class Database(Storage):
             # TODO: replace string literals by default values for `show as status` and `response status`
             # noinspection PyTypeChecker
             attendee = AttendeeEntry(None, recipient_entry, "Busy", "NotResponded")
-            string_entry = attendees_to_str_node([attendee], [recipient_graph])
-            attendee_graph, _ = Node.call_construct_eval(string_entry, d_context, constr_tag=NODE_COLOR_DB)
-            attendee_graph.tags[DB_NODE_TAG] = 0
-            self._attendee_graph[(event_id, recipient_id)] = attendee_graph
+            attendee_graph = self._construct_db_graph(*attendee_to_values(attendee, recipient_graph), d_context)
+            self.entity_cache.set_context_graph(d_context, 'attendee', (event_id, recipient_id), attendee_graph, stamp)
 
         return attendee_graph
 
     def get_manager(self, recipient_id):
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             recipient = self.RECIPIENT_TABLE.alias("r")
             manager = self.RECIPIENT_TABLE.alias("m")
             selection = select(manager).join(recipient, recipient.c.manager_id == manager.c.id).where(
@@ -411,7 +530,7 @@ class Database(Storage):
         :rtype: List[int]
         """
         friends = []
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.RECIPIENT_HAS_FRIEND_TABLE.columns.friend_id).where(
                 self.RECIPIENT_HAS_FRIEND_TABLE.columns.recipient_id == recipient_id)
             for row in connection.execute(selection):
@@ -429,7 +548,7 @@ class Database(Storage):
         :rtype: List[Node]
         """
         recipients = []
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 recipient_graph = self.get_recipient_graph(row.id, d_context)
                 recipients.append(recipient_graph)
@@ -445,13 +564,14 @@ class Database(Storage):
         except:
             pass
         recipients = []
-        with self.engine.connect() as connection:
+        matcher = operator.compile_match() if operator is not None else None
+        with self.connect() as connection:
             selection = select(self.RECIPIENT_TABLE.columns.id)
             for row in connection.execute(selection):
                 recipient_graph = self.get_recipient_graph(row.id, d_context, update_cache=False)
-                if operator is None or operator.match(recipient_graph):
+                if matcher is None or matcher(recipient_graph):
                     recipients.append(recipient_graph)
-                    self._recipient_graph[row.id] = recipient_graph
+                    self.entity_cache.set_context_graph(d_context, 'recipient', row.id, recipient_graph)
 
         return recipients
 
@@ -465,16 +585,18 @@ class Database(Storage):
         :rtype: List[Node]
         """
         attendees = []
-        with self.engine.connect() as connection:
-            for row in connection.execute(selection):
-                attendee = self._attendee_graph.get((row.event_id, row.recipient_id))
+        self._sync_entity_cache()
+        with self.connect() as connection:
+            # in the order of the keys, whichever index the query plan uses
+            rows = sorted(connection.execute(selection), key=lambda r: (r.event_id, r.recipient_id))
+            for row in rows:
+                key = (row.event_id, row.recipient_id)
+                attendee = self.entity_cache.get_context_graph(d_context, 'attendee', key)
                 if attendee is None:
                     recipient_graph = self.get_recipient_graph(row.recipient_id, d_context)
-                    attendee, _ = Node.call_construct_eval(
-                        f"Attendee(recipient={id_sexp(recipient_graph)}, response={row.response_status}, "
-                        f"show={row.show_as_status}, eventid={row.event_id})", d_context)
+                    attendee, _ = Node.call_construct_eval(attendee_from_row(row, recipient_graph), d_context)
                     attendees.append(attendee)
-                    self._attendee_graph[(row.event_id, row.recipient_id)] = attendee
+                    self.entity_cache.set_context_graph(d_context, 'attendee', key, attendee)
 
         return attendees
 
@@ -487,16 +609,16 @@ class Database(Storage):
         except:
             pass
         attendees = []
-        with self.engine.connect() as connection:
+        matcher = operator.compile_match() if operator is not None else None
+        with self.connect() as connection:
             selection = select(self.EVENT_HAS_ATTENDEE_TABLE)
             for row in connection.execute(selection):
                 recipient_graph = self.get_recipient_graph(row.recipient_id, d_context, update_cache=False)
-                attendee, _ = Node.call_construct_eval(
-                    f"Attendee(recipient={id_sexp(recipient_graph)}, response={row.response_status}, "
-                    f"show={row.show_as_status}, eventid={row.event_id})", d_context)
-                if operator is None or operator.match(attendee):
+                attendee, _ = Node.call_construct_eval(attendee_from_row(row, recipient_graph), d_context)
+                if matcher is None or matcher(attendee):
                     attendees.append(attendee)
-                    self._attendee_graph[(row.event_id, row.recipient_id)] = attendee
+                    self.entity_cache.set_context_graph(d_context, 'attendee', (row.event_id, row.recipient_id),
+                                                        attendee)
 
         return attendees
 
@@ -509,13 +631,11 @@ class Database(Storage):
         :return: the event graphs
         :rtype: List[Node]
         """
-        events = []
-        with self.engine.connect() as connection:
-            for row in connection.execute(selection):
-                event_graph = self.get_event_graph(row.id, d_context)
-                events.append(event_graph)
+        with self.connect() as connection:
+            # in the order of the identifiers, whichever index the query plan uses
+            identifiers = sorted(row.id for row in connection.execute(selection))
 
-        return events
+        return self.get_event_graphs(identifiers, d_context)
 
     def find_events_that_match(self, operator, d_context):
         try:
@@ -526,13 +646,14 @@ class Database(Storage):
         except:
             pass
         events = []
-        with self.engine.connect() as connection:
-            selection = select(self.EVENT_TABLE.columns.id)
-            for row in connection.execute(selection):
-                event_graph = self.get_event_graph(row.id, d_context, update_cache=False)
-                if operator is None or operator.match(event_graph):
-                    events.append(event_graph)
-                    self._event_graph[row.id] = event_graph
+        matcher = operator.compile_match() if operator is not None else None
+        with self.connect() as connection:
+            selection = select(self.EVENT_TABLE.columns.id).order_by(self.EVENT_TABLE.columns.id)
+            identifiers = [row.id for row in connection.execute(selection)]
+        for event_graph in self.get_event_graphs(identifiers, d_context, update_cache=False):
+            if matcher is None or matcher(event_graph):
+                events.append(event_graph)
+                self.entity_cache.set_context_graph(d_context, 'event', event_graph.get_dat('id'), event_graph)
 
         return events
 
@@ -546,7 +667,7 @@ class Database(Storage):
         :rtype: List[LocationEntry]
         """
         locations = []
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 locations.append(self._location_entry_from_row(row))
 
@@ -559,7 +680,7 @@ class Database(Storage):
                 return self._find_locations_from_operator_query(selection)
         locations = []
         location_name = operator.res.dat
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.LOCATION_TABLE)
             for row in connection.execute(selection):
                 if location_name in row.name:
@@ -568,7 +689,7 @@ class Database(Storage):
         return locations
 
     def find_feature_for_place(self, place_id, feature=None):
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.PLACE_FEATURE_TABLE.columns.feature).join(
                 self.PLACE_HAS_FEATURE_TABLE).where(self.PLACE_HAS_FEATURE_TABLE.columns.location_id == place_id)
             if feature:
@@ -579,7 +700,7 @@ class Database(Storage):
 
     def _find_all_holidays_from_selection(self, selection):
         holidays = []
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 holidays.append(HolidayEntry(row.name, row.date))
         return holidays
@@ -602,7 +723,7 @@ class Database(Storage):
                     return self._find_all_holidays_from_selection(selection)
 
         holidays = []
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.HOLIDAY_TABLE)
             if name is not None:
                 selection = selection.where(self.HOLIDAY_TABLE.columns.name.like(f"%{name.get_dat(posname(1))}%"))
@@ -631,28 +752,56 @@ class Database(Storage):
         :return: the list of attendees from the event
         :rtype: List[AttendeeEntry]
         """
-        attendees = []
-        with self.engine.connect() as connection:
-            selection = select(self.EVENT_HAS_ATTENDEE_TABLE, self.RECIPIENT_TABLE).join(self.RECIPIENT_TABLE).where(
-                self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id == event_id)
-            for row in connection.execute(selection):
-                recipient_entry = create_recipient_from_row(row)
-                attendees.append(AttendeeEntry(event_id, recipient_entry, row.show_as_status, row.response_status))
+        with self.connect() as connection:
+            return self._get_attendees_from_events([event_id], connection).get(event_id, [])
+
+    def _get_attendees_from_events(self, identifiers, connection):
+        """
+        Gets the attendees of the events with the given `identifiers`, with a single query.
+
+        :param identifiers: the event identifiers, or 'all' for all the events
+        :type identifiers: List[int] or str
+        :param connection: the database connection
+        :type connection: sqlalchemy.engine.Connection
+        :return: the attendees of each event (events without attendees are missing) - { event id : attendees }
+        :rtype: Dict[int, List[AttendeeEntry]]
+        """
+        selection = select(self.EVENT_HAS_ATTENDEE_TABLE, self.RECIPIENT_TABLE).join(self.RECIPIENT_TABLE)
+        if identifiers != 'all':
+            selection = selection.where(self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id.in_(identifiers))
+        selection = selection.order_by(self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id,
+                                       self.EVENT_HAS_ATTENDEE_TABLE.columns.recipient_id)
+        attendees = {}
+        for row in connection.execute(selection):
+            recipient_entry = create_recipient_from_row(row)
+            attendees.setdefault(row.event_id, []).append(
+                AttendeeEntry(row.event_id, recipient_entry, row.show_as_status, row.response_status))
 
         return attendees
 
     def _get_event_entries(self, identifiers):
         """
-        Gets a list of event entries with the given `identifiers`.
+        Gets a list of event entries with the given `identifiers`. The entries in the entity cache are not read again.
 
         :param identifiers: the identifiers
         :type identifiers: List[int]
-        :return: the event entries
+        :return: the event entries, by identifier
         :rtype: List[EventEntry]
         """
         if not identifiers:
             return []
-        with self.engine.connect() as connection:
+        self._sync_entity_cache()
+        cached = {}
+        if identifiers != 'all':
+            for identifier in set(identifiers):
+                event = self.entity_cache.get('event', identifier)
+                if event is not None:
+                    cached[identifier] = event
+            identifiers = [i for i in set(identifiers) if i not in cached]
+            if not identifiers:
+                return [cached[i] for i in sorted(cached)]
+        stamps = {i: self.entity_cache.stamp('event', i) for i in identifiers} if identifiers != 'all' else {}
+        with self.connect() as connection:
             if identifiers=='all':
                 selection = select(self.EVENT_TABLE, self.LOCATION_TABLE, self.RECIPIENT_TABLE).join(
                     self.LOCATION_TABLE, self.EVENT_TABLE.columns.location_id == Database.LOCATION_TABLE.columns.id,
@@ -661,15 +810,21 @@ class Database(Storage):
                 selection = select(self.EVENT_TABLE, self.LOCATION_TABLE, self.RECIPIENT_TABLE).join(
                     self.LOCATION_TABLE, self.EVENT_TABLE.columns.location_id == Database.LOCATION_TABLE.columns.id,
                     isouter=True).join(self.RECIPIENT_TABLE).where(self.EVENT_TABLE.columns.id.in_(identifiers))
+            selection = selection.order_by(self.EVENT_TABLE.columns.id)
             events = []
+            attendees_of_events = self._get_attendees_from_events(identifiers, connection)
             for row in connection.execute(selection):
-                attendees = self._get_attendees_from_event(row.id)
+                attendees = attendees_of_events.get(row.id, [])
                 organizer = RecipientEntry(row.id_2, row.full_name, row.first_name, row.last_name,
                                            row.phone_number, row.email_address, row.manager_id)
                 location = self._location_entry_from_row(row)
                 event = EventEntry(row.id, row.subject, row.starts_at, row.ends_at, location, organizer, attendees)
                 events.append(event)
+                if row.id in stamps:
+                    self.entity_cache.put('event', row.id, event, stamp=stamps[row.id])
 
+        if cached:
+            events = sorted(events + list(cached.values()), key=attrgetter('identifier'))
         return events
 
     def _location_entry_from_row(self, row):
@@ -699,23 +854,49 @@ class Database(Storage):
 
         return None
 
-    def get_event_graph(self, identifier, d_context, update_cache=True):
-        event_graph = self._event_graph.get(identifier)
+    def get_event_graph(self, identifier, d_context, update_cache=True, event_entry=None):
+        self._sync_entity_cache()
+        event_graph = self.entity_cache.get_context_graph(d_context, 'event', identifier)
         if event_graph is None:
-            event_entry = self.get_event_entry(identifier)
+            stamp = self.entity_cache.stamp('event', identifier)
+            if event_entry is None:  # not read yet
+                event_entry = self.get_event_entry(identifier)
             if event_entry is None:
                 return None
             recipient_nodes = \
-                [self.get_recipient_graph(attendee.recipient.identifier, d_context) for attendee in
-                 event_entry.attendees]
-            string_entry = event_to_str_node(event_entry, recipient_nodes)
-            event_graph, _ = Node.call_construct_eval(string_entry, d_context, constr_tag=NODE_COLOR_DB)
-            event_graph.tags[DB_NODE_TAG] = 0
+                [self.get_recipient_graph(attendee.recipient.identifier, d_context, recipient_entry=attendee.recipient)
+                 for attendee in event_entry.attendees]
+            # the template of the event graph has the recipient graphs as external inputs
+            event_graph = self.entity_cache.graph(
+                d_context, 'event', identifier,
+                lambda: self._construct_db_graph(*event_to_values(event_entry, recipient_nodes), d_context),
+                recipient_nodes)
             if update_cache:
-                self._event_graph[identifier] = event_graph
+                self.entity_cache.set_context_graph(d_context, 'event', identifier, event_graph, stamp)
 
         return event_graph
 
+    def get_event_graphs(self, identifiers, d_context, update_cache=True):
+        """
+        Gets the graphs of the events with the given `identifiers` - the same as calling `get_event_graph` for each
+        one, but the events which are not in the cache are read from the database together.
+
+        :param identifiers: the event identifiers
+        :type identifiers: List[int]
+        :return: the event graphs, in the order of `identifiers` (missing events are skipped)
+        :rtype: List[Node]
+        """
+        self._sync_entity_cache()
+        missing = [i for i in identifiers if self.entity_cache.get_context_graph(d_context, 'event', i) is None]
+        entries = {e.identifier: e for e in self._get_event_entries(list(dict.fromkeys(missing)))}
+        graphs = []
+        for identifier in identifiers:
+            event_graph = self.get_event_graph(identifier, d_context, update_cache, entries.get(identifier))
+            if event_graph is not None:
+                graphs.append(event_graph)
+
+        return graphs
+
     def _get_maximum_event_id(self):
         """
         Gets the maximum event identifier.
@@ -723,7 +904,7 @@ class Database(Storage):
         :return: the maximum event identifier
         :rtype: int
         """
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(func.max(self.EVENT_TABLE.columns.id).label("max"))
             for row in connection.execute(selection):
                 return row.max
@@ -735,7 +916,7 @@ class Database(Storage):
         :return: the maximum person identifier
         :rtype: int
         """
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(func.max(self.RECIPIENT_TABLE.columns.id).label("max"))
             for row in connection.execute(selection):
                 return row.max
@@ -747,7 +928,7 @@ class Database(Storage):
         :return: the maximum location identifier
         :rtype: int
         """
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(func.max(self.LOCATION_TABLE.columns.id).label("max"))
             for row in connection.execute(selection):
                 return row.max
@@ -761,7 +942,7 @@ class Database(Storage):
         :return: the identifier of the location, if exists; otherwise, `None`
         :rtype: Optional[int]
         """
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             selection = select(self.LOCATION_TABLE.columns.id).where(self.LOCATION_TABLE.columns.name == location)
             for row in connection.execute(selection):
                 return row.id
@@ -794,7 +975,7 @@ class Database(Storage):
         organizer_id = self._current_recipient_id
         identifier = self._get_maximum_event_id() + 1
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             if location_id is None:
                 location_id = self._get_maximum_location_id() + 1
                 connection.execute(insert(self.LOCATION_TABLE),
@@ -821,8 +1002,10 @@ class Database(Storage):
             #  [SQL: INSERT INTO event_has_attendee(event_id, recipient_id, show_as_status, response_status) VALUES(?, ?, ?, ?)]
             #  [parameters: (12, 10007, 'Busy', 'NotResponded')]
 
+            self._increment_data_version(connection)
             connection.commit()
 
+        self._invalidate_event(identifier)  # the identifier of a deleted event may be given again
         return self.get_event_entry(identifier)
 
     def update_event(self, identifier, subject, start, end, location, attendees):
@@ -833,7 +1016,7 @@ class Database(Storage):
 
         location_id = self._get_location_if_exist(location)
         organizer_id = self._current_recipient_id
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             if location_id is None:
                 location_id = self._get_maximum_location_id() + 1
                 connection.execute(insert(self.LOCATION_TABLE),
@@ -854,9 +1037,10 @@ class Database(Storage):
             event_has_attendee_data = self._get_has_attendee_data(identifier, attendees)
             connection.execute(insert(self.EVENT_HAS_ATTENDEE_TABLE), event_has_attendee_data)
 
+            self._increment_data_version(connection)
             connection.commit()
 
-        self._event_graph.pop(identifier, None)  # invalidate cached value
+        self._invalidate_event(identifier)
         return self.get_event_entry(identifier)
 
     def delete_event(self, identifier, subject, start, end, location, attendees):
@@ -864,15 +1048,16 @@ class Database(Storage):
         if len(ev) != 1:
             return None
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             event_id = ev[0].identifier
             connection.execute(delete(self.EVENT_TABLE).where(self.EVENT_TABLE.columns.id == event_id))
             connection.execute(
                 delete(self.EVENT_HAS_ATTENDEE_TABLE).where(
                     self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id == event_id))
+            self._increment_data_version(connection)
             connection.commit()
 
-        self._event_graph.pop(identifier, None)  # invalidate cached value
+        self._invalidate_event(event_id)
         return ev
 
     def _select_attendees(self, attendees, threshold, selection):
@@ -889,14 +1074,13 @@ class Database(Storage):
         :return: the updated selection
         :rtype: select
         """
-        label = "selected_attendees"
-        selected_attendees = func.count(self.EVENT_HAS_ATTENDEE_TABLE.columns.recipient_id).label(label)
-        c = select(self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id, selected_attendees).where(
+        # a correlated count, evaluated only for the events selected by the other conditions (e.g. a time overlap),
+        # with the primary key of the attendee table
+        selected_attendees = select(func.count(self.EVENT_HAS_ATTENDEE_TABLE.columns.recipient_id)).where(
+            self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id == self.EVENT_TABLE.columns.id,
             self.EVENT_HAS_ATTENDEE_TABLE.columns.recipient_id.in_(attendees)
-        ).group_by(self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id).alias("c")
-        selection = selection.join(c, c.columns.event_id == self.EVENT_TABLE.columns.id)
-        # TODO: replace text(.) function below by `selected_attendees >= threshold`
-        selection = selection.where(text(f"{label} >= {threshold}"))
+        ).correlate(self.EVENT_TABLE).scalar_subquery()
+        selection = selection.where(selected_attendees >= threshold)
         return selection
 
     def get_events(self, identifier=None, avoid_id=None, subject=None, start=None, end=None, location=None,
@@ -932,7 +1116,7 @@ class Database(Storage):
         if pre_filter is not None:
             selection = selection.where(self.EVENT_TABLE.columns.id.in_(set(map(lambda x: x.identifier, pre_filter))))
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             identifiers = []
             for row in connection.execute(selection):
                 if match_start(row, start) and match_end(row, end):
@@ -956,7 +1140,7 @@ class Database(Storage):
         if pre_filter is not None:
             selection = selection.where(self.EVENT_TABLE.columns.id.in_(set(map(lambda x: x.identifier, pre_filter))))
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             identifiers = []
             for row in connection.execute(selection):
                 identifiers.append(row.id)
@@ -979,7 +1163,7 @@ class Database(Storage):
         if pre_filter is not None:
             selection = selection.where(self.EVENT_TABLE.columns.id.in_(set(map(lambda x: x.identifier, pre_filter))))
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             identifiers = []
             for row in connection.execute(selection):
                 identifiers.append(row.id)
@@ -997,7 +1181,7 @@ class Database(Storage):
         if avoid_id is not None:
             selection = selection.where(self.EVENT_TABLE.columns.id != avoid_id)
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 return row.count == 0
 
@@ -1013,7 +1197,7 @@ class Database(Storage):
         selection = select(func.count(self.LOCATION_TABLE.columns.id).label("count"))
         selection = operator.generate_sql_where(selection, None)
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 return row.count != 0
 
@@ -1029,7 +1213,7 @@ class Database(Storage):
         if avoid_id is not None:
             selection = selection.where(self.EVENT_TABLE.columns.id != avoid_id)
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             for row in connection.execute(selection):
                 return row.count == 0
 
@@ -1052,7 +1236,7 @@ class Database(Storage):
         organizer_id = self._current_recipient_id
         identifier = self._get_maximum_event_id() + 1
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             if location_id is None:
                 location_id = self._get_maximum_location_id() + 1
                 connection.execute(
@@ -1076,7 +1260,9 @@ class Database(Storage):
             connection.execute(
                 insert(self.EVENT_HAS_ATTENDEE_TABLE), attendee_data)
 
+            self._increment_data_version(connection)
             connection.commit()
+        self._invalidate_event(identifier)
 
         result = DBevent(identifier, subject, start, end, location, db_event.attendees, db_event.accepted,
                          db_event.showas)
@@ -1093,13 +1279,15 @@ class Database(Storage):
         """
         event_entry = self.get_event_entry(event_id)
         if event_entry is not None:
-            with self.engine.connect() as connection:
+            with self.connect() as connection:
                 connection.execute(
                     delete(self.EVENT_TABLE).where(self.EVENT_TABLE.columns.id == event_id))
                 connection.execute(
                     delete(self.EVENT_HAS_ATTENDEE_TABLE).where(
                         self.EVENT_HAS_ATTENDEE_TABLE.columns.event_id == event_id))
+                self._increment_data_version(connection)
                 connection.commit()
+            self._invalidate_event(event_id)
 
         return DBevent(
             event_entry.identifier, event_entry.subject, event_entry.starts_at, event_entry.ends_at,
@@ -1132,11 +1320,13 @@ class Database(Storage):
         else:
             person_has_friend_data.append({"recipient_id": identifier, "friend_id": db_person.friends})
 
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             connection.execute(insert(self.RECIPIENT_TABLE), person_data)
             if person_has_friend_data:
                 connection.execute(insert(self.RECIPIENT_HAS_FRIEND_TABLE), person_has_friend_data)
+            self._increment_data_version(connection)
             connection.commit()
+            self.clear_cache()  # the event entries hold the entries of their attendees and location
             return DBPerson(
                 db_person.fullName, db_person.firstName, db_person.lastName,
                 identifier, db_person.phone_number, db_person.email_address,
@@ -1154,14 +1344,16 @@ class Database(Storage):
         person_entry = self.get_recipient_entry(person_id)
         friends = self.get_friends(person_id)
         if person_entry is not None:
-            with self.engine.connect() as connection:
+            with self.connect() as connection:
                 connection.execute(
                     delete(self.RECIPIENT_TABLE).where(self.RECIPIENT_TABLE.columns.id == person_id))
                 connection.execute(
                     delete(self.RECIPIENT_HAS_FRIEND_TABLE).where(
                         self.RECIPIENT_HAS_FRIEND_TABLE.columns.recipient_id == person_id))
                 # TODO: should we delete all the events organised by this person?
+                self._increment_data_version(connection)
                 connection.commit()
+            self.clear_cache()  # the event entries hold the entries of their attendees and location
 
         return DBPerson(
             person_entry.full_name, person_entry.first_name, person_entry.last_name, person_entry.identifier,
@@ -1184,9 +1376,11 @@ class Database(Storage):
             'radius': db_place.radius, 'always_free': db_place.always_free,
             'is_virtual': db_place.is_virtual
         }]
-        with self.engine.connect() as connection:
+        with self.connect() as connection:
             connection.execute(insert(self.LOCATION_TABLE), location_data)
+            self._increment_data_version(connection)
             connection.commit()
+        self.clear_cache()  # the event entries hold the entries of their attendees and location
 
         return WeatherPlace(
             identifier, db_place.name, db_place.address, db_place.latitude, db_place.longitude,
@@ -1204,11 +1398,13 @@ class Database(Storage):
         """
         place_entry = self.get_location_entry(place_id)
         if place_entry is not None:
-            with self.engine.connect() as connection:
+            with self.connect() as connection:
                 connection.execute(
                     delete(self.LOCATION_TABLE).where(self.LOCATION_TABLE.columns.id == place_id))
                 # TODO: should we delete all the events in this location?
+                self._increment_data_version(connection)
                 connection.commit()
+            self.clear_cache()  # the event entries hold the entries of their attendees and location
 
         return WeatherPlace(
             place_entry.identifier, place_entry.name, place_entry.address,
@@ -1324,6 +1520,7 @@ def populate_stub_database(stub_data_file, people=None, events=None, places=None
                                "date": date(year=current_year + i, month=month, day=day)})
         connection.execute(insert(Database.HOLIDAY_TABLE, values))
 
+        database._increment_data_version(connection)
         connection.commit()
 
         database.set_current_recipient_id(CURRENT_RECIPIENT_ID)
@@ -150,6 +150,77 @@ def event_to_str_node(event_entry: EventEntry, att_nodes=None):
     return sexp
 
 
+# the functions below give the same graphs as the `..._to_str_node` functions above, as input values for
+#   `Node.call_construct_values_eval` (which builds the graph directly - without formatting and parsing a P-expression)
+
+def recipient_to_values(recipient: RecipientEntry):
+    return 'Recipient', {'name': ('PersonName', {posname(1): recipient.full_name}), 'firstName': recipient.first_name,
+                         'lastName': recipient.last_name, 'id': recipient.identifier,
+                         'phoneNum': recipient.phone_number, 'email': recipient.email_address}
+
+
+def attendee_to_values(attendee, recipient):
+    """
+    Create the input values of the attendee node (see `attendee_to_str_node`).
+
+    :param attendee: the attendee
+    :type attendee: AttendeeEntry
+    :param recipient: the recipient node (or its input values)
+    :type recipient: Node or Tuple[str, Dict[str, Any]]
+    :return: the input values of the attendee node
+    :rtype: Tuple[str, Dict[str, Any]]
+    """
+    return 'Attendee', {'recipient': recipient, 'response': attendee.response_status,
+                        'show': attendee.show_as_status}
+
+
+def attendees_to_values(att, nodes=None):
+    if nodes:
+        attendees = [attendee_to_values(attendee, node) for attendee, node in zip(att, to_list(nodes))]
+    else:
+        attendees = [attendee_to_values(attendee, recipient_to_values(attendee.recipient)) for attendee in att]
+    if len(attendees) == 1:
+        return attendees[0]
+    elif attendees:
+        return 'SET', {posname(i + 1): a for i, a in enumerate(attendees)}
+
+    return None
+
+
+def datetime_to_values(s: datetime):
+    return 'DateTime', {'date': ('Date', {'year': s.year, 'month': s.month, 'day': s.day}),
+                        'time': ('Time', {'hour': s.hour, 'minute': s.minute})}
+
+
+def duration_to_values(st, en):
+    names = ['year', 'month', 'week', 'day', 'hour', 'minute']
+    return 'Period', {nm: v for nm, v in zip(names, Ptimedelta_to_period_values(en - st)) if v is not None and v >= 0}
+
+
+def event_to_time_slot_values(event_entry: EventEntry):
+    values = {}
+    if event_entry.starts_at is not None:
+        values['start'] = datetime_to_values(event_entry.starts_at)
+    if event_entry.ends_at is not None:
+        values['end'] = datetime_to_values(event_entry.ends_at)
+    if len(values) > 1:
+        values['duration'] = duration_to_values(event_entry.starts_at, event_entry.ends_at)
+
+    if values:
+        return 'TimeSlot', values
+
+    return None
+
+
+def event_to_values(event_entry: EventEntry, att_nodes=None):
+    values = {'subject': event_entry.subject, 'slot': event_to_time_slot_values(event_entry)}
+    if event_entry.location.name is not None:
+        values['location'] = ('LocationKeyphrase', {posname(1): event_entry.location.name})
+    values['attendees'] = attendees_to_values(event_entry.attendees, att_nodes)
+    values['id'] = event_entry.identifier
+    return 'Event', values
+
+
 def match_subject(ev: EventEntry, filt):
     return True if filt is None or filt in ev.subject else False
 
@@ -281,8 +352,8 @@ class GraphDB(Storage):
         recipient_entry = self.get_recipient_entry(self._current_recipient_id)
         recipient_graph = self.get_recipient_graph(self._current_recipient_id, d_context)
         attendee = AttendeeEntry(None, recipient_entry, "Busy", "NotResponded")
-        string_entry = attendees_to_str_node([attendee], [recipient_graph])
-        attendee_graph, _ = Node.call_construct_eval(string_entry, d_context, constr_tag=NODE_COLOR_DB)
+        attendee_graph, _ = Node.call_construct_values_eval(*attendee_to_values(attendee, recipient_graph), d_context,
+                                                            constr_tag=NODE_COLOR_DB)
         attendee_graph.tags[DB_NODE_TAG] = 0
 
         return attendee_graph
@@ -545,8 +616,8 @@ def fill_graph_db(d_context, stub_data_file, people=None, events=None):
                                              p.email_address, p.manager_id)
 
             # create recipient graph
-            s = recipient_to_str_node(recipient_entry)
-            recipient_graph, _ = Node.call_construct_eval(s, d_context, constr_tag=NODE_COLOR_DB)
+            recipient_graph, _ = Node.call_construct_values_eval(*recipient_to_values(recipient_entry), d_context,
+                                                                 constr_tag=NODE_COLOR_DB)
             recipient_graph.tags[DB_NODE_TAG] = 0
             db_recipient[recipient_entry.identifier] = recipient_entry
             gr_recipient[recipient_entry.identifier] = recipient_graph
@@ -598,8 +669,8 @@ def fill_graph_db(d_context, stub_data_file, people=None, events=None):
             event_entry = EventEntry(e.id, e.subject, str_to_datetime(e.start), str_to_datetime(e.end), location,
                                      organizer, attendees)
 
-            s = event_to_str_node(event_entry, pnodes)
-            d, _ = Node.call_construct_eval(s, d_context, constr_tag=NODE_COLOR_DB)
+            d, _ = Node.call_construct_values_eval(*event_to_values(event_entry, pnodes), d_context,
+                                                   constr_tag=NODE_COLOR_DB)
             d.tags[DB_NODE_TAG] = 0
             db_event[event_entry.identifier] = event_entry
             gr_event[event_entry.identifier] = d
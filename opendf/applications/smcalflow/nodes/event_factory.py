@@ -863,7 +863,7 @@ class DatabaseEventFactory(EventFactory):
         completed_suggestions = []
         clashed_suggestions = []
         all_suggestions = []
-        with self.database.engine.connect() as connection:
+        with self.database.connect() as connection:
             minimum_interval = timedelta(minutes=30 - 1)
             last_complete_start = None
             last_clashed_start = None
@@ -1363,14 +1363,28 @@ class FindEvents(Node):
     Finds an event, given a constraint made of modifiers.
     """
 
+    reuse_dup_result = True  # the search is repeated (after revise) only if the constraint or the DB changed
+
     # TODO: first do refer() (without fallback, only complete events?)
     def __init__(self):
         super().__init__(Event)
         self.signature.add_sig(posname(1), Node, True, alias='constraint')
         self.signature.add_sig('tmp', Node, ptags=['omit_dup'])  # tmp is used for debugging - to draw the pruned tree
         self.signature.set_multi_res(True)  # may return multiple objects as result
+        self.data_version = None  # the version of the DB used for the search
+
+    def can_reuse_dup_result(self):
+        return self.dup_of.data_version is not None and self.dup_of.data_version == storage.get_data_version() and \
+            not environment_definitions.show_SQL
+
+    def do_reuse_dup_result(self):
+        if super().do_reuse_dup_result():
+            self.data_version = self.dup_of.data_version
+            return True
+        return False
 
     def exec(self, all_nodes=None, goals=None):
+        self.data_version = storage.get_data_version()
         constr = self.input_view('constraint')
 
         if constr:
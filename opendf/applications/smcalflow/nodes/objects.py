@@ -372,6 +372,9 @@ class Recipient(Node):
                 eq.append(o)
         return eq
 
+    def equivalence_key(self):
+        return ('id', self.get_dat('id')) if self.is_complete() else self.id
+
     def add_like(self):
         if not self.is_complete():
             nm, fn, ln = self.input_view('name'), self.input_view('firstName'), self.input_view('lastName')
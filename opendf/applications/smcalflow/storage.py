@@ -255,6 +255,17 @@ class Storage(ABC):
         """
         pass
 
+    def get_data_version(self):
+        """
+        Gets the version of the stored data. It changes whenever the data is changed - also by another process using the
+        same storage - so that results which were computed from the data can be reused while it is unchanged. A storage
+        which can't see the changes of the other processes must return `None`.
+
+        :return: the version of the data, or `None` if the storage does not track its changes
+        :rtype: Optional[Hashable]
+        """
+        return None
+
     @abstractmethod
     def get_current_recipient_entry(self):
         """
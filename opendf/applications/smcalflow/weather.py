@@ -21,7 +21,7 @@ def time_filter_weather_dict(dct, filt: DateTime):
             pdt = Pdate_to_Pdatetime(dt)
             n = DateTime.from_Pdatetime(pdt, None, register=False)
             for h in dc[dt]:
-                n.inputs['time'].inputs['hour'].data = h  # more efficient, in-place mod instead of create new node
+                n.inputs['time'].inputs['hour'].set_data(h)  # more efficient, in-place mod instead of create new node
                 if filt.match(n, match_miss=True):
                     if l not in fdc:
                         fdc[l] = {}
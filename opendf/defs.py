@@ -63,16 +63,28 @@ class EnvironmentDefinition:
 
     __instance = None
 
+    # named sets of values, which can be applied together - see `apply_profile`
+    PROFILES = {
+        'production': {
+            'check_dangling_nodes': False,  # debug only
+        },
+    }
+
     @staticmethod
     def get_instance() -> "EnvironmentDefinition":
         """
         Static access method.
 
+        The profile given by the `DF_PROFILE` environment variable (if any) is applied first, then the values of
+        the environment variables of the single attributes.
+
         :return: the database instance
         :rtype: "EnvironmentDefinition"
         """
         if EnvironmentDefinition.__instance is None:
             definition = EnvironmentDefinition()
+            if os.getenv('DF_PROFILE'):
+                definition.apply_profile(os.getenv('DF_PROFILE'))
             definition._update_values_from_env()
             EnvironmentDefinition.__instance = definition
         return EnvironmentDefinition.__instance
@@ -152,6 +164,37 @@ class EnvironmentDefinition:
 
         self.exit_on_python_exception = False  # <<
 
+        self.profile_eval = False  # collect per turn evaluation timing per node type (see DialogContext.eval_profiles)
+        self.parallel_eval = False  # read in advance, in parallel, the data of independent input subtrees which have
+        #                             `parallel_fetch` nodes (see Node.fetch, eval.py). Only for data the dialogues do
+        #                             not change (the threads don't see the writes of the turn), and ignored with an
+        #                             in-memory SQLite database - see threads_share_connection
+        self.parallel_eval_workers = 4  # number of threads for parallel_eval
+        self.batch_turn_workers = 1  # number of threads for OpenDFDialogue.run_turn_batch (1 - turns one by one)
+        #                              (ignored with an in-memory SQLite database - see threads_share_connection)
+        self.check_dangling_nodes = True  # sanity check of the graph links after each turn (debug) - see eval.py
+        self.check_checkpoints = False  # compare all the nodes to their state at the previous checkpoint, to find the
+        #                                 changes which were not notified (debug) - see ContextCheckpointer
+        self.reuse_dup_results = True  # duplicated nodes with unchanged inputs reuse the result of the original node
+        #                                (only for types which allow it - see Node.reuse_dup_result)
+        self.pexp_cache_size = 4096  # number of parsed P-expressions kept by the parser cache (0 disables the cache)
+        self.precomputed_parser_tables = True  # load the P-expression parser tables shipped with the package, instead
+        #                                        of generating them at startup (see pexp_parser.create_parser)
+        self.lazy_sample_nodes = True  # instantiate the sample node of a type on its first use, instead of at startup
+        #                                (see NodeFactory.sample_nodes)
+        self.intern_leaf_nodes = False  # share the terminal nodes (base types, and leaf types holding them) of the DB
+        #                                 graphs of a context, instead of creating them per graph (see constr_graph)
+        self.turn_database_connection = True  # the queries of a turn reuse one database connection (and transaction)
+        #                                       instead of one per query (see database_utils.connection_scope)
+        self.database_pool_size = 5  # connections kept in the pool of the database engine (not for SQLite)
+        self.database_max_overflow = 10  # connections opened beyond database_pool_size when needed (not for SQLite)
+        self.database_pool_pre_ping = False  # test the connections on checkout (e.g. after a restart of the database)
+        self.entity_cache_size = 10000  # DB entities (entries and graph templates) kept by the cache shared by the
+        #                                 dialogues, least recently used first out (0 disables it - see EntityCache)
+        self.entity_cache_ttl = None  # seconds the SMCalFlow entities (events, recipients) are used by the entity
+        #                               cache before they are read again, on top of the check of the data version (for
+        #                               writes which don't go through Database). None: until the data changes
+
         self.populating_db = False  # True only when running populate_db
         self.agent_oracle = False  # True when running dialogs with the agent's responses (e.g. multiwoz dataset)
         self.oracle_only = False  # when using agent_oracle - if False then mix node logic with oracle info
@@ -174,6 +217,20 @@ class EnvironmentDefinition:
         if arguments:
             self.update_values(**arguments)
 
+    def apply_profile(self, name):
+        """
+        Updates the values of the variables to those of the given profile.
+
+        :param name: the name of the profile, one of `PROFILES`
+        :type name: str
+        """
+        if name not in self.PROFILES:
+            raise ValueError('Unknown environment profile: %s' % name)
+        for key, value in self.PROFILES[name].items():
+            if not hasattr(self, key):
+                raise NoEnvironmentAttributeException(self.__class__.__name__, key)
+            setattr(self, key, value)
+
     def update_values(self, **kwargs):
         """
         Updates the values of the variables based on the `kwargs`.
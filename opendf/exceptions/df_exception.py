@@ -3,6 +3,7 @@ File containing Dataflow exceptions.
 These are the exceptions which the user can do something about.
 """
 
+import copyreg
 from abc import ABC
 from typing import Sequence
 from opendf.utils.utils import Message
@@ -53,8 +54,8 @@ class DFException(Exception, ABC):
             self.turn = node.context.turn_num  # the turn when this exception was created (not when node was created)
 
     def __reduce__(self):
-        return (self.__class__, (
-            self.message, self.node, self.hints, self.suggestions, self.orig, self.chain, self.objects, self.turn))
+        # recreate the exception without calling __init__ (subclasses have different signatures), then set its fields
+        return copyreg.__newobj__, (self.__class__,) + self.args, self.__dict__
 
     def chain_end(self):
         return self.chain.chain_end() if self.chain else self
@@ -86,9 +87,6 @@ class NoReviseMatchException(DFException):
     def __init__(self, node, message="No revise match", hints=None, suggestions=None, orig=None, chain=None, objects=None):
         super().__init__(message, node, hints=hints, suggestions=suggestions, orig=orig, chain=chain, objects=objects)
 
-    def __reduce__(self):
-        return (self.__class__, (
-            self.node, self.message, self.hints, self.suggestions, self.orig, self.chain, self.objects))
 
 class InvalidResultException(DFException):
     """
@@ -188,9 +186,6 @@ class MissingValueException(InvalidInputException):
         super().__init__(message, node, hints=hints, suggestions=suggestions, orig=orig, chain=chain, objects=objects)
         self.key = key
 
-    def __reduce__(self):
-        return (self.__class__, (
-            self.key, self.node, self.message, self.hints, self.suggestions, self.orig, self.chain, self.objects))
 
 class NoPropertyException(DFException):
     """
@@ -211,9 +206,6 @@ class WrongSuggestionSelectionException(DFException):
             message = "I'm not sure which suggestion you're referring to. Please be explicit"
         super().__init__(message, node, hints=hints, suggestions=suggestions, orig=orig, chain=chain, objects=objects)
 
-    def __reduce__(self):
-        return (self.__class__, (self.node, self.hints, self.suggestions, self.orig, self.chain,
-                                 self.message, self.objects))
 
 class ElementNotFoundException(DFException):
     """
@@ -10,7 +10,7 @@ from opendf.utils.utils import cast_str_val, get_type_and_clevel
 from opendf.utils.simplify_exp import indent_sexp
 from opendf.defs import is_pos, posname, posname_idx
 from opendf.exceptions import re_raise_exc
-from opendf.parser.pexp_parser import parse_p_expressions, ASTNode
+from opendf.parser.pexp_parser import parse_p_expressions, ASTNode, terminal_value
 from opendf.graph.dialog_context import DialogContext
 
 # Intentionally does not formally depend on Node
@@ -18,6 +18,7 @@ from opendf.graph.dialog_context import DialogContext
 logger = logging.getLogger(__name__)
 
 node_fact = NodeFactory.get_instance()
+environment_definitions = EnvironmentDefinition.get_instance()
 
 
 # TODO - after moving to new construct code
@@ -59,8 +60,8 @@ def construct_graph(sexp, d_context, register=True, top_only=False, constr_tag=R
 
     Note: we do not add goals to dialog context here, for now.
 
-    :param sexp: the S-expression
-    :type sexp: str
+    :param sexp: the S-expression, or its parsed tree (e.g. from `PExpTemplate.bind`)
+    :type sexp: str or ASTNode
     :type register: bool  # TODO - do we really need register=False???
     :type top_only: bool
     :param no_post_check: if `True`, don't perform post construction test
@@ -72,7 +73,9 @@ def construct_graph(sexp, d_context, register=True, top_only=False, constr_tag=R
         no_exit = True
 
     root = None
-    if sexp.startswith('$#'):  # if sexp is a link to an existing node, just return it, don't construct
+    if isinstance(sexp, ASTNode):
+        prs = [sexp]
+    elif sexp.startswith('$#'):  # if sexp is a link to an existing node, just return it, don't construct
         # todo - same for '$name'
         ss = re.sub('[)(]', '', sexp[2:])
         if ss.isnumeric() and d_context.get_node(int(ss)):
@@ -80,18 +83,19 @@ def construct_graph(sexp, d_context, register=True, top_only=False, constr_tag=R
         if ')' in sexp:  # syntax fix: "$#17" --> "$#17()"
             sexp += '()'
 
-    logger.debug('::::::: ' + sexp)
+    logger.debug('::::::: %s', sexp)
     # print('\n++++ : ' + sexp)
 
     d_context = d_context if d_context or register == False else DialogContext()
-    try:
-        prs = parse_p_expressions(sexp)
-    except Exception as ex:
-        if sexp and sexp.count('(')!=sexp.count(')'):
-            print('\n> > >Unbalanced brackets: #open - #close = %d\n\n'%
-                  (sexp.count('(')!=sexp.count(')')) + indent_sexp(sexp, sep_brack=True) + '\n')
-        # print(sexp)
-        re_raise_exc(ex)
+    if not isinstance(sexp, ASTNode):
+        try:
+            prs = parse_p_expressions(sexp)
+        except Exception as ex:
+            if sexp and sexp.count('(')!=sexp.count(')'):
+                print('\n> > >Unbalanced brackets: #open - #close = %d\n\n'%
+                      (sexp.count('(')!=sexp.count(')')) + indent_sexp(sexp, sep_brack=True) + '\n')
+            # print(sexp)
+            re_raise_exc(ex)
 
     try:
         root = ast_top_down_construct(prs[0], None, d_context, register=register, top_only=top_only,
@@ -230,6 +234,7 @@ def ast_top_down_construct(ast, parent, d_context, register=True, top_only=False
     #logger.debug(ast.name)
     typ, clv = get_type_and_clevel(ast.name)
     ptyp = parent.typename() if parent else None
+    intern_key = None
 
     if ast.is_assign:
         if not d_context:
@@ -249,23 +254,16 @@ def ast_top_down_construct(ast, parent, d_context, register=True, top_only=False
             parent.data = v
             return None  # no need for further processing - no node was created
         else:  # need to add a base type Node
-            tp = str_to_type(ast.name)  # default - inferring type from value format
-            is_leaf = False
-            if parent and ast.role and ast.role in parent.signature:
-                tps = parent.signature.match_tnames(ast.role, base_types)
-                if tps:
-                    if tp not in tps:
-                        if tp=='Str' and tps[0] in ['Int', 'Float']:
-                            raise SemanticException('Expected numeric input to %s.%s, got "%s"' % (ptyp, ast.role, typ))
-                        tp = tps[0]
-                else:
-                    tps = parent.signature.match_tnames(ast.role, node_fact.leaf_types)
-                    if tps:
-                        is_leaf = True
-                        if tp not in tps:
-                            tp = tps[0]
-                        ast.inputs.append(
-                            (posname(1), ASTNode(is_terminal=True, name=ast.name, parent=ast, role=posname(1))))
+            tp, is_leaf = terminal_type(ast.name, parent, ast.role)
+            if interning_terminals(d_context, register, constr_tag) and not ast.special_features and \
+                    not ast.tags and not ast.set_assign:
+                intern_key = (ptyp, ast.role, tp, ast.name)
+                n = get_interned_terminal(d_context, intern_key)
+                if n:
+                    n.connect_in_out(ast.role, parent)
+                    return n
+            if is_leaf:
+                ast.inputs.append((posname(1), ASTNode(is_terminal=True, name=ast.name, parent=ast, role=posname(1))))
             n = node_fact.gen_node(d_context, tp, register=register, constr_tag=constr_tag)
             if not is_leaf:
                 n.data = cast_str_val(n, ast.name)
@@ -320,19 +318,175 @@ def ast_top_down_construct(ast, parent, d_context, register=True, top_only=False
     for (nm, nd) in ast.inputs:
         _ = ast_top_down_construct(nd, n, d_context, register, False, constr_tag)
 
+    set_copied_out_type(n)
+    if intern_key:
+        intern_terminal(d_context, intern_key, n)
+
+    return n
+
+
+def interning_terminals(d_context, register, constr_tag):
+    """
+    Checks if the terminal nodes of a graph are shared - i.e. for the graphs of DB rows (constructed with the tag
+    `NODE_COLOR_DB`), if `intern_leaf_nodes` is set.
+
+    The terminal nodes (a base type node, or a leaf type node with its base type input) of DB graphs are immutable
+    once evaluated, and the same values repeat in many rows, so a terminal gets one node per context, which is an input
+    of all the graphs using it (its `outputs` list all of them, as for any node with several parents). The node is
+    shared only between parents of the same type, for the same input - so that searches by role (refer, revise) see
+    the same input names and parent types as with separate nodes.
+    """
+    return environment_definitions.intern_leaf_nodes and register and d_context is not None and \
+        constr_tag == NODE_COLOR_DB
+
+
+def get_interned_terminal(d_context, key):
+    """
+    Gets the shared node for a terminal value, if there is one - and it was not changed since it was constructed.
+
+    :param key: the type name of the parent, the input name, the type name of the terminal node, and the value
+    :type key: Tuple[str, str, str, str]
+    :rtype: Node or None
+    """
+    interned = d_context.interned_nodes.get(key)
+    if interned is None:
+        return None
+    n, data = interned
+    leaf = n.inputs.get(posname(1)) if len(n.inputs) == 1 else None if n.inputs else n
+    if leaf is None or leaf.inputs or leaf.data != data or n.result is not n or n.mutable or \
+            d_context.idx_to_node.get(n.id) is not n:
+        del d_context.interned_nodes[key]
+        return None
+    return n
+
+
+def intern_terminal(d_context, key, n):
+    leaf = n.inputs[posname(1)] if n.inputs else n
+    d_context.interned_nodes[key] = (n, leaf.data)
+
+
+def terminal_type(value, parent, role):
+    """
+    Gets the type of the node to create for a terminal value (which is not directly the data of a base type parent).
+
+    :param value: the terminal value
+    :type value: str
+    :param parent: the node the terminal is an input of
+    :type parent: Node or None
+    :param role: the input name of the terminal in `parent`
+    :type role: str or None
+    :return: the type name; and `True` if it's a leaf type (which holds the value in a base type input node)
+    :rtype: Tuple[str, bool]
+    """
+    tp = str_to_type(value)  # default - inferring type from value format
+    if parent and role and role in parent.signature:
+        tps = parent.signature.match_tnames(role, base_types)
+        if tps:
+            if tp not in tps:
+                if tp == 'Str' and tps[0] in ['Int', 'Float']:
+                    raise SemanticException('Expected numeric input to %s.%s, got "%s"' %
+                                            (parent.typename(), role, value))
+                tp = tps[0]
+        else:
+            tps = parent.signature.match_tnames(role, node_fact.leaf_types)
+            if tps:
+                return (tp if tp in tps else tps[0]), True
+    return tp, False
+
+
+def set_copied_out_type(n):
+    # operators with dynamic out type get the out type of their input
     if n.is_operator() and n.outypename() == 'Node' and n.copy_in_type and n.copy_in_type in n.inputs and \
             n.input_view(n.copy_in_type).outypename() != 'Node':
         n.out_type = n.input_view(n.copy_in_type).out_type
 
+
+def construct_graph_from_values(typename, values, d_context, register=True, constr_tag=RES_COLOR_TAG,
+                                no_post_check=False):
+    """
+    Constructs the graph of a node of type `typename`, with the given input values - builds the same graph as
+    constructing the P-expression `typename(name1=value1, name2=value2, ...)`, but directly - without formatting the
+    P-expression and parsing it (e.g. for graphs of DB rows).
+
+    Each value can be:
+        - a node - used as is as the input (like `$#17`);
+        - a pair `(typename, values)` - a sub-graph, constructed the same way;
+        - any other value (str, int...) - the terminal value `terminal_value(value)` - which gets a base type node (or
+          a leaf type node with a base type input), according to the signature.
+
+    Inputs whose value is `None` are skipped. The input names should be the real names (e.g. `posname(1)` for the first
+    positional input).
+
+    :param typename: the type of the root node
+    :type typename: str
+    :param values: the inputs of the root node - { input name : value }
+    :type values: Dict[str, Any]
+    :return: the root of the constructed graph
+    :rtype: Node
+    """
+    d_context = d_context if d_context or register == False else DialogContext()
+    root = construct_from_values(typename, values, None, None, d_context, register, constr_tag)
+    if not no_post_check:
+        check_constr_graph(root)
+    return root
+
+
+def construct_from_values(typename, values, parent, role, d_context, register, constr_tag):
+    n = node_fact.create_node_from_type_name(d_context, typename, register, constr_tag)
+    if parent:
+        n.connect_in_out(role, parent)
+    for nm, value in values.items():
+        if value is None:
+            continue
+        if isinstance(value, tuple):
+            construct_from_values(value[0], value[1], n, nm, d_context, register, constr_tag)
+        elif isinstance(value, node_fact.node_types['Node']):
+            value.connect_in_out(nm, n)
+        else:
+            construct_terminal(terminal_value(value), n, nm, d_context, register, constr_tag)
+    set_copied_out_type(n)
     return n
 
 
+def construct_terminal(value, parent, role, d_context, register, constr_tag):
+    if parent.typename() in base_types:
+        v = cast_str_val(parent, value)
+        if v is None:
+            raise SemanticException('"%s" is not valid data for base node %s' % (value, parent.typename()))
+        parent.data = v
+        return
+    tp, is_leaf = terminal_type(value, parent, role)
+    interning = interning_terminals(d_context, register, constr_tag)
+    if interning:
+        n = get_interned_terminal(d_context, (parent.typename(), role, tp, value))
+        if n:
+            n.connect_in_out(role, parent)
+            return
+    n = node_fact.create_node_from_type_name(d_context, tp, register, constr_tag)
+    n.connect_in_out(role, parent)
+    if is_leaf:
+        construct_terminal(value, n, posname(1), d_context, register, constr_tag)
+    else:
+        n.data = cast_str_val(n, value)
+    if interning:
+        intern_terminal(d_context, (parent.typename(), role, tp, value), n)
+
+
 # TODO: bottom up inference for out_type!!
 
 
-# TODO: non-recursive - loop on topological list
-# post construction node check - DFS order
+# post construction node check - DFS order (each node is checked once, after its inputs)
 def check_constr_graph(node):
-    for name in node.inputs:
-        check_constr_graph(node.inputs[name])
-    node.post_construct_check()
+    checked = set()
+    stack = [(node, iter(list(node.inputs.values())))]
+    while stack:
+        nd, inputs = stack[-1]
+        for inp in inputs:
+            if inp not in checked:
+                stack.append((inp, iter(list(inp.inputs.values()))))
+                break
+        else:
+            stack.pop()
+            if nd not in checked:
+                checked.add(nd)
+                nd.post_construct_check()
@@ -6,14 +6,23 @@ Singleton class to hold goals and exceptions, and to assign unique node ids.
 from opendf.defs import *
 from opendf.exceptions.df_exception import DFException
 from opendf.exceptions import parse_node_exception
+from opendf.graph.eval_profile import EvalProfile
+from opendf.graph.graph_index import ReachableIndex, TypeIndex
 import opendf.graph.nodes.node as node
 from copy import copy
+from itertools import islice
+import threading
 
 # Intentionally does not formally depend on Node
 from opendf.exceptions.python_exception import SemanticException
 from opendf.utils.utils import Message
 
 logger = logging.getLogger(__name__)
+environment_definitions = EnvironmentDefinition.get_instance()
+
+# serialises the change notifications of the nodes (`node_changed`, `graph_changed`), which the parallel evaluation
+#   makes from several threads (see `opendf.graph.eval`). Not kept in the context, which is pickled
+_changes_lock = threading.RLock()
 
 
 class DialogContext:
@@ -70,7 +79,23 @@ class DialogContext:
         self.internal_data = {}  # new mechanism to hold nodes' internal data during packing and unpacking
         self.gen_curr_top = None  # hack - should be passed as function param (gen_user)
 
+        self.graph_version = 0  # incremented on every change of the graph links or the goals
+        self.reach_index = ReachableIndex()  # nodes reachable from the goals - see reachable_nodes()
+        self.type_index = TypeIndex()  # registered nodes by type - see nodes_of_types()
+        self.eval_profiles = {}  # { turn_num : EvalProfile } - see get_eval_profile()
+        self.checked_nodes = 0  # number of registered nodes already given by unchecked_nodes()
+        self.changed_nodes = {}  # nodes whose links changed since the last call to unchecked_nodes() (ordered set)
+        self.interned_nodes = {}  # shared terminal nodes of DB graphs - see constr_graph.interning_terminals
+        self.struct_ids = {}  # ids of the structures of graphs - see Node.struct_id (kept by the nodes - never cleared)
+        #                           { (parent typename, input name, typename, value) : (node, data) }
+        self.db_graphs = {}  # graphs of DB entities in this context - see EntityCache.get_context_graph
+        #                      { (entity kind, identifier) : (entity stamp, node) }
+        self.change_log = None  # changes since the last checkpoint, if the context is checkpointed - see ChangeLog
+
     def clear(self):
+        if self.change_log is not None:
+            self.change_log.removed.extend(self.idx_to_node)
+            self.change_log.last_id = -1
         self.idx_to_node = {}
         self.goals = []
         self.exceptions = []
@@ -88,6 +113,14 @@ class DialogContext:
         self.mem = {}
         self.no_trans = False
         self.no_eval = False
+        self.graph_version += 1
+        self.reach_index.clear()
+        self.type_index.clear()
+        self.eval_profiles = {}
+        self.checked_nodes = 0
+        self.changed_nodes = {}
+        self.interned_nodes = {}
+        self.db_graphs = {}
 
     # register a node - give it an id and add it to dict of nodes.
     # if renumber is given, force the given id. if that id already exists (should not happen!) - warn and get a new id
@@ -100,12 +133,16 @@ class DialogContext:
                     raise Exception("bad renumber %s" % renumber)
                 if node.id is not None:
                     del self.idx_to_node[node.id]
+                    if self.change_log is not None:
+                        self.change_log.removed.append(node.id)
+                        self.change_log.changed[node] = None
             i = renumber if renumber is not None else len(self.idx_to_node) + self.register_offset
             while i in self.idx_to_node:  # avoid overwriting existing node id
                 i += 1
             self.idx_to_node[i] = node
             node.id = i
             node.context = self
+            self.type_index.add(node)
 
     def num_registered(self):
         return len(self.idx_to_node)
@@ -115,6 +152,9 @@ class DialogContext:
             logger.warning('Error - trying to replace non existing node - %d', id)
             exit(1)
         self.idx_to_node[id] = node
+        self.type_index.add(node)
+        if self.change_log is not None:
+            self.change_log.changed[node] = None
 
     # def get_node(self, idx):
     #     if idx in self.idx_to_node:
@@ -122,6 +162,7 @@ class DialogContext:
     #     return None
 
     def add_goal(self, g, allow_dup=False, move_up=True):
+        self.graph_changed()
         if g not in self.goals or allow_dup:
             self.goals.append(g)
         elif move_up:
@@ -134,9 +175,97 @@ class DialogContext:
         n = len(self.goals)
         if i1 != i2 and -n < i1 < n and -n < i2 < n:
             self.goals[i1], self.goals[i2] = self.goals[i2], self.goals[i1]
+            self.graph_changed()
 
     def remove_goal(self, g):
         self.goals = [i for i in self.goals if i != g]
+        self.graph_changed()
+
+    def graph_changed(self):
+        with _changes_lock:
+            self.graph_version += 1
+
+    def rebuild_indexes(self):
+        """
+        Rebuilds the indexes of the nodes from the registered nodes - after the nodes were changed, added or removed
+        without notifying the context (e.g. when restoring a snapshot, see `opendf.graph.snapshot`).
+        """
+        self.graph_changed()
+        self.reach_index.clear()
+        self.type_index.clear()
+        for nd in self.idx_to_node.values():
+            self.type_index.add(nd)
+            nd.clear_struct_ids()
+        self.checked_nodes = 0
+        self.changed_nodes = {}
+
+    def node_changed(self, nd, links=True):
+        """
+        Called (by `Node.mark_changed`) when the links of a node changed - or, if not `links`, only its other fields
+        (flags, tags...), which matter only to the checkpoints.
+        """
+        with _changes_lock:
+            if links:
+                self.graph_version += 1
+                self.reach_index.invalidate(nd)
+                if environment_definitions.check_dangling_nodes:
+                    self.changed_nodes[nd] = None
+            if self.change_log is not None and nd.id is not None and nd.id <= self.change_log.last_id:
+                self.change_log.changed[nd] = None  # (the new nodes are found by their ids)
+
+    def unchecked_nodes(self):
+        """
+        Gets the nodes which were registered, or whose links changed, since the previous call - for incremental sanity
+        checks of the graph (see `check_dangling_nodes`). Changes are tracked only if the check is enabled.
+
+        :return: the nodes, new nodes first (in registration order)
+        :rtype: List[Node]
+        """
+        nodes = list(islice(self.idx_to_node.values(), self.checked_nodes, None))
+        self.checked_nodes = len(self.idx_to_node)
+        new = set(nodes)
+        nodes.extend(n for n in self.changed_nodes if n not in new)
+        self.changed_nodes = {}
+        return nodes
+
+    def reachable_nodes(self):
+        """
+        Gets the nodes reachable from the goals - the same nodes, in the same order, as
+        `Node.collect_nodes(self.goals)`, but maintained incrementally: only the goals which changed since the last
+        call are walked again.
+
+        Note: changes in the goal list are detected automatically, but changes in node links must be notified - see
+        `Node.mark_changed`.
+
+        :return: a read-only view (snapshot) of the reachable nodes
+        :rtype: ReachableNodes
+        """
+        return self.reach_index.get(self.goals)
+
+    def nodes_of_types(self, typenames, clevel=None):
+        """
+        Gets the registered nodes of the given types (and constraint level, if given).
+
+        :rtype: Set[Node]
+        """
+        return self.type_index.get(typenames, clevel)
+
+    def is_type_indexed(self, node):
+        return node in self.type_index.nodes
+
+    def get_eval_profile(self, turn=None):
+        """
+        Gets the evaluation profile of the given turn (default - the current turn). The profile of the current turn is
+        created if needed, profiles of other turns may be missing.
+
+        :return: the evaluation profile
+        :rtype: Optional[EvalProfile]
+        """
+        if turn is None:
+            turn = self.turn_num
+            if turn not in self.eval_profiles:
+                self.eval_profiles[turn] = EvalProfile(turn)
+        return self.eval_profiles.get(turn)
 
     # if only_one_exception - keep only one exception (to display / report to user)
     #   - generally, this means we keep only the LAST exception of the evaluation.
@@ -344,13 +473,14 @@ class DialogContext:
         for g in goals + self.other_goals:
             nds = g.topological_order()
             nodes += nds
+        node_set = set(nodes)
 
         # if no suggestions (especially - no suggestions referring to specific node numbers!) -
         #    then we could renumber the nodes, to keep the index low
         #    (but that would mean different node id's between turns, which could be confusing for debugging)
 
         # get the graphs for the goals - excluding result
-        seen = []
+        seen = set()
         pack.goals = []
         for ig, g in enumerate(goals):
             st, seen = g.compr_tree(seen)
@@ -385,7 +515,7 @@ class DialogContext:
                 pack.res_pnt[n.id] = n.result.id
 
         for e in self.exceptions:
-            if e.node in nodes:
+            if e.node in node_set:
                 # ee = type(e)(e.message, e.node.id, hints=e.hints, suggestions=e.suggestions, orig=e.orig,
                 # chain=e.chain)
                 # ee = e.dup()
@@ -394,11 +524,11 @@ class DialogContext:
                 pack.exceptions.append(ee)
 
         for e in self.exception_nodes:
-            if e in nodes:
+            if e in node_set:
                 pack.exception_nodes.append(e.id)
 
         for e in self.copied_exceptions:
-            if e in nodes:
+            if e in node_set:
                 pack.copied_exceptions.append(e.id)
 
         pack.prev_agent_hints = self.prev_agent_hints
@@ -474,6 +604,25 @@ class DialogContext:
 
         return unpack
 
+    def get_snapshot_data(self):
+        """
+        Gets the data of subclasses of the context, to be stored in a snapshot (see `opendf.graph.snapshot`). Nodes in
+        the data are stored as references.
+
+        :return: the data
+        :rtype: Dict[str, Any]
+        """
+        return {}
+
+    def set_snapshot_data(self, data):
+        """
+        Sets the data given by `get_snapshot_data`, when restoring the context from a snapshot.
+
+        :param data: the data
+        :type data: Dict[str, Any]
+        """
+        pass
+
     # make a copy of this context, through packing and unpacking (some info is not preserved!)
     def make_copy_with_pack(self):
         nd = self.get_node(0)  # needs a dummy node as input, to access Node functions
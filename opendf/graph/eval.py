@@ -2,14 +2,20 @@
 Evaluates the graph.
 """
 
+import time
 import traceback
+from concurrent.futures import ThreadPoolExecutor
 
 from opendf.defs import *
 from opendf.exceptions import DFException
 from opendf.exceptions.python_exception import EvaluationError
 from opendf.graph.nodes.node import Node
+from opendf.utils.database_utils import threads_share_connection
 
 logger = logging.getLogger(__name__)
+environment_definitions = EnvironmentDefinition.get_instance()
+
+_executor = None  # thread pool of the parallel evaluation - created on first use
 
 
 # TODO: this function may finally go back into the Graph class
@@ -23,16 +29,202 @@ def evaluate_graph(goal, add_goal=True):
         logger.debug('graph has no goals!')
     else:
         goals = d_context.goals if d_context else []
-        prev_nodes = Node.collect_nodes(goals)
+        prev_nodes = d_context.reachable_nodes() if d_context else []
         if add_goal:
             goal.context.add_goal(goal)  # construction succeeded, so we add the new goal
         # TODO: revise nodes (any others?) should not really be added to the graph (should not be candidates for
         #  search). We add them anyway, just so we can draw the graphs, but in revise nodes exec - we explicitly
         #  exclude them
-        o, e = recursive_eval(goal, prev_nodes, goals)
+        profile = d_context.get_eval_profile() if d_context and environment_definitions.profile_eval else None
+        o, e = recursive_eval(goal, prev_nodes, goals, profile, parallel=environment_definitions.parallel_eval)
     return e
 
 
+class _EvalFrame:
+    """
+    The state of the evaluation of one node (one level of the - former - recursion).
+    """
+
+    __slots__ = ('node', 'ok', 'exs', 'keys', 'pos', 'in_res')
+
+    def __init__(self, node):
+        self.node = node
+        self.ok = True
+        self.exs = []
+        self.keys = list(node.inputs.keys()) if not node.evaluated else []  # TODO: verify not needed!
+        self.pos = 0  # next input to evaluate
+        self.in_res = False  # True when waiting for the evaluation of the result
+
+
+def _evaluate_node(node, prev_nodes, prev_goals, profile, outcomes):
+    if node in outcomes:  # already evaluated apart (and failed) - replay the exception, in the original order
+        raise outcomes.pop(node)
+    if profile is None:
+        node.evaluate(prev_nodes, prev_goals)
+        return
+    start, failed = profile.start(), True
+    try:
+        node.evaluate(prev_nodes, prev_goals)
+        failed = False
+    finally:
+        profile.stop(node.typename(), start, failed)
+
+
+def _get_executor():
+    global _executor
+    if _executor is None:
+        _executor = ThreadPoolExecutor(max_workers=environment_definitions.parallel_eval_workers,
+                                       thread_name_prefix='eval')
+    return _executor
+
+
+def _can_eval_apart(node, memo, assigned):
+    """
+    Checks if the subtree under `node` can be evaluated apart (in another thread): each of its nodes which are not
+    evaluated yet is either pure (see `Node.is_pure_eval`, and is not waiting for a result assignment), or a
+    `parallel_fetch` node (which is only fetched there); and none of its evaluated nodes needs its result evaluated.
+    """
+    stack = [node]
+    while stack:
+        n = stack[-1]
+        if n in memo:
+            stack.pop()
+        elif n.evaluated:
+            memo[n] = n.result == n or not n.eval_res
+            stack.pop()
+        elif not type(n).parallel_fetch and (not n.is_pure_eval() or n in assigned):
+            memo[n] = False
+            stack.pop()
+        else:
+            pending = [i for i in n.inputs.values() if i not in memo]
+            if pending:
+                stack.extend(pending)
+            else:
+                memo[n] = all(memo[i] for i in n.inputs.values())
+                stack.pop()
+    return memo[node]
+
+
+def _unevaluated_subtree(node):
+    nodes, stack = set(), [node]
+    while stack:
+        n = stack.pop()
+        if n not in nodes and not n.evaluated:
+            nodes.add(n)
+            stack.extend(n.inputs.values())
+    return nodes
+
+
+def _eval_apart(node, prev_nodes, prev_goals):
+    """
+    Evaluates the subtree under `node` (see `_can_eval_apart`) as far as it can be done in another thread - bottom up,
+    in the same order as `recursive_eval`: the pure nodes are evaluated, and the `parallel_fetch` nodes are fetched
+    (see `Node.fetch`), but not evaluated - nor are the nodes above them.
+    Exceptions are not handled here - they are returned, and replayed later by `recursive_eval` (which also takes care
+    of `allows_exception` - nodes above a failed node are not evaluated here). A failed fetch is just dropped - the exec
+    of the node reads the data again.
+
+    :return: the evaluated nodes - { node : (exception or None, evaluation time) }, and the fetched data -
+        { node : data }
+    :rtype: Tuple[Dict[Node, Tuple[Optional[Exception], float]], Dict[Node, Any]]
+    """
+    outcomes, fetched, done = {}, {}, {}  # done: { node : ok }
+    stack = [[node, list(node.inputs.keys()), 0, True]]  # [node, input names, next input, ok]
+    while stack:
+        f = stack[-1]
+        n, keys = f[0], f[1]
+        child = None
+        while f[2] < len(keys):
+            i = keys[f[2]]
+            f[2] += 1
+            if i in n.inputs:
+                if not f[3] and n.stop_eval_on_exception:
+                    break
+                c = n.inputs[i]
+                if c in done:
+                    f[3] = f[3] and done[c]
+                elif c.evaluated:
+                    if c.result != c and c.eval_res:  # leave it to the sequential evaluation
+                        f[3] = False
+                else:
+                    child = c
+                    break
+        if child is not None:
+            stack.append([child, list(child.inputs.keys()), 0, True])
+            continue
+        stack.pop()
+        ok = f[3]
+        if ok and type(n).parallel_fetch:
+            ok = False  # exec changes the graph - it's left to the sequential evaluation
+            if n.constraint_level == 0:
+                try:
+                    data = n.fetch()
+                except Exception as e:
+                    logger.debug('fetch failed (it will be repeated by exec): %s \n      %s', e, n)
+                    data = None
+                if data is not None:
+                    fetched[n] = data
+        elif ok:
+            start, ex = time.perf_counter(), None
+            try:
+                n.evaluate(prev_nodes, prev_goals)
+            except Exception as e:
+                ex, ok = e, False
+            outcomes[n] = ex, time.perf_counter() - start
+            if ok and n.result != n and n.eval_res:
+                ok = False
+        done[n] = ok
+        if stack:
+            stack[-1][3] = stack[-1][3] and ok
+    return outcomes, fetched
+
+
+def _eval_inputs_apart(node, keys, prev_nodes, prev_goals, profile, outcomes, fetched):
+    """
+    Evaluates in parallel the input subtrees of `node` which can be evaluated apart (see `_can_eval_apart`), which do
+    not share nodes, and which have `parallel_fetch` nodes. Done only if there are at least two such subtrees.
+    The failed nodes are added to `outcomes`, and the nodes whose data was fetched to `fetched`.
+    """
+    if node.stop_eval_on_exception or len(keys) < 2:
+        return
+    d_context = node.context
+    assigned = set(d_context.res_assign.values()) if d_context else set()
+    memo, taken, groups = {}, set(), []
+    for i in keys:
+        if i in node.inputs:
+            c = node.inputs[i]
+            if not c.evaluated and _can_eval_apart(c, memo, assigned):
+                sub = _unevaluated_subtree(c)
+                if taken.isdisjoint(sub) and any(type(n).parallel_fetch for n in sub):
+                    taken |= sub
+                    groups.append(c)
+    if len(groups) < 2:
+        return
+    futures = [_get_executor().submit(_eval_apart, c, prev_nodes, prev_goals) for c in groups]
+    for f in futures:
+        done, data = f.result()
+        for n, (ex, elapsed) in done.items():
+            if ex is not None:
+                outcomes[n] = ex
+            if profile:
+                profile.add(n.typename(), elapsed, ex is not None)
+        for n, d in data.items():
+            n.set_fetched(d)
+            fetched.add(n)
+
+
+def _has_fetch_nodes(node):
+    stack, seen = [node], set()
+    while stack:
+        n = stack.pop()
+        if n not in seen and not n.evaluated:
+            if type(n).parallel_fetch:
+                return True
+            seen.add(n)
+            stack.extend(n.inputs.values())
+    return False
+
+
 # recursive eval:
 # Evaluation proceeds bottom up.
 # As a rule, we assume that when a node is evaluated, all of its children have already been SUCCESSFULLY evaluated.
@@ -66,70 +258,112 @@ def evaluate_graph(goal, add_goal=True):
 #   - e:  a LIST of exceptions which occurred under the current node
 #         - possibly under result nodes as well
 #         - possibly modified list
-def recursive_eval(node, prev_nodes, prev_goals):
-    d_context = node.context
-    logger.debug(node)
-    ok = True
-    exs = []
-    if not node.evaluated:  # TODO: verify not needed!
-        keys = list(node.inputs.keys())
-        for i in keys:
-            if i in node.inputs:
-                # we evaluate all children - even if one has exception - promote graph development - their
-                #   computations are independent
-                if not ok and node.stop_eval_on_exception:
-                    break
-                o, e = recursive_eval(node.inputs[i], prev_nodes, prev_goals)
-                ok = ok and o
+def recursive_eval(node, prev_nodes, prev_goals, profile=None, parallel=False):
+    # the recursion is unrolled into an explicit stack of frames, so deep graphs do not hit the recursion limit.
+    # The order of evaluation is the same as the recursive version.
+    # profile (EvalProfile) - if given, the visits and the `evaluate` calls are recorded in it
+    # parallel - if True, the independent input subtrees which have `parallel_fetch` nodes are first evaluated apart, in
+    #            parallel (see `_eval_inputs_apart`) - unless the threads would share a DB connection. Their exceptions
+    #            are then handled here, in the normal order of evaluation
+    outcomes = {}  # nodes which failed in the parallel evaluation: { node : exception }
+    fetched = set()  # nodes whose data was fetched in advance - dropped at the end, if their exec did not use it
+    parallel = parallel and not threads_share_connection() and _has_fetch_nodes(node)
+
+    def new_frame(n):
+        logger.debug(n)
+        if profile:
+            profile.visit(n.typename())
+        frame = _EvalFrame(n)
+        if parallel and frame.keys:
+            _eval_inputs_apart(n, frame.keys, prev_nodes, prev_goals, profile, outcomes, fetched)
+        return frame
+
+    try:
+        stack = [new_frame(node)]
+        ret = None  # (ok, exs) returned by the frame which was just popped
+        while True:
+            f = stack[-1]
+            node = f.node
+            if ret is not None:
+                o, e = ret
+                ret = None
                 for ee in e:
-                    if ee not in exs:
-                        exs.append(ee)
-    if not ok:  # exception(s) in inputs
-        ok, exs = node.allows_exception(exs)  # decide: evaluate node despite exception? / raise follow-up exception?
-    if not node.evaluated and ok:
-        try:
-            node.evaluate(prev_nodes, prev_goals)
-        except Exception as ex:
-            ok = False
-            logger.debug('> > > exception : %s \n      %s', ex, node)
-            if not isinstance(ex, DFException):
-                logger.warning(traceback.format_exc())
-                if d_context and d_context.supress_exceptions:
-                    raise EvaluationError('eval error')
-                exit(1)
-            exs = node.do_add_exception(ex, exs)
-            # e = d_context.add_exception(ex)
-    if ok and node.result != node and node.eval_res:
-        o, e = recursive_eval(node.res, prev_nodes, prev_goals)
-        for ee in e:
-            if ee not in exs:
-                exs.append(ee)
-        if node.res_block:  # block further computation if error in result evaluation
-            ok = o
-    # if node.detach and node.result != node:  #we're not using detach anymore...
-    #     # if error in evaluating result of detachable node - treat it as an exception in an input node
-    #     o, e = recursive_eval(node.res, prev_nodes, prev_goals, e)
-    #     node.detach_node()
-    #     ok = ok and o
-    # if node.add_goal == VIEW_INT:  # special-feature, not used anymore
-    #     d_context.add_goal(node)
-    # elif node.add_goal == VIEW_EXT:
-    #     d_context.add_goal(node.res)
-    return ok, exs
-
-
-def check_dangling_nodes(d_context):
+                    if ee not in f.exs:
+                        f.exs.append(ee)
+                if not f.in_res:
+                    f.ok = f.ok and o
+                elif node.res_block:  # block further computation if error in result evaluation
+                    f.ok = o
+            if not f.in_res:
+                child = None
+                while f.pos < len(f.keys):
+                    i = f.keys[f.pos]
+                    f.pos += 1
+                    if i in node.inputs:
+                        # we evaluate all children - even if one has exception - promote graph development - their
+                        #   computations are independent
+                        if not f.ok and node.stop_eval_on_exception:
+                            break
+                        child = node.inputs[i]
+                        break
+                if child is not None:
+                    stack.append(new_frame(child))
+                    continue
+                ok, exs = f.ok, f.exs
+                if not ok:  # exception(s) in inputs
+                    # decide: evaluate node despite exception? / raise follow-up exception?
+                    ok, exs = node.allows_exception(exs)
+                if not node.evaluated and ok:
+                    try:
+                        _evaluate_node(node, prev_nodes, prev_goals, profile, outcomes)
+                    except Exception as ex:
+                        ok = False
+                        logger.debug('> > > exception : %s \n      %s', ex, node)
+                        if not isinstance(ex, DFException):
+                            logger.warning(traceback.format_exc())
+                            if node.context and node.context.supress_exceptions:
+                                raise EvaluationError('eval error')
+                            exit(1)
+                        exs = node.do_add_exception(ex, exs)
+                        # e = d_context.add_exception(ex)
+                f.ok, f.exs = ok, exs
+                if ok and node.result != node and node.eval_res:
+                    f.in_res = True
+                    stack.append(new_frame(node.res))
+                    continue
+            stack.pop()
+            if not stack:
+                return f.ok, f.exs
+            ret = f.ok, f.exs
+    finally:
+        for n in fetched:
+            n.set_fetched(None)
+
+
+def check_dangling_nodes(d_context, all_nodes=False):
     """
-    Checks that outputs match inputs.
+    Checks that outputs match inputs - sanity check (debug only), turned off by
+    `EnvironmentDefinition.check_dangling_nodes`.
+
+    Checks the nodes reachable from the goals which were added, or whose links changed, since the previous check -
+    or all the reachable nodes, if `all_nodes` is True.
     """
-    nodes = Node.collect_nodes(d_context.goals)
+    if not environment_definitions.check_dangling_nodes:
+        return
+    reachable = d_context.reachable_nodes()
+    nodes = d_context.unchecked_nodes()
+    nodes = reachable if all_nodes else [n for n in nodes if n in reachable]
+    outputs = {}  # { node : set of its outputs }
     for n in nodes:
         for (nm, nd) in n.outputs:
             if nm not in nd.inputs or nd.inputs[nm] != n:
-                logger.debug('>>> dangling output: %s  [%s] --->  %s \n// %s', n, nm, nd, nd.inputs[nm])
+                logger.debug('>>> dangling output: %s  [%s] --->  %s \n// %s', n, nm, nd, nd.inputs.get(nm))
         for i in n.inputs:
-            if (i, n) not in n.inputs[i].outputs:
-                logger.debug('>>> dangling input: %s: %s / %s \n// %s', n, i, n.inputs[i], n.inputs[i].outputs)
+            inp = n.inputs[i]
+            if inp not in outputs:
+                outputs[inp] = set(inp.outputs)
+            if (i, n) not in outputs[inp]:
+                logger.debug('>>> dangling input: %s: %s / %s \n// %s', n, i, inp, inp.outputs)
             if i not in n.view_mode:
                 logger.debug('>>> missing view_mode: [%s] : %s \n', i, n)
 
@@ -0,0 +1,101 @@
+"""
+Per-turn evaluation profile - wall time and call counts of the evaluation, per node type.
+"""
+import time
+
+# Intentionally does not formally depend on Node
+
+
+class NodeTypeStats:
+    """
+    Evaluation statistics of a single node type.
+    """
+
+    __slots__ = ('visits', 'evals', 'exceptions', 'total', 'own', 'max')
+
+    def __init__(self):
+        self.visits = 0  # number of times nodes of this type were reached by the evaluation
+        self.evals = 0  # number of calls to `evaluate` (which calls `exec`)
+        self.exceptions = 0  # number of `evaluate` calls which raised an exception
+        self.total = 0.0  # wall time of `evaluate` (seconds), including nested evaluations (e.g. from within exec)
+        self.own = 0.0  # wall time of `evaluate` (seconds), excluding nested evaluations
+        self.max = 0.0  # wall time of the slowest single `evaluate` call
+
+    def as_dict(self):
+        return {s: getattr(self, s) for s in self.__slots__}
+
+
+class EvalProfile:
+    """
+    Collects the evaluation statistics of one turn. Held by the dialog context - see
+    `DialogContext.get_eval_profile`, and filled by `recursive_eval` when `EnvironmentDefinition.profile_eval` is set.
+    """
+
+    def __init__(self, turn=None):
+        self.turn = turn
+        self.stats = {}  # { typename : NodeTypeStats }
+        self._child_time = []  # stack of the time spent in nested evaluations - one entry per running `evaluate`
+
+    def _get(self, typename):
+        s = self.stats.get(typename)
+        if s is None:
+            s = self.stats[typename] = NodeTypeStats()
+        return s
+
+    def visit(self, typename):
+        self._get(typename).visits += 1
+
+    def start(self):
+        """
+        Starts timing a call to `evaluate`.
+
+        :return: the start time, to be passed to `stop`
+        :rtype: float
+        """
+        self._child_time.append(0.0)
+        return time.perf_counter()
+
+    def stop(self, typename, start, exception=False):
+        """
+        Stops timing a call to `evaluate`, which was started by `start`.
+        """
+        elapsed = time.perf_counter() - start
+        child = self._child_time.pop()
+        if self._child_time:
+            self._child_time[-1] += elapsed
+        self.add(typename, elapsed, exception, own=elapsed - child)
+
+    def add(self, typename, elapsed, exception=False, own=None):
+        """
+        Records a call to `evaluate` which was timed elsewhere (e.g. in another thread).
+        """
+        s = self._get(typename)
+        s.evals += 1
+        s.total += elapsed
+        s.own += elapsed if own is None else own
+        s.max = max(s.max, elapsed)
+        if exception:
+            s.exceptions += 1
+
+    def total_time(self):
+        return sum(s.own for s in self.stats.values())
+
+    def report(self, top=None):
+        """
+        Formats the statistics as a table, sorted by the own time (slowest first).
+
+        :param top: if given - report only the `top` slowest node types
+        :type top: int
+        :return: the formatted table
+        :rtype: str
+        """
+        rows = sorted(self.stats.items(), key=lambda x: -x[1].own)
+        if top:
+            rows = rows[:top]
+        lines = ['Evaluation profile - turn %s - %.2f ms' % (self.turn, 1000 * self.total_time()),
+                 '%-30s %7s %7s %5s %10s %10s %10s' % ('type', 'visits', 'evals', 'exc', 'total_ms', 'own_ms',
+                                                       'max_ms')]
+        for nm, s in rows:
+            lines.append('%-30s %7d %7d %5d %10.2f %10.2f %10.2f' %
+                         (nm, s.visits, s.evals, s.exceptions, 1000 * s.total, 1000 * s.own, 1000 * s.max))
+        return '\n'.join(lines)
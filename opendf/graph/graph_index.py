@@ -0,0 +1,175 @@
+"""
+Indices over the dialog graph, which are kept by the dialog context and updated incrementally.
+"""
+from bisect import bisect_right
+from collections.abc import Sequence
+from itertools import islice
+
+# Intentionally does not formally depend on Node
+
+
+class ReachableNodes(Sequence):
+    """
+    Read-only view of the nodes reachable from the goals, in the same (topological) order as
+    `Node.collect_nodes(goals)`.
+
+    The view is a snapshot - it does not change when the graph is later modified. Membership checks are O(1).
+    """
+
+    __slots__ = ('_nodes', '_len', '_index', '_set')
+
+    def __init__(self, index):
+        self._nodes = index.nodes
+        self._len = len(index.nodes)
+        self._index = index
+        self._set = None
+
+    def __len__(self):
+        return self._len
+
+    def __iter__(self):
+        return islice(self._nodes, self._len)
+
+    def __getitem__(self, i):
+        if isinstance(i, slice):
+            return self._nodes[:self._len][i]
+        if i < 0:
+            i += self._len
+        if not 0 <= i < self._len:
+            raise IndexError('ReachableNodes index out of range')
+        return self._nodes[i]
+
+    def __contains__(self, n):
+        if self._nodes is self._index.nodes:  # index was only extended since the snapshot was taken
+            i = self._index.pos.get(n)
+            return i is not None and i < self._len
+        if self._set is None:
+            self._set = set(islice(self._nodes, self._len))
+        return n in self._set
+
+    def __add__(self, other):
+        return list(self) + list(other)
+
+    def __radd__(self, other):
+        return list(other) + list(self)
+
+    def __repr__(self):
+        return 'ReachableNodes(%d nodes)' % self._len
+
+
+class ReachableIndex:
+    """
+    Incrementally maintained list of the nodes reachable from the goals of the dialog context.
+
+    The nodes are collected goal by goal, exactly like `Node.collect_nodes`, and we remember where each goal's part
+    starts. The walk of a goal depends only on the links of the nodes it visited, so when a node's links change
+    (`invalidate`), or the goal list changes, only the part starting at the first affected goal is collected again.
+    Nodes from older goals which are reachable from the new part are not walked again.
+    """
+
+    def __init__(self, follow_res=True):
+        self.follow_res = follow_res
+        self.nodes = []  # reachable nodes, in topological order
+        self.pos = {}  # { node : position in self.nodes }
+        self.done = set()  # the nodes in self.nodes
+        self.goals = []  # the goals self.nodes was collected from
+        self.starts = []  # the position in self.nodes of the first node collected for each goal
+        self.n_valid = 0  # number of goals (from the start of self.goals) whose part is still valid
+
+    def clear(self):
+        self.__init__(self.follow_res)
+
+    def invalidate(self, node):
+        """
+        Called when the links (inputs/result) of `node` changed.
+        """
+        i = self.pos.get(node)
+        if i is not None:
+            self.n_valid = min(self.n_valid, bisect_right(self.starts, i) - 1)
+
+    def truncate(self, k):
+        """
+        Drops the parts of goals k and onward.
+        """
+        if k >= len(self.goals):
+            return
+        start = self.starts[k]
+        for n in islice(self.nodes, start, None):
+            del self.pos[n]
+            self.done.discard(n)
+        self.nodes = self.nodes[:start]  # new list - existing views keep the old one
+        del self.starts[k:]
+        del self.goals[k:]
+
+    def get(self, goals):
+        """
+        Gets a view of the nodes reachable from `goals`.
+
+        :rtype: ReachableNodes
+        """
+        k = min(self.n_valid, len(goals))
+        for i in range(k):
+            if goals[i] is not self.goals[i]:
+                k = i
+                break
+        self.truncate(k)
+        for g in goals[k:]:
+            start = len(self.nodes)
+            self.starts.append(start)
+            self.goals.append(g)
+            g.topological_walk(self.nodes, self.done, set(), self.follow_res)  # extends self.nodes in place
+            for i in range(start, len(self.nodes)):
+                self.pos[self.nodes[i]] = i
+        self.n_valid = len(self.goals)
+        return ReachableNodes(self)
+
+
+class TypeIndex:
+    """
+    Index of the nodes registered in the dialog context, by type name and constraint level.
+
+    The type of a node never changes, but its constraint level may be changed after it was registered (e.g. when an
+    object is turned into a query), so the constraint level is checked when looking up, rather than used as a key.
+    """
+
+    def __init__(self):
+        self.nodes = set()  # all the indexed nodes
+        self.by_type = {}  # { typename : [nodes] }  (in registration order)
+
+    def clear(self):
+        self.__init__()
+
+    def add(self, node):
+        if node not in self.nodes:
+            self.nodes.add(node)
+            self.by_type.setdefault(node.typename(), []).append(node)
+
+    def get(self, typenames, clevel=None):
+        """
+        Gets the indexed nodes of the given types (and constraint level, if given).
+
+        :rtype: Set[Node]
+        """
+        nodes = set()
+        for t in typenames:
+            if t in self.by_type:
+                if clevel is None:
+                    nodes.update(self.by_type[t])
+                else:
+                    nodes.update(n for n in self.by_type[t] if n.constraint_level == clevel)
+        return nodes
+
+
+class ChangeLog:
+    """
+    The changes of the nodes of a dialog context since the last checkpoint (see `ContextCheckpointer`): the nodes which
+    changed (notified by `Node.mark_changed`), and the ids of the removed nodes. The nodes registered since the
+    checkpoint are not logged - they have the ids above `last_id`.
+    """
+
+    __slots__ = ('changed', 'removed', 'last_id')
+
+    def __init__(self, last_id):
+        self.changed = {}  # { node : None } (ordered set)
+        self.removed = []  # ids
+        self.last_id = last_id  # the highest id at the checkpoint (-1 if the nodes were cleared since)
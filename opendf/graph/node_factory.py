@@ -2,6 +2,7 @@
 Factory to create the nodes. It does not depend on Node.
 """
 from collections import defaultdict
+from collections.abc import Mapping
 from opendf.exceptions.python_exception import UnknownNodeTypeException
 import re
 from opendf.defs import *
@@ -21,6 +22,36 @@ logger = logging.getLogger(__name__)
 # It's a singleton, which AFTER initialization needs to be filled (by an EXTERNAL function which does depend on all
 #   node types)
 
+class SampleNodes(Mapping):
+    """
+    The sample nodes - { node name : instantiated node of this type } - where each node is instantiated on the first
+    access to it (see `EnvironmentDefinition.lazy_sample_nodes`).
+    """
+
+    def __init__(self, node_types):
+        """
+        :param node_types: the node types - { node name : node type }
+        :type node_types: Dict[str, type]
+        """
+        self.node_types = node_types
+        self.nodes = {}
+
+    def __getitem__(self, name):
+        node = self.nodes.get(name)
+        if node is None:
+            node = self.nodes[name] = self.node_types[name]()
+        return node
+
+    def __contains__(self, name):
+        return name in self.node_types
+
+    def __iter__(self):
+        return iter(self.node_types)
+
+    def __len__(self):
+        return len(self.node_types)
+
+
 # factory method: return an instance of a subclass of Node, from the type matching the input name
 # currently set up as a singleton, but not really necessary (except maybe to save some initialization computation)
 class NodeFactory:
@@ -47,10 +78,10 @@ class NodeFactory:
 
         self.node_types = None  # { node name : node type }
         self.sample_nodes = None  # { node name : instantiated node of this type }
-        self.leaf_types = None  # list of node type names which are leaf type; can accept only one real input,
+        self._leaf_types = None  # list of node type names which are leaf type; can accept only one real input,
         #  and that input is a base type
 
-        self.leaf_in_type = None
+        self._leaf_in_type = None
         # { leaf typename : [param name, param type name }  e.g. { 'Year' : (posname(10, 'Int')}
 
         self.operators = []
@@ -128,6 +159,23 @@ class NodeFactory:
             return True
         return False
 
+    # the leaf types need all the sample nodes - if not set yet, they are computed on first use
+    @property
+    def leaf_types(self):
+        if self._leaf_types is None and self.sample_nodes is not None:
+            self.set_leaf_types()
+        return self._leaf_types
+
+    @property
+    def leaf_in_type(self):
+        if self._leaf_in_type is None and self.sample_nodes is not None:
+            self.set_leaf_types()
+        return self._leaf_in_type
+
+    def clear_leaf_types(self):
+        self._leaf_types = None
+        self._leaf_in_type = None
+
     # get type names which have just one base input - they will be summarized (not drawn)
     def set_leaf_types(self):
         lt = []
@@ -138,8 +186,8 @@ class NodeFactory:
             if len(t) == 1 and n.signature[t[0]].match_tnames(base_types):
                 lt.append(nm)
                 it[nm] = (t[0], n.signature[t[0]].type_name())
-        self.leaf_types = lt
-        self.leaf_in_type = it
+        self._leaf_types = lt
+        self._leaf_in_type = it
 
     # wrap a list of nodes into a n aggregator.
     # if given only one node - behavior depend on flag wrap_one
@@ -33,6 +33,19 @@ environment_definitions = EnvironmentDefinition.get_instance()
 # TODO: in case of multiple matches - choose just one, or allow to return multiple?
 #     - e.g. input flag 'singleton'[bool] (default value True) ??
 
+def narrow_by_type(d_context, nodes, constr, iview=None):
+    """
+    Drops the nodes which can not match the type constraint `constr`, based on their type only (using the type index of
+    the context), so that the full match is done only for the remaining nodes. Keeps the order of the nodes.
+    """
+    typs, clevel = constr.match_types(iview)
+    if typs is None or not d_context:
+        return nodes
+    typed = d_context.nodes_of_types(typs, clevel)
+    operators = set(node_fact.operators)  # operator objects are matched by their op type - keep them
+    return [n for n in nodes if n in typed or n.typename() in operators or not d_context.is_type_indexed(n)]
+
+
 # TODO: add flag to limit refer only to result nodes
 
 # basically - the match condition should allow all that a sparql query allows
@@ -57,8 +70,8 @@ def get_refer_match(d_context, all_nodes0, goals0, is_ref_goal=False, parent=Non
         pos1, _ = Node.call_construct(pos1, d_context)
     if not force_fallback:
         if pos1:  # type constraint - could be an aggregated constraint (AND/OR/...)
-            candidates = [n for n in nodes if
-                          pos1.match(n, iview=pos1view, oview=VIEW.INT, check_level=True, match_miss=match_miss)]
+            matcher = pos1.compile_match(iview=pos1view, oview=VIEW.INT, check_level=True, match_miss=match_miss)
+            candidates = [n for n in narrow_by_type(d_context, nodes, pos1, pos1view) if matcher(n)]
             matches = Node.rank_by_order(candidates, goals, follow_res=True)
             nodes = matches  # allow further filtering
         if type:  # TODO: move this before pos1 - for efficiency?
@@ -76,8 +89,8 @@ def get_refer_match(d_context, all_nodes0, goals0, is_ref_goal=False, parent=Non
             t = pos1.typename() if pos1 else type
             # opening matches to list of objects before matching - TODO: is this the general thing to do?
             objs = list(set(sum([n.get_op_objects(typs=[t]) for n in matches], [])))
-            candidates = [n for n in objs if
-                          cond.match(n, iview=condview, oview=VIEW.INT, check_level=True, match_miss=match_miss)]
+            matcher = cond.compile_match(iview=condview, oview=VIEW.INT, check_level=True, match_miss=match_miss)
+            candidates = [n for n in objs if matcher(n)]
             nodes = candidates  # allow further filtering
             matches = candidates
         if midtype:
@@ -157,21 +170,48 @@ def get_refer_match(d_context, all_nodes0, goals0, is_ref_goal=False, parent=Non
                     matches = pp.fallback_search_harder(fbnode, all_nodes, goals, do_eval=do_eval, params=params)
         if cond and matches:
             objs = list(set(sum([n.get_op_objects(typs=[fbnode.typename()]) for n in matches], [])))
-            matches = [n for n in objs if
-                       cond.match(n, iview=condview, oview=VIEW.INT, check_level=True, match_miss=match_miss)]
+            matcher = cond.compile_match(iview=condview, oview=VIEW.INT, check_level=True, match_miss=match_miss)
+            matches = [n for n in objs if matcher(n)]
     # TODO: review - in case of multiple matches - do we really return a list, or a SET node?
     if merge_equiv:
-        m = []
-        for ii in matches:
-            i = ii.res if merge_equiv_res else ii
-            if not any([i.equivalent_obj(j) for j in m]):
-                m.append(i)
-        matches = m
+        matches = merge_equivalent([ii.res if merge_equiv_res else ii for ii in matches])
     if len(matches) > 1 and not (multi or is_ref_goal):
         return [matches[0]]
     return matches
 
 
+def merge_equivalent(nodes):
+    """
+    Drops the nodes which are equivalent (see `Node.equivalent_obj`) to a previous node in the list.
+
+    The kept nodes are grouped by their `equivalence_key`, so each node is compared only to the previous nodes with the
+    same key - unless some type overrides `equivalent_obj` without overriding `equivalence_key`, in which case each node
+    is compared to all the kept nodes.
+
+    :return: the kept nodes, in their original order
+    :rtype: List[Node]
+    """
+    if any(type(n).equivalent_obj is not Node.equivalent_obj and type(n).equivalence_key is Node.equivalence_key
+           for n in nodes):
+        merged = []
+        for n in nodes:
+            if not n.equivalent_obj(merged):
+                merged.append(n)
+        return merged
+    merged, by_key = [], {}
+    for n in nodes:
+        key = n.equivalence_key()
+        similar = by_key.get(key)
+        if similar is None:
+            by_key[key] = [n]
+        elif not n.equivalent_obj(similar):
+            similar.append(n)
+        else:
+            continue
+        merged.append(n)
+    return merged
+
+
 def graph_has_exp(root, d_context, follow_res=True, sexp=None, sub=None):
     """
     Checks if a graph contains an expression (given as either string or root node).
@@ -348,6 +388,7 @@ def auto_reorder_inputs(nd, raise_nodes):
                 if inps[i] not in rs and inps[j] in rs and (i, j) not in nd.signature.inp_dep:
                     inps[i], inps[j] = inps[j], inps[i]
         nd.inputs = nd.inputs.duplicate(inps)
+        nd.mark_changed()
 
 
 # rev, mid, below - needed only for custom new_beg
@@ -461,6 +502,7 @@ def duplicate_subgraph(root, old_beg, new_beg, mode, rev=None, mid=None, below=N
                 if o_in in old_subgraph:  # input within subgraph (`new_beg` will not be changed)
                     n_in = new_subgraph[old_idx[o_in]]  # new input node
                     n.inputs[nm] = n_in  # replace by corresponding new node
+                    n.mark_changed()
                     if (nm, n) not in n_in.outputs:
                         n_in.add_output(nm, n)
                 elif o_in not in ignore:
@@ -592,14 +634,16 @@ def add_scored_matches(g, ig, m, matches, d_context, old=None, oiview=None, ocle
     match_level = 'strict' if not ml or ml not in ['strict', 'prefer', 'any'] else ml
     if old:  # 'old' in self.inputs:
         # old, iview = self.get_inp_view_and_mode('old')
+        matcher = old.compile_match(iview=oiview, oview=VIEW.INT, check_level=True)
         if match_level != 'strict':
-            candidates0 = [n for n in candidates if old.match(n, iview=oiview, oview=VIEW.INT, check_level=False)]
+            matcher0 = old.compile_match(iview=oiview, oview=VIEW.INT, check_level=False)
+            candidates0 = [n for n in candidates if matcher0(n)]
             if match_level == 'any':
                 candidates = candidates0
             else:
-                candidates = [n for n in candidates if old.match(n, iview=oiview, oview=VIEW.INT, check_level=True)]
+                candidates = [n for n in candidates if matcher(n)]
         else:
-            candidates = [n for n in candidates if old.match(n, iview=oiview, oview=VIEW.INT, check_level=True)]
+            candidates = [n for n in candidates if matcher(n)]
     if oldType:  # 'oldType' in self.inputs or 'oldTypes' in self.inputs:
         # if 'oldType' in self.inputs:
         #     tp = [self.get_dat('oldType')]
@@ -912,6 +956,7 @@ class execute(Node):
             nodes = Node.collect_nodes([g])
             for n in nodes:
                 n.evaluated = False
+                n.mark_changed(links=False)
         add = False
         hd = self.get_dat('hide_goal')
         if hd is not None and hd:  # move `g` to the top of the goal list?
@@ -89,6 +89,14 @@ class Modifier(Node):
         return inp.match(obj, check_level=check_level, match_miss=match_miss)
         # return super(Node, self).match(obj, iview, oview, check_level, match_miss)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.res
+        if inp == self:
+            return lambda obj: False
+        return inp.compile_match(check_level=check_level, match_miss=match_miss)
+
 
 # ################################################################################################
 
@@ -147,6 +155,19 @@ def aggregate_selections(inputs, selection, parent_id, kwargs):
     return conditions, selection
 
 
+def compile_set_refs(node, match_miss):
+    """
+    Compiles the refs (collected from the `SET` tree under the first input of `node`) for ANY/NONE/ALL.
+
+    :return: list of matchers, or `None` if there is no input
+    :rtype: Optional[List[Callable]]
+    """
+    inp = node.input_view(posname(1))
+    if inp is None:
+        return None
+    return [r.compile_match(match_miss=match_miss) for r in inp.unroll_set_objects([])]
+
+
 class AND(Aggregator):
     def __init__(self):
         super().__init__()  # Dynamic output type
@@ -165,6 +186,23 @@ class AND(Aggregator):
                 return False
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        obj_res = self.constr_obj_view == VIEW.EXT
+        subs = [self.input_view(nm).compile_match(check_level=check_level, match_miss=match_miss)
+                for nm in self.inputs]
+
+        def matcher(obj):
+            if obj_res:
+                obj = obj.res
+            for sub in subs:
+                if not sub(obj):
+                    return False
+            return True
+
+        return matcher
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         conditions, selection = aggregate_selections(self.inputs, selection, parent_id, kwargs)
         if len(conditions) == 1:
@@ -188,6 +226,20 @@ class OR(Aggregator):
                 return True
         return False
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        subs = [self.input_view(nm).compile_match(check_level=check_level, match_miss=match_miss)
+                for nm in self.inputs]
+
+        def matcher(obj):
+            for sub in subs:
+                if sub(obj):
+                    return True
+            return False
+
+        return matcher
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         conditions, selection = aggregate_selections(self.inputs, selection, parent_id, kwargs)
         if len(conditions) == 1:
@@ -213,6 +265,15 @@ class NOT(Aggregator):
         inp = self.input_view(nm)
         return not inp.match(obj, check_level=check_level, match_miss=match_miss)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        if not self.inputs:
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+        sub = self.input_view(list(self.inputs.keys())[0]).compile_match(check_level=check_level,
+                                                                        match_miss=match_miss)
+        return lambda obj: not sub(obj)
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         subquery = self.input_view(posname(1)).generate_sql_where(select(), parent_id, **kwargs)
         for column in subquery.selected_columns:
@@ -247,6 +308,23 @@ class ANY(Aggregator):
                     return True
         return False
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        subs = compile_set_refs(self, match_miss)
+        if subs is None:
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+
+        def matcher(obj):
+            objs = obj.unroll_set_objects([])
+            for sub in subs:
+                for o in objs:
+                    if sub(o):
+                        return True
+            return False
+
+        return matcher
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         conditions, selection = aggregate_selections(self.inputs, selection, parent_id, kwargs)
         if len(conditions) == 1:
@@ -284,6 +362,23 @@ class NONE(Aggregator):
                     return False
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        subs = compile_set_refs(self, match_miss)
+        if subs is None:
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+
+        def matcher(obj):
+            objs = obj.unroll_set_objects([])
+            for sub in subs:
+                for o in objs:
+                    if sub(o):
+                        return False
+            return True
+
+        return matcher
+
 
 class ALL(Aggregator):
     """
@@ -313,6 +408,22 @@ class ALL(Aggregator):
                 return False
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        subs = compile_set_refs(self, match_miss)
+        if subs is None:
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+
+        def matcher(obj):
+            objs = obj.unroll_set_objects([])
+            for sub in subs:
+                if not any(sub(o) for o in objs):
+                    return False
+            return True
+
+        return matcher
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         conditions, selection = aggregate_selections(self.inputs, selection, parent_id, kwargs)
         if len(conditions) == 1:
@@ -356,6 +467,30 @@ class EXACT(Aggregator):
             return False
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inps = [self.input_view(i) for i in self.inputs if is_pos(i)]
+        try:
+            valid = len(list(set([(i.typename(), i.constraint_level) for i in inps]))) == 1 and \
+                    len(list(set(flatten_list([i.get_subfields_with_level(1) for i in inps])))) == 1
+        except Exception:
+            valid = False
+        if not valid:  # let match() raise the exception - if it's called at all
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+        tp, fld = inps[0].typename(), inps[0].get_subfields_with_level(1)[0]
+        subs = [i.compile_match(match_miss=match_miss) for i in inps]
+
+        def matcher(obj):
+            if obj.typename() != tp:
+                return False
+            for sub in subs:
+                if not sub(obj):
+                    return False
+            return len(inps) == inps[0].get_plurality(fld, obj.input_view(fld))
+
+        return matcher
+
     def generate_sql_where(self, selection, parent_id, **kwargs):
         conditions, selection = aggregate_selections(self.inputs, selection, parent_id, kwargs)
         kwargs['aggregator'] = 'EXACT'
@@ -402,6 +537,12 @@ class LT(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_LT(obj)  # compare obj to arg of (LT)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_LT if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
     def __call__(self, *args, **kwargs):
         return args[0] < args[1]
 
@@ -423,6 +564,12 @@ class GT(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_GT(obj)  # compare obj to arg of (GT)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_GT if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class GE(Qualifier):
     def __init__(self):
@@ -440,6 +587,12 @@ class GE(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_GE(obj)  # compare obj to arg of (GE)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_GE if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class LE(Qualifier):
     def __init__(self):
@@ -457,6 +610,12 @@ class LE(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_LE(obj)  # compare obj to arg of (LE)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_LE if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class FN(Qualifier):
 
@@ -506,6 +665,12 @@ class EQ(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_EQ(obj)  # compare obj to arg of (EQ)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_EQ if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class NEQ(Qualifier):
     def __init__(self):
@@ -523,8 +688,15 @@ class NEQ(Qualifier):
         inp = self.input_view(posname(1))
         return inp.func_NEQ(obj)  # compare obj to arg of (NEQ)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_NEQ if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class LIKE(Qualifier):
+    pure_eval = True
 
     def __init__(self):
         super().__init__()  # Dynamic output type
@@ -542,6 +714,12 @@ class LIKE(Qualifier):
         return inp.func_LIKE(obj)  # compare obj to arg of (LIKE)
         # e.g. ...name=LIKE(PersonName(john))  -> at match time we'll use PersonName(john).func_LIKE(ref)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        return inp.func_LIKE if inp is not None else self.interpreted_matcher(iview, oview, check_level, match_miss)
+
 
 class TRUE(Qualifier):
 
@@ -559,6 +737,11 @@ class TRUE(Qualifier):
     def match(self, obj, iview=VIEW.INT, oview=None, check_level=False, match_miss=False):
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        return lambda obj: True
+
 
 # corresponds to AlwaysFalseConstraint - but only for the case of clearing a field
 class FALSE(Qualifier):
@@ -577,6 +760,11 @@ class FALSE(Qualifier):
     def match(self, obj, iview=VIEW.INT, oview=None, check_level=False, match_miss=False):
         return False
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        return lambda obj: False
+
 
 class MIN(Aggregator):
     def __init__(self):
@@ -633,6 +821,20 @@ class SET(Aggregator):
                 return False
         return True
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        subs = [self.input_view(nm).compile_match(check_level=check_level, match_miss=match_miss)
+                for nm in self.inputs]
+
+        def matcher(obj):
+            for sub in subs:
+                if not sub(obj):
+                    return False
+            return True
+
+        return matcher
+
     def describe(self, params=None):
         values, objs = [], []
         for i in range(1, self.num_pos_inputs() + 1):
@@ -687,9 +889,18 @@ class TEE(Aggregator):
         inp = self.input_view(posname(1))
         return inp.match(obj, check_level=check_level, match_miss=match_miss)
 
+    compiles_match = match
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        inp = self.input_view(posname(1))
+        if inp is None:
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+        return inp.compile_match(check_level=check_level, match_miss=match_miss)
+
     def exec(self, all_nodes=None, goals=None):
         inp = self.inputs[posname(1)]
         self.result = inp
+        self.mark_changed()
 
         name = self.get_dat('name')
         if name:
@@ -8,31 +8,98 @@ import opendf.graph.dialog_context
 from opendf.graph.nlu_framework import NLU_TYPE
 from opendf.graph.node_factory import NodeFactory
 from opendf.utils.utils import compatible_clevel, parse_hint, to_list, id_sexp, \
-    is_assign_name, strings_similar, flatten_list, Message
+    is_assign_name, strings_similar, flatten_list, Message, get_subclasses
 from opendf.exceptions import re_raise_exc
 from opendf.graph.signature import *
 from opendf.defs import *
 from opendf.parser.pexp_parser import escape_string
 from opendf.exceptions.python_exception import SemanticException
 from opendf.exceptions.df_exception import NoPropertyException, MissingValueException, NotImplementedYetDFException
-from collections import defaultdict
+from collections import defaultdict, deque
+from functools import partial
 
 node_fact = NodeFactory.get_instance()
 environment_definitions = EnvironmentDefinition.get_instance()
 
 logger = logging.getLogger(__name__)
 
+# data read in advance for the nodes by their `fetch` (in the parallel evaluation) - { node : data }, until the exec of
+#   the node gets it (see `Node.fetched`)
+_fetched_data = {}
 
-class Node:
+
+def lazy_matcher(node, **kwargs):
+    """
+    Gets a matcher for `node` (see `Node.compile_match`), which is compiled only when it's first called.
+    """
+    matcher = None
+
+    def match(obj):
+        nonlocal matcher
+        if matcher is None:
+            matcher = node.compile_match(**kwargs)
+        return matcher(obj)
+
+    return match
+
+
+def seen_ids(seen):
+    """
+    Gets the ids of the nodes already written by `Node.print_tree` / `Node.compr_tree` as a set (given as a set, a list
+    or `None`).
+    """
+    return seen if isinstance(seen, set) else set(seen) if seen else set()
+
+
+class NodeType(type):
+    """
+    Metaclass of `Node` - lets all the nodes of a type share a single signature object.
+
+    The signature is static per node type: it's built by `__init__` of the first node of the type, then frozen and kept
+    by the type. The following nodes of the type get it from `Node.__init__`, and the calls of `__init__` which would
+    build it again (`add_sig`...) return at once. Note - the signature should therefore not depend on the arguments of
+    `__init__`, nor be modified after `__init__`.
+    """
+
+    def __call__(cls, *args, **kwargs):
+        nd = super().__call__(*args, **kwargs)
+        if cls.__dict__.get('_shared_signature') is None:
+            nd.signature.frozen = True
+            cls._shared_signature = nd.signature
+        return nd
+
+
+class Node(metaclass=NodeType):
     """
     This is the base class for the different objects and functions. Node holds the logic of the graph - it keeps track
     of input, output and result links. It may hold data (only for base type nodes), some additional memory, and
     features which control the way the nodes behave and use other others.
     """
 
+    # evaluation properties of the node type
+    reuse_dup_result = False  # the result of exec depends only on the content of the inputs (exec has no other effect)
+    #                           - so a duplicate (revise) with the same input content reuses the result of the original
+    pure_eval = False  # evaluate() only changes the node itself - it depends only on the inputs, and does not change
+    #                    the dialog context (no new nodes, goals, messages, assigns...), other nodes, or shared (non
+    #                    thread safe) resources. Types which keep the default evaluation are pure anyway (is_pure_eval)
+    #                    Note - this is inherited: subclasses which add logic to exec / valid_input should reset it
+    parallel_fetch = False  # exec reads external data (e.g. the rows of a DB query), which `fetch` can read in advance,
+    #                         in another thread (see `opendf.graph.eval`, `EnvironmentDefinition.parallel_eval`)
+
+    # the fields of the base node are slots (less memory per node). Subclasses (and code which adds attributes on the fly)
+    #   still get a __dict__ - allocated only when first used
+    __slots__ = ('id', 'signature', 'inputs', 'view_mode', 'out_type', 'copy_in_type', 'evaluated', 'result', 'outputs',
+                 'tags', '_type_tags', 'res_out', 'check_node', 'data', 'constraint_level', 'constr_obj_view',
+                 'eval_res', 'res_block', 'mutable', 'hide', 'no_revise', 'add_goal', 'stop_eval_on_exception',
+                 'detach', '_detached_nodes', 'just_dup', 'dup_of', 'inited', 'created_turn', '_inp_reason', 'reason',
+                 'context', '_counters', 'obj_name_singular', 'obj_name_plural', '_struct_id', '_shown_once', '__dict__')
+
     def __init__(self, out_type=None):
         self.id = None
-        self.signature = Signature()  # definitions of input parameters - {name : InputParam}
+        # definitions of input parameters - {name : InputParam}, shared by the nodes of the type (see `NodeType`)
+        self.signature = type(self).__dict__.get('_shared_signature')
+        if self.signature is None:
+            self.signature = Signature()
         self.inputs = AliasODict()  # inputs PRESENT in the graph - {name : node}
         # using OrderedDict - so that evaluation goes in left-to-right order (relative to construction order)
         # inputs (also outputs, view_mode) use the "real" name - not aliases
@@ -57,7 +124,7 @@ class Node:
         # tags with '*' are required, tags with TAG_NO_COPY are not copied, tags with TAG_NO_SHOW are not displayed,
         # tags with TAG_NO_MATCH are not matched
 
-        self.type_tags = []  # names of tags which are created per type (in __init__) (i.e. not added per node instance)
+        self._type_tags = None  # names of tags which are created per type (in __init__) (i.e. not added per node instance)
 
         self.res_out = []  # pointers to nodes this node is a direct result of
         self.check_node = True  # allows turning off formal (general) tests for nodes with variable inputs.
@@ -78,7 +145,7 @@ class Node:
         self.add_goal = None  # add this node to goals - as either int/ext
         self.stop_eval_on_exception = False  # do not evaluate further sibling inputs if failed on an input
         self.detach = False  # this node will be detached from input and replaced by its result, once result created
-        self.detached_nodes = []  # not used anymore
+        self._detached_nodes = None  # not used anymore
         # list of (nm, nd) - nodes which used to be inputs, but got detached. Used only for drawing
 
         self.just_dup = False
@@ -90,7 +157,7 @@ class Node:
         self.created_turn = None
         # remember which turn the node was created - may be useful for scoring by age. Just finding ancestor goal_id
         #   may not be enough
-        self.inp_reason = {}  # (text, optional) explain to user why this input is needed (keys - same as for 'input')
+        self._inp_reason = None  # (text, optional) explain to user why this input is needed (keys - same as for 'input')
         self.reason = ''
         # (text, optional) explain to user why this node is needed. This explanation is independent of where the
         # node is used
@@ -98,10 +165,54 @@ class Node:
         self.context: Optional[opendf.DialogContext] = None
         # link to the dialog context this node is part of (avoid need to pass d_context everywhere)
 
-        self.counters = {'dup': 1}
+        self._counters = None  # allocated on first use - {'dup': 1}
+        self._struct_id = None  # the id of the structure of the graph under the node, once computed - see struct_id()
+        self._shown_once = None  # whether print_tree shows each node of that graph once - see shown_once()
         self.obj_name_singular = self.typename()
         self.obj_name_plural = self.typename() + 's'
 
+    # rarely used containers - allocated on first access
+
+    @property
+    def type_tags(self):
+        if self._type_tags is None:
+            self._type_tags = []
+        return self._type_tags
+
+    @type_tags.setter
+    def type_tags(self, val):
+        self._type_tags = val
+
+    @property
+    def detached_nodes(self):
+        if self._detached_nodes is None:
+            self._detached_nodes = []
+        return self._detached_nodes
+
+    @detached_nodes.setter
+    def detached_nodes(self, val):
+        self._detached_nodes = val
+
+    @property
+    def inp_reason(self):
+        if self._inp_reason is None:
+            self._inp_reason = {}
+        return self._inp_reason
+
+    @inp_reason.setter
+    def inp_reason(self, val):
+        self._inp_reason = val
+
+    @property
+    def counters(self):
+        if self._counters is None:
+            self._counters = {'dup': 1}
+        return self._counters
+
+    @counters.setter
+    def counters(self, val):
+        self._counters = val
+
     # #############################################################################################
     # ##################### some simple functions with self explanatory names #####################
 
@@ -152,6 +263,34 @@ class Node:
     def real_name(self, nm):
         return self.signature.real_name(nm)
 
+    def mark_changed(self, links=True):
+        """
+        Notifies the dialog context that the links (inputs, outputs or result) of this node changed. Should be called
+        by any code which modifies these links directly (rather than through `connect_in_out`, `set_result`...), or
+        which modifies the data (see `set_data`) or the constraint level of a node in place - this also drops the
+        structure ids which depend on the node (see `struct_id`).
+
+        Changes of the other fields of a node which already existed at the last checkpoint of the context (flags, tags,
+        view modes, attributes - see `ContextCheckpointer`) are notified with `links=False`.
+        """
+        if links:
+            self.clear_struct_ids()
+        if self.context:
+            self.context.node_changed(self, links)
+
+    def clear_struct_ids(self):
+        """
+        Drops the structure ids (see `struct_id`) of this node and of the nodes above it, which depend on it.
+        """
+        if self._struct_id is None:  # (then no node above it has an id which depends on it)
+            return
+        stack = [self]
+        while stack:
+            nd = stack.pop()
+            nd._struct_id = None
+            nd._shown_once = None
+            stack.extend(o for _, o in nd.outputs if o._struct_id is not None)
+
     #############################################################################################
 
     def get_result_trans(self):
@@ -439,6 +578,7 @@ class Node:
         self.inputs[nm] = nd
         self.view_mode[nm] = view
         nd.add_output(nm, self)
+        self.mark_changed()
 
     # add input and output links needed to add self as input[name] of parent
     def connect_in_out(self, name, parent, view=None, force=False):
@@ -453,6 +593,7 @@ class Node:
         if view is None:
             view = VIEW.EXT if parent.is_operator() or name not in parent.signature else parent.signature[name].view
         parent.view_mode[name] = view
+        parent.mark_changed()
 
     def replace_input(self, nm, new_node, view=None):
         nm = self.real_name(nm)
@@ -464,12 +605,14 @@ class Node:
             old = self.inputs[nm]
             old.outputs = [(m, d) for (m, d) in old.outputs if m != nm or d != self]
             self.inputs.pop(nm)
+            old.mark_changed()
         new_node.connect_in_out(nm, self, view)
 
     def add_output(self, nm, parent):
         nm = parent.real_name(nm)
         if (nm, parent) not in self.outputs:
             self.outputs.append((nm, parent))
+            self.mark_changed()
 
     def set_result(self, n):
         """
@@ -482,11 +625,21 @@ class Node:
                 return
             if res != self:  # remove self from res' list of out_res links
                 res.res_out = [r for r in res.res_out if r != self]
+                res.mark_changed(links=False)
             self.result = n
             if n != self:  # add self to n's list of out_res links (unless n==self)
                 n.res_out.append(self)
+                n.mark_changed(links=False)
+            self.mark_changed()
         self.out_type = self.res.get_op_type(no=Node)  # TODO: check no bad effects!
 
+    def set_data(self, data):
+        """
+        Sets the data of an existing node in place (rather than creating a new node), and notifies the change.
+        """
+        self.data = data
+        self.mark_changed()
+
     # ast flag - use AST stype features
     def set_feats(self, nfeats=None, ast_feats=None, context=None, register=None):
         if ast_feats is not None:
@@ -511,6 +664,7 @@ class Node:
                 elif f == '*':
                     self.evaluated = True
                     self.result = self
+                    self.mark_changed()
 
     # used e.g. in compr_tree, when we want to make a string representation of the graph
     #  this should include all node fields which are NOT set by default (assignment in base Node, or in the derived
@@ -566,6 +720,7 @@ class Node:
                 nd.inputs[nm] = res  # what about nd.view_mode?
                 res.add_output(nm, nd)
                 nd.detached_nodes.append((nm, self))
+                nd.mark_changed()
             self.outputs = []  # this node is not used as input anymore
 
     def disconnect_node_from_parents(self):
@@ -704,10 +859,12 @@ class Node:
         nm = nd.real_name(nm)
         o = [(m, d) for (m, d) in self.outputs if d != nd or m != nm]
         self.outputs = o
+        self.mark_changed()
 
     def del_input(self, nm):
         if nm in self.inputs:
             del self.inputs[nm]
+            self.mark_changed()
         if nm in self.view_mode:
             del self.view_mode[nm]
         # TODO: handle output nodes as well?
@@ -723,6 +880,8 @@ class Node:
             if nm in self.view_mode:
                 del self.view_mode[nm]
             nd.outputs = [(m, n) for (m, n) in nd.outputs if m != nm or n != self]
+            self.mark_changed()
+            nd.mark_changed()
 
     def disconnect_input_nodes(self, nds):
         """
@@ -797,6 +956,16 @@ class Node:
     def equivalent_obj(self, other):
         return [i for i in to_list(other) if i.id == self.id]
 
+    def equivalence_key(self):
+        """
+        Gets a key for `equivalent_obj`: equivalent objects have the same key (but objects with the same key are not
+        necessarily equivalent). Types which override `equivalent_obj` should override this as well (see
+        `merge_equivalent`).
+
+        Base implementation - the node id (a node is equivalent only to itself).
+        """
+        return self.id
+
     # base function
     def strings_are_similar(self, rf, sl):
         return strings_similar(rf, sl)
@@ -973,12 +1142,256 @@ class Node:
 
         return True
 
+    compiles_match = match  # the match() function which do_compile_match() reproduces
+
+    def compile_match(self, iview=VIEW.INT, oview=None, check_level=False, match_miss=False):
+        """
+        Compiles this constraint into a matcher function: `matcher(obj)` gives the same result as
+        `self.match(obj, iview, oview, check_level, match_miss)`, but the constraint tree is interpreted only once.
+        Use it when matching many objects against the same constraint. The constraint should not be modified while
+        the matcher is in use.
+
+        :return: the matcher function
+        :rtype: Callable[[Node], bool]
+        """
+        if type(self).match is not type(self).compiles_match:  # match overridden, without a compiled version
+            return self.interpreted_matcher(iview, oview, check_level, match_miss)
+        return self.do_compile_match(iview, oview, check_level, match_miss)
+
+    def interpreted_matcher(self, iview=VIEW.INT, oview=None, check_level=False, match_miss=False):
+        return partial(self.match, iview=iview, oview=oview, check_level=check_level, match_miss=match_miss)
+
+    def do_compile_match(self, iview, oview, check_level, match_miss):
+        """
+        Compiled version of `match()` - should be overridden together with `match()` (and `compiles_match`).
+        """
+        if oview is None:
+            oview = self.constr_obj_view
+        if iview == VIEW.EXT and self.res != self:
+            return self.res.compile_match(iview=VIEW.INT, oview=oview, check_level=check_level, match_miss=match_miss)
+        if self.typename() == 'Empty':
+            return lambda obj: False
+
+        operators = node_fact.operators
+        op_names = set(operators)
+        obj_res = oview == VIEW.EXT
+        clevel = self.constraint_level
+        stype, tname = type(self), self.typename()
+        check_type = tname != 'Node'
+        is_any = tname == 'Node' and len(self.inputs) == 0
+        sid, stags = self.id, self.tags
+        req_tags = [(t, v) for t, v in stags.items() if TAG_NO_MATCH not in t]
+        leaf_eq = self.func_EQ if self.data is not None else None
+        steps = [] if is_any or leaf_eq else self.compile_input_matches(match_miss)
+
+        def matcher(obj):
+            if obj_res:
+                obj = obj.res
+            obj_is_op = type(obj).__name__ in op_names
+            if check_level and not obj_is_op and not compatible_clevel(clevel, obj.constraint_level):
+                return False
+            if check_type:
+                tp = type(obj)
+                if obj_is_op:
+                    tp = obj.get_op_type()
+                if tp != stype and tp not in operators and not issubclass(tp, stype):
+                    return False
+                if obj_is_op:
+                    for o in obj.get_op_objects():
+                        if o.typename() != 'Node' and o.typename() != tname:
+                            return False
+                        if check_level and not compatible_clevel(clevel, o.constraint_level):
+                            return False
+            if is_any or sid == obj.id:
+                return True
+            otags = obj.tags
+            for t, v in req_tags:
+                if t not in otags or (v and v != otags[t]):
+                    return False
+            if otags:
+                for t in otags:
+                    if '*' in t and (t not in stags or otags[t] != stags[t]):
+                        return False
+            if leaf_eq:
+                return leaf_eq(obj)
+            if type(obj).__name__ == 'SET':
+                if posname(1) in obj.inputs and len(obj.inputs) == 1:
+                    return self.match(obj.input_view(posname(1)), iview=VIEW.INT,
+                                      check_level=check_level, match_miss=match_miss)
+                return False
+            for step in steps:
+                r = step(obj)
+                if r is not None:
+                    return r
+            return True
+
+        return matcher
+
+    def compile_input_matches(self, match_miss):
+        """
+        Compiles the input part of `match()` - a list of steps, each returning `True`/`False` if the match is decided,
+        or `None` to continue with the next step. The input constraints are compiled only when first used.
+        """
+        steps = []
+        sinputs = self.inputs
+        for nm in sinputs:
+            inp, iview = self.input_view(nm), self.view_mode[nm]
+            if self.typename() == 'Node':
+                sub = lazy_matcher(inp, iview=iview, match_miss=match_miss)
+                if nm == '_inp':
+                    def step(obj, sub=sub):
+                        for onm in obj.inputs:
+                            if onm not in sinputs and sub(obj.input_view(onm)):
+                                return True
+                        return False
+                else:
+                    def step(obj, nm=nm, sub=sub):
+                        if nm not in obj.inputs or not sub(obj.input_view(nm)):
+                            return False
+            elif nm in self.signature:
+                sig = self.signature[nm]
+                if sig.prop or (not sig.custom and inp.typename() == 'Clear'):
+                    continue
+                if sig.custom:
+                    def step(obj, nm=nm, iview=iview):
+                        if not self.custom_match(nm, obj, iview=iview, match_miss=match_miss):
+                            return False
+                else:
+                    sub = None if sig.excl_match else lazy_matcher(inp, iview=iview, match_miss=match_miss)
+                    miss_ok = (sig.match_miss and match_miss) or inp.typename() == 'Empty'
+
+                    def step(obj, nm=nm, sub=sub, miss_ok=miss_ok):
+                        if nm in obj.inputs:
+                            if sub and not sub(obj.input_view(nm)):
+                                return False
+                        elif not miss_ok:
+                            return False
+            elif nm == '_out_type':
+                def step(obj, dat=self.get_dat(nm)):
+                    if not obj.outypename() == dat:
+                        return False
+            elif nm == '_aka':
+                def step(obj, aka=inp):
+                    if not aka.match_aka(obj):
+                        return False
+            else:
+                def step(obj):
+                    return False
+            steps.append(step)
+        return steps
+
+    def match_types(self, iview=VIEW.INT):
+        """
+        Gets the types which a (non operator) object must have in order to match this constraint, when matching with
+        `check_level=True` - i.e. the type of the constraint, its subclasses, and the compatible constraint level.
+        This allows to narrow down the candidates before calling `match()`.
+
+        :return: (set of type names, constraint level), or (None, None) if the constraint may match any type
+        :rtype: Tuple[Optional[Set[str]], Optional[int]]
+        """
+        constr = self.res if iview == VIEW.EXT and self.res != self else self
+        if type(constr).match is not Node.match or constr.is_operator() or constr.typename() == 'Node':
+            return None, None  # overridden match logic - can't tell
+        typs = {constr.typename()} | {i.__name__ for i in get_subclasses(type(constr))}
+        return typs, max(constr.constraint_level - 1, 0)  # see compatible_clevel()
+
     def compare_graphs(self, other, sort_inps=True):
+        """
+        Compares the graphs under this node and under `other`, as shown by `print_tree` (without ids).
+
+        The ids of their structures (see `struct_id`) are compared first - the graphs are written out only if these are
+        equal, and some nodes are shown more than once (i.e. the strings may still differ by the ids of these nodes).
+
+        :rtype: bool
+        """
+        if sort_inps:  # (else the inputs of `other` are shown in their order, which the structure ids don't tell)
+            ids = None if self.context is not None and other.context is self.context else {}
+            if self.struct_id(ids) != other.struct_id(ids):
+                return False
+            if self is other or self.shown_once() and other.shown_once():
+                return True
         return self.print_tree(None, ind=None, with_id=False, with_pos=False,
                                trim_leaf=True, trim_sugar=True, mark_val=False, sort_inps=True)[0] == \
             other.print_tree(None, ind=None, with_id=False, with_pos=False,
                              trim_leaf=True, trim_sugar=True, mark_val=False, sort_inps=sort_inps)[0]
 
+    def shown_inputs(self):
+        """
+        Gets the inputs which `print_tree` shows for this node (when not showing ids) - in the order of their names.
+        """
+        if self.is_base_type() and self.dat is not None:  # a value - shown without its type and inputs
+            return []
+        if self.typename() == 'getattr' and posname(2) in self.inputs:
+            return [self.inputs[posname(2)]]
+        return [self.inputs[nm] for nm in sorted(self.inputs)]
+
+    def struct_id(self, ids=None):
+        """
+        Gets an id of the structure of the graph under this node - of the type names, constraint levels, input names
+        and values, as shown by `compare_graphs`. Graphs with the same id are shown the same - except for the ids of
+        nodes which are shown more than once (see `shown_once`).
+
+        Computed bottom up. The ids are numbered by the context of the node, and kept in the nodes until they change -
+        their links, data or constraint level - which should be notified by `mark_changed` (or `set_data`).
+
+        :param ids: the ids of the structures - { structure : id }, updated. If given, the ids are taken from it, and
+            not kept in the nodes - for nodes without a context, or from different contexts (the same dict must then
+            be used for all the ids which are compared)
+        :type ids: Optional[Dict[tuple, int]]
+        :rtype: int
+        """
+        keep = ids is None
+        if keep:
+            if self._struct_id is not None:
+                return self._struct_id
+            ids = self.context.struct_ids
+        memo = {}  # { node : id } - of this call
+        stack = [(self, False)]
+        while stack:
+            nd, expanded = stack.pop()
+            if nd in memo:
+                continue
+            if keep and nd._struct_id is not None:
+                memo[nd] = nd._struct_id
+                continue
+            if not expanded:
+                stack.append((nd, True))
+                stack.extend((i, False) for i in nd.inputs.values())
+                continue
+            if nd.is_base_type() and nd.dat is not None:  # a value - shown without its type
+                key = (str(nd.data),)
+            elif nd.typename() == 'getattr' and posname(2) in nd.inputs:
+                key = (':', str(nd.get_dat(posname(1))), memo[nd.inputs[posname(2)]])
+            else:
+                inps = tuple((show_prm_nm(nm, False, nd.signature), memo[nd.inputs[nm]]) for nm in sorted(nd.inputs))
+                data = str(nd.data) if not inps and (nd.data is not None or nd.dat is not None) else None
+                key = (nd.typename(), nd.constraint_level, inps, data)
+            i = memo[nd] = ids.setdefault(key, len(ids))
+            if keep:
+                nd._struct_id = i
+        return memo[self]
+
+    def shown_once(self):
+        """
+        Checks if `print_tree` shows each node of the graph under this node once - otherwise, the nodes shown again are
+        shown by their ids. Kept in the node, together with its `struct_id`.
+
+        :rtype: bool
+        """
+        if self._shown_once is not None:
+            return self._shown_once
+        seen = set()  # (by id, as print_tree)
+        stack = [self]
+        once = True
+        while stack and once:
+            nd = stack.pop()
+            once = nd.id not in seen
+            seen.add(nd.id)
+            stack.extend(nd.shown_inputs())
+        if self._struct_id is not None:
+            self._shown_once = once
+        return once
+
     # compare two graphs - used for comparing two unevaluated expressions
     # customize this part
     def custom_compare_tree(self, other, diffs):
@@ -1036,7 +1449,7 @@ class Node:
         Finds all parent nodes of current node and their distance. Score is a combination of distance to goal and how
         recent that goal is (return lowest score).
         """
-        depths, orig = self.parent_nodes(res=follow_res)
+        depths, orig = self.parent_nodes(res=follow_res, targets=goals)
         b = 999999
         cturn = self.context.turn_num
         for ig, g in enumerate(reversed(goals)):
@@ -1048,7 +1461,7 @@ class Node:
                     s += p.order_score_offset(path)
                 if s < b:
                     b = s
-        if self in self.context.exception_nodes + self.context.copied_exceptions:
+        if self in self.context.exception_nodes or self in self.context.copied_exceptions:
             b += exc
         return b
 
@@ -1077,12 +1490,59 @@ class Node:
     def exec(self, all_nodes=None, goals=None):
         pass
 
+    def is_pure_eval(self):
+        """
+        Checks if the evaluation of the node only changes the node itself (see `pure_eval`) - either the type declares
+        it, or the type keeps the default logic of the evaluation.
+
+        :return: True if the node can be evaluated apart (in another thread)
+        :rtype: bool
+        """
+        cls = type(self)
+        if cls.pure_eval:
+            return True
+        if cls.evaluate is not Node.evaluate:
+            return False
+        if self.constraint_level > 0:
+            return cls.valid_constraint is Node.valid_constraint
+        return cls.valid_input is Node.valid_input and cls.exec is Node.exec
+
+    def fetch(self):
+        """
+        Reads in advance the external data which exec needs (e.g. the rows of a DB query) - for the types with
+        `parallel_fetch`. Called in another thread, once the inputs of the node were evaluated; it may read the inputs,
+        but must not change the graph or the dialog context. The exec of the node gets the data with `fetched`.
+
+        :return: the data, or None if there is nothing to read in advance
+        :rtype: Any
+        """
+        return None
+
+    def set_fetched(self, data):
+        """
+        Keeps the data read by `fetch` for the exec of the node (or drops it, if `data` is None).
+        """
+        if data is None:
+            _fetched_data.pop(self, None)
+        else:
+            _fetched_data[self] = data
+
+    def fetched(self):
+        """
+        Gets - once - the data which `fetch` read in advance for the node.
+
+        :return: the data, or None if it was not read in advance (exec should then read it itself)
+        :rtype: Any
+        """
+        return _fetched_data.pop(self, None)
+
     def fix_counters(self):
         for i in list(self.counters.keys()):
             if i.startswith('max_'):
                 s = i[4:]
                 if s not in self.counters:
                     self.counters[s] = 0
+                    self.mark_changed(links=False)
 
     def count_ok(self, nm):
         if nm in self.counters:
@@ -1096,17 +1556,86 @@ class Node:
             self.counters[nm] += inc
         else:
             self.counters[nm] = inc
+        self.mark_changed(links=False)
 
     def reset_count(self, nm, val=0):
         self.counters[nm] = val
+        self.mark_changed(links=False)
 
     # validate input
     # execute function (if applicable) set result pointer (possibly create result node(s))
     # raise exception on error
+    def input_fingerprint(self, memo=None):
+        """
+        Gets a content fingerprint of the inputs of the node - the input names, and for the subgraphs under the
+        inputs: the type, constraint level, data, input names and view modes, and results of their nodes.
+        Two nodes have the same fingerprint if their inputs have the same content (not necessarily the same nodes).
+
+        :param memo: fingerprints of nodes already computed - { node : fingerprint }. Pass the same memo to compare
+        two nodes which share nodes
+        :type memo: Dict[Node, tuple]
+        :return: the fingerprint
+        :rtype: tuple
+        """
+        memo = {} if memo is None else memo
+        stack = [i for _, i in self.fingerprint_inputs()]
+        while stack:
+            n = stack[-1]
+            if n in memo:
+                stack.pop()
+                continue
+            res = n.result if n.result is not None and n.result != n else None
+            inps = n.fingerprint_inputs()
+            pending = [i for _, i in inps if i not in memo]
+            if res is not None and res not in memo:
+                pending.append(res)
+            if pending:
+                stack.extend(pending)
+                continue
+            stack.pop()
+            memo[n] = (n.typename(), n.constraint_level, n.data,
+                       tuple((nm, n.view_mode.get(nm), memo[i]) for nm, i in inps),
+                       memo[res] if res is not None else None)
+        return tuple((nm, self.view_mode.get(nm), memo[i]) for nm, i in self.fingerprint_inputs())
+
+    def fingerprint_inputs(self):
+        # inputs which are not duplicated (e.g. debug inputs) are not part of the content
+        return [(nm, i) for nm, i in self.inputs.items()
+                if nm not in self.signature or 'omit_dup' not in self.signature[nm].prmtags]
+
+    def can_reuse_dup_result(self):
+        """
+        Additional (type specific) conditions for reusing the result of the original node - see `reuse_dup_result`.
+        """
+        return True
+
+    def do_reuse_dup_result(self):
+        """
+        If this node is a duplicate (e.g. made by revise) of an evaluated node, and its inputs have the same content
+        as the inputs of the original node - take the result of the original node instead of calling `exec` again.
+        Done only for types which declare `reuse_dup_result`.
+
+        :return: True if the result of the original node was reused
+        :rtype: bool
+        """
+        orig = self.dup_of
+        if not type(self).reuse_dup_result or not environment_definitions.reuse_dup_results or orig is None or \
+                type(orig) is not type(self) or not orig.evaluated or orig.result is None or orig.result == orig \
+                or orig.context is not self.context or orig.constraint_level != self.constraint_level or \
+                (self.context and orig in self.context.exception_nodes) or not self.can_reuse_dup_result():
+            return False
+        memo = {}
+        if self.input_fingerprint(memo) != orig.input_fingerprint(memo):
+            return False
+        logger.debug('reusing result of %s for %s', orig, self)
+        self.set_result(orig.result)
+        return True
+
     def evaluate(self, all_nodes=None, goals=None):
         if self.evaluated:  # no need to repeat TODO: make sure this holds!
             return
 
+        self.mark_changed(links=False)  # the evaluation sets the flags, the attributes... of the node
         self.fix_counters()
 
         # 1. custom input validity checks - called after verified no obligatory input is missing
@@ -1129,7 +1658,8 @@ class Node:
         # this will set self.result
         # exec may generate new goals (but usually just return None)
         if self.constraint_level == 0:  # function nodes which are used as type constraint - don't exec
-            self.exec(all_nodes, goals)
+            if not self.do_reuse_dup_result():
+                self.exec(all_nodes, goals)
 
         # 5. if result not set by now (i.e. not a function) then set it to self
         if self.result is None:  # TODO: in case of a function constraint...
@@ -1162,15 +1692,15 @@ class Node:
 
     # get nodes for which self is (transitively) a result - create a dict {node, dist} by BFS
     def parent_res(self):
-        q = [self]
+        q = deque([self])
         depths = {}
         while q:
-            n = q.pop()
+            n = q.popleft()
             d = depths[n] if depths else 0
             for o in n.res_out:
                 if o not in depths:
                     depths[o] = d + 1
-                    q.insert(0, o)
+                    q.append(o)
         return depths
 
     def get_key_index(self, k):
@@ -1184,28 +1714,40 @@ class Node:
 
     # return set of all nodes connected transitively by output edges - create a dict {node, dist} by BFS
     # TODO: should also include result? no (?)
-    def parent_nodes(self, res=False):
-        q = [self]
+    # if targets are given - stop as soon as all of them are reached (the dist of reached nodes does not change later)
+    def parent_nodes(self, res=False, targets=None):
+        q = deque([self])
         depths = {self: 0}
         orig = {}  # for each node - from where did we get to ("edge origin") (the first origin) - not used!
+        left = set(targets) - {self} if targets is not None else None
+        if left is not None and not left:
+            return depths, orig
         while q:
-            n = q.pop()
+            n = q.popleft()
             d = depths[n]
             if res:
                 rdep = n.parent_res()
                 for r in rdep:
                     if r not in depths:
                         depths[r] = d + 0.01 * rdep[r]
-                        q.insert(0, r)
+                        q.append(r)
                         if r not in orig:
                             orig[r] = ('RES', n)
+                        if left is not None and r in left:
+                            left.discard(r)
+                            if not left:
+                                return depths, orig
             for m, o in n.outputs:
                 if o not in depths:
                     depths[o] = d + 1 + 0.0001 * o.get_key_index(
                         m)  # last element - make score depend on order of inputs
                     if o not in orig:
                         orig[o] = (m, n)
-                    q.insert(0, o)
+                    q.append(o)
+                    if left is not None and o in left:
+                        left.discard(o)
+                        if not left:
+                            return depths, orig
         return depths, orig
 
     # after calling parent_nodes, use the calculated 'orig' for more efficiently finding path from self to target node
@@ -1284,25 +1826,54 @@ class Node:
         :type res_only: bool
         """
         nodes = nodes if nodes else []
-        parents = parents if parents else []
-        parents.append(self)
-        for n in self.follow_nodes(parents, follow_res, summarize=summarize, follow_detached=follow_detached,
-                                   follow_view=follow_view, res_only=res_only):  # TODO: follow_re_trans - not used?
-            if n not in nodes and (not exclude_neg or n.typename() not in ['NEQ', 'NOT', 'NONE']):
-                nodes = n.topological_order(nodes, parents, follow_res, exclude_neg, follow_res_trans,
-                                            summarize, follow_detached, follow_view, res_only)
-        if self not in nodes:
-            nodes.append(self)
+        parents = set(parents) if parents else set()
+        return self.topological_walk(nodes, set(nodes), parents, follow_res, exclude_neg, summarize,
+                                     follow_detached, follow_view, res_only)
+
+    def topological_walk(self, nodes, done, parents, follow_res=True, exclude_neg=False, summarize=None,
+                         follow_detached=False, follow_view=False, res_only=False):
+        """
+        Iterative implementation of `topological_order`. Keeps an explicit stack instead of recursing, so deep graphs
+        do not hit the python recursion limit, and uses sets for the membership checks.
+
+        The order is exactly the one of the recursive DFS: a node's successors (given by `follow_nodes`) are taken
+        lazily, one at a time, and a successor is visited only if it was not yet appended to `nodes` at that moment.
+
+        :param nodes: list of nodes, in topological order, which is extended in place
+        :param done: the set of the nodes in `nodes`, updated in place
+        :param parents: the set of nodes which were already visited in the current walk, updated in place
+        :return: `nodes`
+        :rtype: List["Node"]
+        """
+        neg = ['NEQ', 'NOT', 'NONE']
+        parents.add(self)
+        stack = [(self, iter(self.follow_nodes(parents, follow_res, summarize=summarize,
+                                               follow_detached=follow_detached, follow_view=follow_view,
+                                               res_only=res_only)))]
+        while stack:
+            nd, succ = stack[-1]
+            for n in succ:
+                if n not in done and (not exclude_neg or n.typename() not in neg):
+                    parents.add(n)
+                    stack.append((n, iter(n.follow_nodes(parents, follow_res, summarize=summarize,
+                                                         follow_detached=follow_detached, follow_view=follow_view,
+                                                         res_only=res_only))))
+                    break
+            else:  # all successors done
+                stack.pop()
+                if nd not in done:
+                    done.add(nd)
+                    nodes.append(nd)
         return nodes
 
     @staticmethod
     def collect_nodes(goals, follow_res=True, exclude_neg=False, follow_res_trans=False,
                       summarize=None, follow_detached=False, follow_view=False):
-        nodes = []
+        nodes, done = [], set()
         goals = to_list(goals)
         for gl in goals:
-            nodes = gl.topological_order(nodes, None, follow_res, exclude_neg, follow_res_trans, summarize,
-                                         follow_detached, follow_view)
+            nodes = gl.topological_walk(nodes, done, set(), follow_res, exclude_neg, summarize,
+                                        follow_detached, follow_view)
         return nodes
 
     @staticmethod
@@ -1411,6 +1982,9 @@ class Node:
                     n_in.add_output(nm, n)
                 else:  # never true keep old input (already copied), and add output link from old node to new node
                     o_in.add_output(nm, n)
+        # the new nodes are not reachable from any goal yet, so only the version of the graph changes
+        if n_context:
+            n_context.graph_changed()
 
         if do_on_dup:
             for n in new_subgraph:
@@ -1589,94 +2163,150 @@ class Node:
 
     def print_tree(self, parent, ind=None, seen=None, with_id=True, with_pos=True, trim_leaf=True,
                    trim_sugar=True, mark_val=True, assg=True, with_res=False, sort_inps=False):
-        seen = seen if seen else []
-        if self.id in seen:
-            return id_sexp(self), seen
-        seen.append(self.id)
-        inputs = list(self.inputs.keys())
-        if sort_inps:
-            inputs = sorted(inputs)
-        s = '%d:' % self.id if with_id and self.id is not None else ''
-        ii = ind + 4 if ind else None
-        t1 = ' ' * ind if ind else ''
-        t2 = ' ' * ii if ii else ''
-        if trim_leaf and not with_id and self.is_base_type() and self.dat is not None:
-            inps = []
-        elif trim_sugar and self.typename() == 'getattr':
-            ss, seen = self.inputs['pos2'].print_tree(self, ii, seen, with_id, with_pos, trim_leaf,
-                                                      trim_sugar, mark_val, assg, with_res, sort_inps)
-            return ':%s(%s)' % (self.get_dat('pos1'), ss), seen
-        else:
-            tn = self.typename()
-            if assg and is_assign_name(self.typename()) and (not parent or parent.typename() != 'let'):
-                tn = '$' + tn
-            s += tn + '?' * self.constraint_level
-            inps = []
-            for i in inputs:
-                ss, seen = self.inputs[i].print_tree(self, ii, seen, with_id, with_pos, trim_leaf,
-                                                     trim_sugar, mark_val, assg, with_res, sort_inps)
-                inps.append('%s%s%s' % (t2, show_prm_nm(i, with_pos, self.signature), ss))
-            if with_res and self.result != self:
-                ss, seen = self.result.print_tree(self, ii, seen, with_id, with_pos, trim_leaf,
-                                                  trim_sugar, mark_val, assg, with_res, sort_inps)
-                inps.append('%sresult=%s' % (t2, ss))
-        if inps:
-            b = '(\n' if ind else '('
-            e = '\n%s)' % t1 if ind else ')'
-            d = ',\n' if ind else ','
-            s += b + d.join(inps) + e
-        elif self.data is not None or (trim_leaf and self.dat is not None):
-            if with_id:
-                # s += '<%s>' % self.data
-                s += '(%s)' % self.data
+        """
+        Writes the graph under the node as a P-expression. A node which was already written (its id is in `seen`) is
+        written again only as a reference to its id.
+
+        :return: the P-expression, and the ids of the nodes written so far
+        :rtype: Tuple[str, Set[int]]
+        """
+        parts = []
+        seen = self.emit_tree(parts.append, parent, ind, seen, with_id, with_pos, trim_leaf, trim_sugar, mark_val,
+                              assg, with_res, sort_inps)
+        return ''.join(parts), seen
+
+    def write_tree(self, file, parent=None, ind=None, seen=None, with_id=True, with_pos=True, trim_leaf=True,
+                   trim_sugar=True, mark_val=True, assg=True, with_res=False, sort_inps=False):
+        """
+        Same as `print_tree`, but writes the P-expression to a text file as it goes - for dumping large graphs.
+
+        :return: the ids of the nodes written so far
+        :rtype: Set[int]
+        """
+        return self.emit_tree(file.write, parent, ind, seen, with_id, with_pos, trim_leaf, trim_sugar, mark_val, assg,
+                              with_res, sort_inps)
+
+    def emit_tree(self, write, parent, ind, seen, with_id, with_pos, trim_leaf, trim_sugar, mark_val, assg, with_res,
+                  sort_inps):
+        """
+        Writes the P-expression of `print_tree` in parts, by calling `write`. The graph is walked with an explicit stack
+        (depth first, in input order), so the time is linear in the size of the output, and deep graphs are fine.
+        """
+        seen = seen_ids(seen)
+        stack = [(self, parent, ind)]  # nodes to write - (node, parent, indentation), or strings to write as is
+        while stack:
+            item = stack.pop()
+            if type(item) is str:
+                write(item)
+                continue
+            nd, parent, ind = item
+            if nd.id in seen:
+                write(id_sexp(nd))
+                continue
+            seen.add(nd.id)
+            s = '%d:' % nd.id if with_id and nd.id is not None else ''
+            ii = ind + 4 if ind else None
+            t2 = ' ' * ii if ii else ''
+            inps = []  # (prefix, node)
+            if trim_leaf and not with_id and nd.is_base_type() and nd.dat is not None:
+                pass
+            elif trim_sugar and nd.typename() == 'getattr':
+                write(':%s(' % nd.get_dat('pos1'))
+                stack.append(')')
+                stack.append((nd.inputs['pos2'], nd, ii))
+                continue
             else:
-                # ss = '%s' % re.sub(' ', '_', str(self.data))
-                ss = str(self.data)
-                if mark_val and parent:
-                    nm = [n for (n, m) in self.outputs if m == parent][0]
-                    # tp = parent.signature[nm].type
-                    if self.typename()[:3].lower() == 'str':  # <<< hack!
-                        ss = escape_string(ss)
-                        # ss = ss if ss[0]=='"' else '"' + re.sub('"', '\\"', ss) + '"'
-                    # elif isinstance(tp, list) or tp != type(self):
-                    #     ss = '#' + ss
-                    ss = ss.replace('#', '')
-                s += ss if trim_leaf else '(%s)' % ss
-        else:
-            if s[0] != '$':
-                s += '()'
-        return s, seen
+                tn = nd.typename()
+                if assg and is_assign_name(tn) and (not parent or parent.typename() != 'let'):
+                    tn = '$' + tn
+                s += tn + '?' * nd.constraint_level
+                inputs = sorted(nd.inputs) if sort_inps else list(nd.inputs)
+                for i in inputs:
+                    inps.append((t2 + show_prm_nm(i, with_pos, nd.signature), nd.inputs[i]))
+                if with_res and nd.result != nd:
+                    inps.append((t2 + 'result=', nd.result))
+            if inps:
+                write(s + ('(\n' if ind else '('))
+                stack.append('\n%s)' % (' ' * ind) if ind else ')')
+                d = ',\n' if ind else ','
+                for k in range(len(inps) - 1, -1, -1):
+                    stack.append((inps[k][1], nd, ii))
+                    stack.append(d + inps[k][0] if k else inps[k][0])
+            elif nd.data is not None or (trim_leaf and nd.dat is not None):
+                if with_id:
+                    s += '(%s)' % nd.data
+                else:
+                    ss = str(nd.data)
+                    if mark_val and parent:
+                        nm = [n for (n, m) in nd.outputs if m == parent][0]
+                        if nd.typename()[:3].lower() == 'str':  # <<< hack!
+                            ss = escape_string(ss)
+                        ss = ss.replace('#', '')
+                    s += ss if trim_leaf else '(%s)' % ss
+                write(s)
+            else:
+                write(s if s[0] == '$' else s + '()')
+        return seen
 
     def compr_tree(self, seen=None):
-        seen = seen if seen else []
-        if self.id in seen:
-            return id_sexp(self), seen
-        seen.append(self.id)
-        feats = self.get_feat_str()
-        s = '<' + feats + '>' if feats else ''
-        tn = self.typename()
-        s += tn + '?' * self.constraint_level
-        inps = []
-        show_pos = False  # show name of pos param if input order does not respect it
-        nn = len(self.inputs)
-        inp_nms = list(self.inputs.keys())
-        for i in range(nn):
-            for j in range(i + 1, nn):
-                if is_pos(inp_nms[i]) and is_pos(inp_nms[j]) and posname_idx(inp_nms[i]) > posname_idx(inp_nms[j]):
-                    show_pos = True
-        for i in self.inputs:
-            ss, seen = self.inputs[i].compr_tree(seen)
-            inps.append('%s%s' % (show_prm_nm(i, show_pos, self.signature), ss))
-        t = self.get_tags_str()
-        if t:
-            inps.append(t)
-        if inps:
-            s += '(' + ','.join(inps) + ')'
-        elif self.data is not None:
-            s += '(%s)' % self.data
-        else:
-            s += '()'
-        return s, seen
+        """
+        Writes the graph under the node as a P-expression, with the features (id, creation turn, flags - see
+        `get_feat_str`) and the tags of the nodes - used to pack the context. A node which was already written is
+        written again only as a reference to its id.
+
+        :return: the P-expression, and the ids of the nodes written so far
+        :rtype: Tuple[str, Set[int]]
+        """
+        parts = []
+        seen = self.emit_compr_tree(parts.append, seen)
+        return ''.join(parts), seen
+
+    def write_compr_tree(self, file, seen=None):
+        """
+        Same as `compr_tree`, but writes the P-expression to a text file as it goes - for dumping large graphs.
+
+        :return: the ids of the nodes written so far
+        :rtype: Set[int]
+        """
+        return self.emit_compr_tree(file.write, seen)
+
+    def emit_compr_tree(self, write, seen):
+        """
+        Writes the P-expression of `compr_tree` in parts, by calling `write` (see `emit_tree`).
+        """
+        seen = seen_ids(seen)
+        stack = [self]  # nodes to write, or strings to write as is
+        while stack:
+            nd = stack.pop()
+            if type(nd) is str:
+                write(nd)
+                continue
+            if nd.id in seen:
+                write(id_sexp(nd))
+                continue
+            seen.add(nd.id)
+            feats = nd.get_feat_str()
+            s = '<' + feats + '>' if feats else ''
+            s += nd.typename() + '?' * nd.constraint_level
+            inp_nms = list(nd.inputs)
+            # show name of pos param if input order does not respect it
+            pos_idx = [posname_idx(i) for i in inp_nms if is_pos(i)]
+            show_pos = any(pos_idx[k] > pos_idx[k + 1] for k in range(len(pos_idx) - 1))
+            t = nd.get_tags_str()
+            if inp_nms or t:
+                write(s + '(')
+                stack.append(')')
+                if t:
+                    stack.append(',' + t if inp_nms else t)
+                for k in range(len(inp_nms) - 1, -1, -1):
+                    stack.append(nd.inputs[inp_nms[k]])
+                    nm = show_prm_nm(inp_nms[k], show_pos, nd.signature)
+                    stack.append(',' + nm if k else nm)
+            elif nd.data is not None:
+                write(s + '(%s)' % nd.data)
+            else:
+                write(s + '()')
+        return seen
 
     # describe - returns text (possibly empty), and list of objects/values (possibly empty)
     #    (describe typically assumes evaluation has been run already)
@@ -2180,10 +2810,29 @@ class Node:
             e = evaluate_graph(g, add_goal=add_goal)
         return g, e
 
+    @staticmethod
+    def call_construct_values_eval(typename, values, d_context, do_eval=True, register=True,
+                                   constr_tag=RES_COLOR_TAG):
+        """
+        Constructs the node from its input values (see `construct_graph_from_values`) - the same as
+        `call_construct_eval`, without formatting and parsing a P-expression.
+
+        :return: the constructed nodes and the list of exceptions
+        :rtype: Tuple[Node, List[Exception]]
+        """
+        from opendf.graph.constr_graph import construct_graph_from_values
+        g = construct_graph_from_values(typename, values, d_context, register=register, constr_tag=constr_tag)
+        e = None
+        if do_eval:
+            from opendf.graph.eval import evaluate_graph
+            e = evaluate_graph(g, add_goal=False)
+        return g, e
+
     def call_eval(self, add_goal, ext_only=False, reeval=False):
         from opendf.graph.eval import evaluate_graph
         if reeval:
             self.evaluated = False
+            self.mark_changed(links=False)
         e = evaluate_graph(self, add_goal=add_goal)
         return e
 
@@ -2276,6 +2925,7 @@ class Node:
         self.add_linked_input(nm, d, iv)
         if self.typename() == 'TEE':
             self.result = d  # TODO: use set_result()
+            self.mark_changed()
         if do_eval:
             e = d.call_eval(add_goal=False)
             if e:
@@ -2848,6 +3498,7 @@ class Node:
         for i in pos:
             inps[i] = self.inputs[i]
         self.inputs = inps
+        self.mark_changed()
         # sanity check
         for i in ii:
             if i not in self.inputs:
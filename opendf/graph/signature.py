@@ -190,6 +190,8 @@ class Signature(OrderedDict):
                                     # allow auto reorder of inputs (e.g. on revise, to raise more recent inputs)
         self.inp_dep = []  # list of input pairs which are not allowed to be changed
                              # - implicit/indirect dependencies between inputs
+        self.frozen = False  # the signature is complete, and shared by the nodes of its type (see `NodeType`) - the
+        #                      calls which would build it again are ignored
 
     def add_sig(self, name, typ,
                 oblig=False,  # obligatory parameter - complain if not given
@@ -203,6 +205,8 @@ class Signature(OrderedDict):
                 # for now - only for property 'get' - not for property 'set'. (may need additional flag for 'set')
                 alias=None,  # alias for positional argument
                 custom=None):  # parameter needs custom match function
+        if self.frozen:
+            return
         ptags = ptags if ptags else []
         if alias:
             if not is_pos(name):  # allow alias only for positional parameters
@@ -212,6 +216,19 @@ class Signature(OrderedDict):
         self.key_index[name] = len(self)
         self[name] = InputParam(typ, oblig, multi, excl_match, view, ptags, match_miss, prop, alias, custom)
 
+    def same_as(self, other):
+        """
+        Checks if `other` defines the same parameters (in the same order, with the same definitions) as this signature.
+
+        :param other: the other signature
+        :type other: Signature
+        :return: `True` if the signatures are the same; otherwise, `False`
+        :rtype: bool
+        """
+        if list(self.keys()) != list(other.keys()) or vars(self) != vars(other):
+            return False
+        return all(vars(p) == vars(other[k]) for k, p in self.items())
+
     def get_first_type_name(self, name):
         if name == '_aka':
             return 'Str'
@@ -289,5 +306,7 @@ class Signature(OrderedDict):
         return -1
 
     def set_multi_res(self, val):
+        if self.frozen:
+            return
         self.multi_res = val
 
@@ -0,0 +1,630 @@
+"""
+Compact binary snapshots of a dialog context - an alternative to pickling the whole `DialogContext`, or to
+`pack_context` / `unpack_context` (which write the graphs as P-expressions, and parse them again).
+
+A snapshot holds:
+    - the node table - id, type, constraint level, creation turn, flags and data of each registered node;
+    - the edge lists - the inputs (in input order) and the outputs of each node;
+    - the other fields of the nodes, only where they differ from a freshly created node of the same type (tags,
+      result pointers, view modes, subclass attributes...), and the nodes' internal data (see `get_internal_data`);
+    - the fields of the context - goals, exceptions, messages, assigns, `mem`...
+
+The graphs of the DB entities of the context (`db_graphs`) are not kept: they are valid only in the process which
+created them (see `EntityCache`), so a restored context reads the entities from the database again.
+
+The node table and the edge lists are flat lists of numbers; the other fields are pickled, with the nodes they refer to
+replaced by their ids. The graph is restored without parsing P-expressions.
+
+`ContextCheckpointer` stores a context after each turn as a snapshot, followed by deltas - which hold only the nodes
+which were added or changed since the previous checkpoint (and the fields of the context). `restore_checkpoints` replays
+a snapshot and its deltas.
+
+`GraphTemplate` uses the same representation for a single (e.g. DB) graph, independent of any context: the graph is
+captured once, and copied into each context which needs it.
+"""
+import io
+import logging
+import pickle
+import zlib
+from collections import OrderedDict
+from copy import deepcopy
+from operator import attrgetter
+
+from opendf.defs import EnvironmentDefinition
+from opendf.graph.dialog_context import DialogContext
+from opendf.graph.graph_index import ChangeLog
+from opendf.graph.node_factory import NodeFactory
+from opendf.graph.nodes.node import Node
+from opendf.graph.signature import AliasODict
+from opendf.exceptions.python_exception import SemanticException
+
+SNAPSHOT_MAGIC = b"ODFS"
+SNAPSHOT_VERSION = 1
+_FLAG_COMPRESSED = 1
+_FLAG_DELTA = 2
+
+# boolean fields of the node, stored as a bitmask in the node table
+NODE_FLAGS = ('evaluated', 'mutable', 'eval_res', 'res_block', 'no_revise', 'stop_eval_on_exception', 'detach', 'hide',
+              'inited', 'check_node', 'just_dup')
+
+# fields of the node which are stored in the node table / edge lists, or are not stored at all
+_TABLE_FIELDS = {'id', 'signature', 'inputs', 'outputs', 'data', 'constraint_level', 'created_turn', 'context',
+                 '_counters', '_struct_id', '_shown_once', '__dict__'}.union(NODE_FLAGS)
+_SPARSE_FIELDS = tuple(f for f in Node.__slots__ if f not in _TABLE_FIELDS)
+_NODE_SLOTS = tuple(f for f in Node.__slots__ if f not in ('inputs', '__dict__'))
+
+_CONTEXT_FIELDS = ('goals', 'other_goals', 'exceptions', 'exception_nodes', 'copied_exceptions', 'messages', 'assign',
+                   'res_assign', 'mem', 'turn_num', 'continued_turn', 'prev_agent_hints', 'prev_sugg_act')
+
+_MISSING = object()
+_CONTAINERS = (dict, list, set)
+
+logger = logging.getLogger(__name__)
+environment_definitions = EnvironmentDefinition.get_instance()
+node_fact = NodeFactory.get_instance()
+
+
+class _SnapshotPickler(pickle.Pickler):
+    """
+    Pickles the registered nodes of the context as references (their ids).
+    """
+
+    def __init__(self, file, d_context):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.nodes = d_context.idx_to_node
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Node) and self.nodes.get(obj.id) is obj:
+            return obj.id
+        return None
+
+
+class _SnapshotUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, d_context):
+        super().__init__(file)
+        self.nodes = d_context.idx_to_node
+
+    def persistent_load(self, pid):
+        return self.nodes[pid]
+
+
+def _sparse_fields(nd, fresh):
+    fields = {}
+    for name in _SPARSE_FIELDS:
+        value = getattr(nd, name)
+        if value is nd and name == 'result':
+            continue
+        if value is not getattr(fresh, name) and value != getattr(fresh, name):
+            fields[name] = value
+    fresh_attributes = getattr(fresh, '__dict__', {})
+    for name, value in getattr(nd, '__dict__', {}).items():
+        default = fresh_attributes.get(name, _MISSING)
+        if value is not default and (default is _MISSING or value != default):
+            fields[name] = value
+    return fields
+
+
+def _init_node(nd, prototype):
+    # (re)sets the fields of the node to those of a freshly created node, without calling __init__ (much faster, mostly
+    #   due to the signature) - each node gets its own containers
+    for name in _NODE_SLOTS:
+        value = getattr(prototype, name)
+        if value is prototype:
+            value = nd
+        elif type(value) in _CONTAINERS:
+            value = type(value)(value)
+        setattr(nd, name, value)
+    nd.inputs = AliasODict()
+    nd.inputs.aliases = nd.signature.aliases
+    nd.__dict__.clear()
+    if prototype.__dict__:
+        nd.__dict__.update(deepcopy(prototype.__dict__))
+
+
+def _node_recipe(prototype):
+    # the fields of a freshly created node, split as `_init_node` uses them - for initializing many nodes of a type
+    plain, containers, own = [], [], []
+    for name in _NODE_SLOTS:
+        value = getattr(prototype, name)
+        if value is prototype:
+            own.append(name)
+        elif type(value) in _CONTAINERS:
+            containers.append((name, value))
+        else:
+            plain.append((name, value))
+    return type(prototype), plain, containers, own, prototype.signature.aliases, prototype.__dict__
+
+
+def _new_node(recipe):
+    # the same as creating a node with `object.__new__`, and initializing it with `_init_node`
+    tp, plain, containers, own, aliases, attributes = recipe
+    nd = object.__new__(tp)
+    for name, value in plain:
+        setattr(nd, name, value)
+    for name, value in containers:
+        setattr(nd, name, type(value)(value))
+    for name in own:
+        setattr(nd, name, nd)
+    nd.inputs = inputs = AliasODict.__new__(AliasODict)
+    OrderedDict.__init__(inputs)
+    inputs.aliases = aliases
+    if attributes:
+        nd.__dict__.update(deepcopy(attributes))
+    return nd
+
+
+def _node_flags(nd):
+    flags = 0
+    for bit, flag in enumerate(NODE_FLAGS):
+        if getattr(nd, flag):
+            flags |= 1 << bit
+    return flags
+
+
+_get_state_fields = attrgetter(*NODE_FLAGS, 'constraint_level', 'data', 'result', 'dup_of')
+
+
+def _node_state(nd):
+    # the fields of the node which may change after it was created - used to check the nodes which changed since the
+    #   previous checkpoint (see `check_checkpoints`). Nodes are compared by identity, containers are copied (shallow).
+    #   The counters are allocated (with their default value) when they are first read
+    counters = nd._counters
+    return (_get_state_fields(nd), tuple(nd.inputs), tuple(nd.inputs.values()), tuple(nd.outputs), dict(nd.tags),
+            dict(nd.view_mode), tuple(nd.res_out), dict(counters) if counters and counters != {'dup': 1} else None,
+            dict(nd.__dict__) if nd.__dict__ else None)
+
+
+def _dump(d_context, nodes, removed, compress, level, delta):
+    """
+    Writes the given nodes, and the fields of the context. `removed` - the ids of the nodes removed since the previous
+    checkpoint (for a delta).
+    """
+    type_index, name_index = {}, {}
+    rows, edges, outputs = [], [], []
+    sparse, internal = {}, {}
+    fresh_nodes = {}  # { typename : fresh node of this type }
+    for nd in nodes:
+        i, typename = nd.id, nd.typename()
+        rows.extend((i, type_index.setdefault(typename, len(type_index)), nd.constraint_level, nd.created_turn,
+                     _node_flags(nd), nd.data))
+        for name, child in nd.inputs.items():
+            edges.extend((i, name_index.setdefault(name, len(name_index)), child.id))
+        for name, parent in nd.outputs:
+            outputs.extend((i, name_index.setdefault(name, len(name_index)), parent.id))
+
+        fresh = fresh_nodes.get(typename)
+        if fresh is None:
+            fresh = fresh_nodes[typename] = type(nd)()
+        fields = _sparse_fields(nd, fresh)
+        if fields:
+            sparse[i] = fields
+        if nd._counters is not None or type(nd).get_internal_data is not Node.get_internal_data:
+            internal[i] = nd.get_internal_data()
+
+    context = {name: getattr(d_context, name) for name in _CONTEXT_FIELDS}
+    context['next_node_id'] = d_context.get_next_node_id()
+    context['data'] = d_context.get_snapshot_data()
+
+    buffer = io.BytesIO()
+    pickle.dump((list(type_index), list(name_index), rows, edges, outputs, removed), buffer,
+                protocol=pickle.HIGHEST_PROTOCOL)
+    _SnapshotPickler(buffer, d_context).dump((sparse, internal, context))
+    payload = buffer.getvalue()
+    if compress:
+        payload = zlib.compress(payload, level)
+    flags = (_FLAG_COMPRESSED if compress else 0) | (_FLAG_DELTA if delta else 0)
+    return SNAPSHOT_MAGIC + bytes((SNAPSHOT_VERSION, flags)) + payload
+
+
+def _read_header(snapshot):
+    """
+    Checks the header of a snapshot / delta, and returns its flags and its (decompressed) payload.
+    """
+    if snapshot[:len(SNAPSHOT_MAGIC)] != SNAPSHOT_MAGIC:
+        raise SemanticException('Not a dialog context snapshot')
+    version, flags = snapshot[len(SNAPSHOT_MAGIC)], snapshot[len(SNAPSHOT_MAGIC) + 1]
+    if version != SNAPSHOT_VERSION:
+        raise SemanticException('Unsupported snapshot version: %d' % version)
+    payload = snapshot[len(SNAPSHOT_MAGIC) + 2:]
+    if flags & _FLAG_COMPRESSED:
+        payload = zlib.decompress(payload)
+    return flags, payload
+
+
+def _load(payload, d_context, delta):
+    """
+    Loads a snapshot / delta into the context. Nodes which already exist (with the same type) are reset and updated in
+    place, so the references of the other nodes to them remain valid. The other nodes of the context are dropped when
+    loading a snapshot (not a delta).
+    """
+    buffer = io.BytesIO(payload)
+    typenames, names, rows, edges, outputs, removed = pickle.load(buffer)
+
+    idx_to_node = d_context.idx_to_node
+    if delta:
+        existing = idx_to_node
+        for i in removed:
+            idx_to_node.pop(i, None)
+    else:  # the nodes are registered again, in the order of the snapshot
+        existing = dict(idx_to_node)
+        idx_to_node.clear()
+        if d_context.change_log is not None:
+            d_context.change_log.removed.extend(existing)
+            d_context.change_log.last_id = -1
+    node_types = node_fact.node_types
+    prototypes = [node_types[typename]() for typename in typenames]
+    for j in range(0, len(rows), 6):
+        i, tp, constraint_level, created_turn, node_flags, data = rows[j:j + 6]
+        prototype = prototypes[tp]
+        nd = existing.get(i)
+        if nd is not None and type(nd) is type(prototype):
+            _init_node(nd, prototype)
+            nd.id, nd.context = i, d_context
+            idx_to_node[i] = nd
+        else:
+            idx_to_node.pop(i, None)
+            nd = object.__new__(type(prototype))
+            _init_node(nd, prototype)
+            d_context.register_node(nd, renumber=i)
+        nd.constraint_level = constraint_level
+        nd.created_turn = created_turn
+        for bit, flag in enumerate(NODE_FLAGS):
+            setattr(nd, flag, bool(node_flags & (1 << bit)))
+        nd.data = data
+    for j in range(0, len(edges), 3):
+        idx_to_node[edges[j]].inputs[names[edges[j + 1]]] = idx_to_node[edges[j + 2]]
+    for j in range(0, len(outputs), 3):
+        idx_to_node[outputs[j]].outputs.append((names[outputs[j + 1]], idx_to_node[outputs[j + 2]]))
+
+    sparse, internal, context = _SnapshotUnpickler(buffer, d_context).load()
+    for i, fields in sparse.items():
+        nd = idx_to_node[i]
+        for name, value in fields.items():
+            setattr(nd, name, value)
+    for i, value in internal.items():
+        idx_to_node[i].set_internal_data(value)
+
+    for name in _CONTEXT_FIELDS:
+        setattr(d_context, name, context[name])
+    d_context.db_graphs = {}
+    d_context.set_next_node_id(context['next_node_id'])
+    d_context.set_snapshot_data(context['data'])
+    d_context.rebuild_indexes()  # the restored nodes were not notified - see Node.mark_changed
+
+
+def snapshot_context(d_context, compress=True, level=6):
+    """
+    Creates a binary snapshot of the dialog context (see `restore_context`).
+
+    :param d_context: the dialog context
+    :type d_context: DialogContext
+    :param compress: if `True`, compress the snapshot (zlib)
+    :type compress: bool
+    :param level: the compression level
+    :type level: int
+    :return: the snapshot
+    :rtype: bytes
+    """
+    return _dump(d_context, list(d_context.idx_to_node.values()), [], compress, level, False)
+
+
+def restore_context(snapshot, d_context=None):
+    """
+    Restores a dialog context from a snapshot created by `snapshot_context`. The node types of the snapshot must be
+    loaded in the node factory.
+
+    :param snapshot: the snapshot
+    :type snapshot: bytes
+    :param d_context: the context to restore into (its current nodes are replaced); if `None`, a new `DialogContext`
+    :type d_context: DialogContext or None
+    :return: the restored context
+    :rtype: DialogContext
+    """
+    flags, payload = _read_header(snapshot)
+    if flags & _FLAG_DELTA:
+        raise SemanticException('A delta checkpoint can not be restored by itself - see restore_checkpoints')
+    d_context = d_context if d_context is not None else DialogContext()
+    _load(payload, d_context, False)
+    return d_context
+
+
+class ContextCheckpointer:
+    """
+    Creates the checkpoints of a dialog context, e.g. after each turn. The first checkpoint is a snapshot of the
+    context, the following ones are deltas, which hold only:
+        - the nodes added since the previous checkpoint - the nodes with higher ids;
+        - the nodes which changed since the previous checkpoint (these are written again in full) - the context logs
+          the nodes notified by `Node.mark_changed` (see `ChangeLog`);
+        - the ids of the removed nodes;
+        - the fields of the context (goals, exceptions, messages...).
+
+    The cost of a checkpoint depends only on the nodes of the turn. The code which changes the nodes of the previous
+    turns in place must notify the changes (see `Node.mark_changed`); `EnvironmentDefinition.check_checkpoints` (debug)
+    compares all the nodes to their state at the previous checkpoint, and warns of the changes which were not notified.
+
+    A context is checkpointed by a single checkpointer.
+    """
+
+    def __init__(self, d_context, compress=True, level=6, stored=False):
+        """
+        :param d_context: the dialog context
+        :type d_context: DialogContext
+        :param compress: if `True`, compress the checkpoints (zlib)
+        :type compress: bool
+        :param level: the compression level
+        :type level: int
+        :param stored: if `True`, the context is already stored (e.g. it was just restored by `restore_checkpoints`),
+            so the first checkpoint is a delta
+        :type stored: bool
+        """
+        self.d_context = d_context
+        self.compress = compress
+        self.level = level
+        self.states = None  # { node id : (node, state) } - at the last checkpoint (only for check_checkpoints)
+        if stored:
+            self._start_log()
+
+    def _start_log(self):
+        d_context = self.d_context
+        d_context.change_log = ChangeLog(max(d_context.idx_to_node, default=-1))
+        self.states = self._node_states() if environment_definitions.check_checkpoints else None
+
+    def _node_states(self):
+        return {i: (nd, _node_state(nd)) for i, nd in self.d_context.idx_to_node.items()}
+
+    def _logged_nodes(self, log):
+        """
+        Gets the nodes which changed since the last checkpoint (in id order), followed by the new nodes (in
+        registration order).
+        """
+        idx_to_node = self.d_context.idx_to_node
+        new = []
+        for i, nd in reversed(idx_to_node.items()):
+            if i <= log.last_id:
+                if nd in log.changed:  # e.g. renumbered (after the new nodes)
+                    continue
+                break
+            new.append(nd)
+        new.reverse()
+        changed = sorted((nd for nd in log.changed if nd.id is not None and nd.id <= log.last_id and
+                          idx_to_node.get(nd.id) is nd), key=attrgetter('id'))
+        return changed + new
+
+    def _check_log(self, nodes, removed):
+        """
+        Compares all the nodes to their state at the previous checkpoint (debug). The changes which were not notified
+        are added to the delta.
+        """
+        states, missed = {}, []
+        logged = set(nodes)
+        for i, nd in self.d_context.idx_to_node.items():
+            state = _node_state(nd)
+            previous = self.states.get(i)
+            if (previous is None or previous[0] is not nd or previous[1] != state) and nd not in logged:
+                missed.append(nd)
+            states[i] = (nd, state)
+        missed_removed = [i for i in self.states if i not in states and i not in removed]
+        self.states = states
+        if missed or missed_removed:
+            logger.warning('checkpoint: changes which were not notified (see Node.mark_changed) - nodes: %s, '
+                           'removed ids: %s', [(nd.id, nd.typename()) for nd in missed], missed_removed)
+        return nodes + missed, removed + missed_removed
+
+    def checkpoint(self):
+        """
+        Creates a checkpoint of the context - a snapshot (the first time), or a delta from the previous checkpoint.
+
+        :return: the checkpoint
+        :rtype: bytes
+        """
+        d_context = self.d_context
+        log = d_context.change_log
+        if log is None:
+            self._start_log()
+            return _dump(d_context, list(d_context.idx_to_node.values()), [], self.compress, self.level, False)
+        nodes = self._logged_nodes(log)
+        removed = list(dict.fromkeys(log.removed))
+        if self.states is not None:
+            nodes, removed = self._check_log(nodes, removed)
+        last_id = max(log.last_id, max((nd.id for nd in nodes), default=-1))
+        d_context.change_log = ChangeLog(last_id)
+        return _dump(d_context, nodes, removed, self.compress, self.level, True)
+
+
+def restore_checkpoints(checkpoints, d_context=None):
+    """
+    Restores a dialog context from its checkpoints (see `ContextCheckpointer`) - a snapshot, followed by the deltas.
+
+    :param checkpoints: the checkpoints, in the order they were created
+    :type checkpoints: List[bytes]
+    :param d_context: the context to restore into (its current nodes are replaced); if `None`, a new `DialogContext`
+    :type d_context: DialogContext or None
+    :return: the restored context
+    :rtype: DialogContext
+    """
+    d_context = d_context if d_context is not None else DialogContext()
+    for n, checkpoint in enumerate(checkpoints):
+        flags, payload = _read_header(checkpoint)
+        if bool(flags & _FLAG_DELTA) != (n > 0):
+            raise SemanticException('The checkpoints must be a snapshot, followed by deltas')
+        _load(payload, d_context, n > 0)
+    return d_context
+
+
+class _TemplatePickler(pickle.Pickler):
+    """
+    Pickles the nodes of a template as references - their positions in the template (>= 0), or in the external nodes
+    (< 0). A reference to any other node makes the graph unsuitable for a template (see `outside`).
+    """
+
+    def __init__(self, file, positions, external):
+        super().__init__(file, protocol=pickle.HIGHEST_PROTOCOL)
+        self.positions = positions
+        self.external = external
+        self.outside = False
+
+    def persistent_id(self, obj):
+        if isinstance(obj, Node):
+            i = self.positions.get(id(obj))
+            if i is None:
+                self.outside = True
+                return 'outside'
+            return i
+        return None
+
+
+class _TemplateUnpickler(pickle.Unpickler):
+
+    def __init__(self, file, nodes, external):
+        super().__init__(file)
+        self.nodes = nodes
+        self.external = external
+
+    def persistent_load(self, pid):
+        return self.nodes[pid] if pid >= 0 else self.external[-1 - pid]
+
+
+class GraphTemplate:
+    """
+    A frozen copy of a constructed (and evaluated) graph, independent of any dialog context - e.g. the graph of a DB
+    entity, shared by all the dialogues. `instantiate` adds a copy of the graph to a dialog context, without
+    constructing and evaluating it again - the same nodes (with the same ids) as the construction would give.
+
+    The graph may have external inputs (e.g. the recipient graphs of an event graph), which are not part of the
+    template - they are given again to each `instantiate`.
+    """
+
+    __slots__ = ('recipes', 'rows', 'edges', 'outputs', 'external_outputs', 'payload', 'root')
+
+    @staticmethod
+    def construct(d_context, construct, external=()):
+        """
+        Constructs a graph with `construct`, and captures its template.
+
+        :param d_context: the dialog context the graph is constructed in
+        :type d_context: DialogContext
+        :param construct: constructs (and evaluates) the graph in `d_context`, and returns its root
+        :type construct: Callable[[], Node]
+        :param external: the external inputs of the graph
+        :type external: Sequence[Node]
+        :return: the root of the graph, and its template - `None` if the graph can not be captured (e.g. it shares
+            nodes with other graphs of the context)
+        :rtype: Tuple[Node, GraphTemplate or None]
+        """
+        registered = d_context.num_registered()
+        root = construct()
+        if root is None or root.context is not d_context:
+            return root, None
+        external_ids = {id(nd) for nd in external}
+        nodes, visited, stack = [], set(), [root]
+        while stack:
+            nd = stack.pop()
+            if id(nd) in visited or id(nd) in external_ids:
+                continue
+            visited.add(id(nd))
+            nodes.append(nd)
+            stack.extend(nd.inputs.values())
+            if nd.result is not nd:
+                stack.append(nd.result)
+        # all the nodes registered by the construction, and only them
+        if len(nodes) != d_context.num_registered() - registered or \
+                any(d_context.idx_to_node.get(nd.id) is not nd for nd in nodes):
+            return root, None
+        nodes.sort(key=attrgetter('id'))
+        return root, GraphTemplate._capture(root, nodes, list(external))
+
+    @staticmethod
+    def _capture(root, nodes, external):
+        positions = {id(nd): i for i, nd in enumerate(nodes)}
+        positions.update((id(nd), -1 - j) for j, nd in enumerate(external))
+        template = object.__new__(GraphTemplate)
+        type_index, prototypes = {}, []
+        template.rows, template.edges, template.outputs, template.external_outputs = [], [], [], []
+        data, sparse, internal = [], {}, {}
+        for i, nd in enumerate(nodes):
+            tp = type_index.get(type(nd))
+            if tp is None:
+                tp = type_index[type(nd)] = len(prototypes)
+                prototypes.append(type(nd)())
+            # the flags which differ from the fresh node
+            flags = [(flag, getattr(nd, flag)) for flag in NODE_FLAGS
+                     if getattr(nd, flag) != getattr(prototypes[tp], flag)]
+            template.rows.append((tp, nd.constraint_level, flags))
+            data.append(nd.data)
+            for name, child in nd.inputs.items():
+                j = positions.get(id(child))
+                if j is None:
+                    return None
+                template.edges.append((i, name, j))
+            for name, parent in nd.outputs:
+                j = positions.get(id(parent))
+                if j is None or j < 0:
+                    return None
+                template.outputs.append((i, name, j))
+            fields = _sparse_fields(nd, prototypes[tp])
+            if fields:
+                sparse[i] = fields
+            if nd._counters is not None or type(nd).get_internal_data is not Node.get_internal_data:
+                internal[i] = nd.get_internal_data()
+        for j, nd in enumerate(external):
+            for name, parent in nd.outputs:
+                i = positions.get(id(parent))
+                if i is not None and i >= 0:
+                    template.external_outputs.append((j, name, i))
+        buffer = io.BytesIO()
+        pickler = _TemplatePickler(buffer, positions, external)
+        pickler.dump((data, sparse, internal))
+        if pickler.outside:
+            return None
+        template.recipes = [_node_recipe(prototype) for prototype in prototypes]
+        template.payload = buffer.getvalue()
+        template.root = positions[id(root)]
+        return template
+
+    def size(self):
+        return len(self.rows)
+
+    def instantiate(self, d_context, external=()):
+        """
+        Adds a copy of the graph to the dialog context.
+
+        :param d_context: the dialog context
+        :type d_context: DialogContext
+        :param external: the external inputs of the graph, in the order given to `construct`
+        :type external: Sequence[Node]
+        :return: the root of the copy
+        :rtype: Node
+        """
+        turn = d_context.get_turn_num()
+        nodes = []
+        recipes = self.recipes
+        for tp, constraint_level, flags in self.rows:
+            nd = _new_node(recipes[tp])
+            d_context.register_node(nd)
+            nd.constraint_level = constraint_level
+            nd.created_turn = turn
+            for flag, value in flags:
+                setattr(nd, flag, value)
+            nodes.append(nd)
+        for i, name, j in self.edges:
+            nodes[i].inputs[name] = nodes[j] if j >= 0 else external[-1 - j]
+        for i, name, j in self.outputs:
+            nodes[i].outputs.append((name, nodes[j]))
+        for j, name, i in self.external_outputs:
+            external[j].outputs.append((name, nodes[i]))
+
+        data, sparse, internal = _TemplateUnpickler(io.BytesIO(self.payload), nodes, external).load()
+        for nd, value in zip(nodes, data):
+            nd.data = value
+        for i, fields in sparse.items():
+            nd = nodes[i]
+            for name, value in fields.items():
+                setattr(nd, name, value)
+        for i, value in internal.items():
+            nodes[i].set_internal_data(value)
+        for nd in nodes:
+            d_context.node_changed(nd)
+        for nd in external:
+            d_context.node_changed(nd)
+        return nodes[self.root]
@@ -3,6 +3,7 @@ The main entry point to run the dataflow graphs.
 """
 import argparse
 import time
+from concurrent.futures import ThreadPoolExecutor
 from typing import List
 
 import yaml
@@ -13,10 +14,13 @@ from opendf.graph.constr_graph import construct_graph, check_constr_graph
 from opendf.graph.dialog_context import DialogContext
 from opendf.graph.eval import check_dangling_nodes, evaluate_graph
 from opendf.graph.draw_graph import draw_all_graphs
+from opendf.graph.snapshot import snapshot_context, restore_context
 from opendf.defs import *
 from opendf.utils.arg_utils import add_environment_option
+from opendf.utils.database_utils import connection_scope, threads_share_connection
 from opendf.exceptions import parse_node_exception
 from opendf.graph.transform_graph import do_transform_graph
+from opendf.parser.pexp_parser import parse_p_expressions
 from opendf.utils.simplify_exp import indent_sexp
 from opendf.utils.utils import flatten_list, to_list
 
@@ -51,7 +55,7 @@ class OpenDFDialogue:
         else:
             return [g]
 
-    def run_single_turn(self, p_exp, d_context, draw_graph, gl, do_trans=True):
+    def run_single_turn(self, p_exp, d_context, draw_graph, gl, do_trans=True, p_tree=None):
         """
         Runs a single turn of the dialogue.
 
@@ -63,10 +67,18 @@ class OpenDFDialogue:
         :type draw_graph: bool
         :param gl: the executed graph
         :type gl: Node
+        :param p_tree: the parsed P-expression (`p_exp` without the continuation mark), if already parsed
+        :type p_tree: Optional[ASTNode]
         :return: Tuple[Node, Optional[Exception], DialogContext, List[str]]
         :rtype: (1) the generated graph; (2) the exception; (3) the dialogue context;
         (4) the answers from the agent, for the current turn
         """
+        if environment_definitions.turn_database_connection:
+            with connection_scope():  # the queries of the turn reuse one database connection
+                return self._run_single_turn(p_exp, d_context, draw_graph, gl, do_trans, p_tree)
+        return self._run_single_turn(p_exp, d_context, draw_graph, gl, do_trans, p_tree)
+
+    def _run_single_turn(self, p_exp, d_context, draw_graph, gl, do_trans, p_tree):
         # 1. get user processed input (sexp format)
         isexp, cont = self.split_count_turn(p_exp)
         if environment_definitions.clear_exc_each_turn:
@@ -78,7 +90,8 @@ class OpenDFDialogue:
         #    if something went wrong (which means natural language method sent a wrong sexp) -
         #       no goal was added to the dialog (it was discarded) - user can't help resolve this
         #    if no exception, then a goal has been added to the dialog
-        ogl, ex = construct_graph(isexp, d_context, constr_tag=OUTLINE_SIMP, no_post_check=True)
+        ogl, ex = construct_graph(p_tree if p_tree is not None else isexp, d_context, constr_tag=OUTLINE_SIMP,
+                                  no_post_check=True)
 
         mgl = self._break_cont_exps(ogl)
         turn_answers = []
@@ -123,6 +136,8 @@ class OpenDFDialogue:
             d_context.set_prev_agent_turn(ex)
 
         self.turn_pos_processing(d_context)
+        if environment_definitions.profile_eval:
+            logger.info(d_context.get_eval_profile().report(top=20))
 
         if not cont:
             d_context.inc_turn_num()
@@ -133,6 +148,71 @@ class OpenDFDialogue:
             input()
         return gl, ex, d_context, turn_answers
 
+    def run_turn_batch(self, turns, do_trans=True, workers=None):
+        """
+        Runs a batch of independent turns - each one a (dialogue context, P-expression) pair. E.g. the top-k programs
+        of the NLU for the same user turn, each one run on its own copy of the dialogue context (see `copy_contexts`),
+        in order to re-rank them by their execution.
+
+        Each distinct P-expression is parsed once (the turns get copies of the parsed tree), then each turn is
+        constructed and evaluated in its own context - in parallel threads if `workers` > 1, in which case the contexts
+        must be distinct objects. The turns are not run in parallel while a database shares its single connection
+        between the threads (an in-memory SQLite database - see `threads_share_connection`). An exception raised by a
+        turn (e.g. a syntax error in its P-expression) is returned as the exception of that turn, and does not stop the
+        others. The last goal of each context is passed as the previous graph of its turn.
+
+        :param turns: the (context, P-expression) pairs
+        :type turns: List[Tuple[DialogContext, str]]
+        :param workers: number of threads; if `None`, `EnvironmentDefinition.batch_turn_workers`
+        :type workers: Optional[int]
+        :return: for each turn, in the order of `turns` - the graph, the exception, the context and the answers (as
+            returned by `run_single_turn`)
+        :rtype: List[Tuple[Optional[Node], Optional[Exception], DialogContext, List[str]]]
+        """
+        workers = workers if workers is not None else environment_definitions.batch_turn_workers
+        if workers > 1 and threads_share_connection():
+            # the turns would use (and close the scopes of) the same connection and transaction at the same time
+            logger.debug('run_turn_batch: a database connection is shared by the threads, running the turns in turn')
+            workers = 1
+        trees = {}  # { P-expression : parsed tree, or None if it is not parsed in advance }
+        for _, p_exp in turns:
+            isexp, _ = self.split_count_turn(p_exp)
+            if isexp in trees:
+                continue
+            trees[isexp] = None
+            if isexp and not isexp.startswith('$#'):  # references are resolved by construct_graph
+                try:
+                    trees[isexp] = parse_p_expressions(isexp)[0]
+                except Exception:
+                    pass  # run_single_turn will raise the error, for this turn
+
+        def run_turn(turn):
+            d_context, p_exp = turn
+            tree = trees[self.split_count_turn(p_exp)[0]]
+            try:
+                return self.run_single_turn(p_exp, d_context, False, d_context.goals[-1] if d_context.goals else None,
+                                            do_trans=do_trans, p_tree=tree.clone() if tree else None)
+            except Exception as ex:
+                return None, ex, d_context, []
+
+        if workers > 1 and len(turns) > 1:
+            with ThreadPoolExecutor(max_workers=workers, thread_name_prefix='turn') as executor:
+                return list(executor.map(run_turn, turns))
+        return [run_turn(turn) for turn in turns]
+
+    @staticmethod
+    def copy_contexts(d_context, n):
+        """
+        Makes `n` independent copies of the dialogue context (e.g. one per NLU hypothesis, for `run_turn_batch`). The
+        context is serialized once (see `snapshot_context`), and restored `n` times - which is much faster than
+        `make_copy_with_pack` for each copy.
+
+        :return: the copies
+        :rtype: List[DialogContext]
+        """
+        snapshot = snapshot_context(d_context, compress=False)
+        return [restore_context(snapshot, d_context.new_instance()) for _ in range(n)]
+
     def run_dialogue(self, p_expressions: List[str], d_context: DialogContext, draw_graph=True, do_trans=True):
         """
         This main function gets P-exps as input, and executes them one by one.
@@ -9,7 +9,8 @@ import time
 
 import yaml
 
-from opendf.applications import MultiWOZContext, MultiWOZEnvironment_2_2
+from opendf.applications import MultiWOZEnvironment_2_2
+from opendf.applications.multiwoz_2_2.domain import MultiWOZContext
 from opendf.applications.multiwoz_2_2.conversion import convert_dialogue, normalize_time, \
     ConversionErrorMultiWOZ_2_2, get_related_dict
 from opendf.applications.multiwoz_2_2.nodes.multiwoz import collect_last_state
@@ -401,27 +401,27 @@ def modify_pop_event(ev, fields):
     for i in fields:
         if i=='subject':
             n = ev.input_view(i)
-            n.data = fields[i]
+            n.set_data(fields[i])
         elif i=='date':    # TODO - distinguish start / end
             yr, mn, dy, wd = fields[i]
             n = ev.get_ext_view('slot.start.date')
             if yr is not None:
-                n.input_view('year').data = yr
+                n.input_view('year').set_data(yr)
             if mn is not None:
-                n.input_view('month').data = mn
+                n.input_view('month').set_data(mn)
             if dy is not None:
-                n.input_view('day').data = dy
+                n.input_view('day').set_data(dy)
             if wd is not None:
-                n.input_view('dow').data = wd
+                n.input_view('dow').set_data(wd)
         elif i=='time':    # TODO - distinguish start / end
             hr, mt, mr = fields[i]
             n = ev.get_ext_view('slot.start.time')
             if n:
                 hr = None if hr is None else hr if mr is None else 12+hr%12 if 'p' in mr.lower() else hr%12
                 if hr is not None:
-                    n.input_view('hour').data = hr
+                    n.input_view('hour').set_data(hr)
                 if mt is not None:
-                    n.input_view('minute').data = mt
+                    n.input_view('minute').set_data(mt)
         elif i=='attendees':
             for f,l in fields[i]:
                 try:
@@ -1,7 +1,12 @@
 """
 Parser for P-expressions.
 """
+import logging
+import os
 import re
+import string
+import threading
+from collections import OrderedDict
 
 # noinspection PyUnresolvedReferences
 from typing import List, Optional, Any, Tuple, Dict
@@ -13,8 +18,16 @@ import ply.lex as lex
 import ply.yacc as yacc
 
 # IDENTIFIER_EXPRESSION = r"[:a-zA-Z0-9_-][^\=,\(\)\<\>\{\}\#\$]*"
+from opendf.defs import EnvironmentDefinition
 from opendf.exceptions.python_exception import LexerException, ParserException, UnfinishedParserException
 
+logger = logging.getLogger(__name__)
+
+environment_definitions = EnvironmentDefinition.get_instance()
+
+# the parser tables shipped with the package - regenerate them with `write_parser_tables`, after changing the grammar
+PARSER_TABLES_MODULE = "opendf.parser.pexp_parsetab"
+
 IDENTIFIER_EXPRESSION = r"[;:a-zA-Z0-9_\-\+\#][^\=,\(\)]*"
 # IDENTIFIER_EXPRESSION = r"[:a-zA-Z0-9_-][^\=,\(\)]*"
 IDENTIFIER_REGEX = re.compile(IDENTIFIER_EXPRESSION)
@@ -113,6 +126,22 @@ def escape_string(string, quote_mark="\""):
     return "".join(result)
 
 
+def terminal_value(value):
+    """
+    Returns the value of the terminal node which `escape_string(value)` is parsed into - i.e. the value a P-expression
+    built from `value` would give, without the P-expression.
+
+    :param value: the value
+    :type value: Any
+    :return: the terminal value
+    :rtype: str
+    """
+    string = escape_string(str(value))
+    if string[0] in "\"'" and QUOTED_STRING_REGEX.fullmatch(string):
+        return string[1:-1]
+    return SPACES_REGEX.sub(" ", string.strip())
+
+
 class ASTNode:
     """
     Represents a P-expression node of the Abstract Syntax Tree (AST)
@@ -182,6 +211,38 @@ class ASTNode:
         self.is_terminal = is_terminal
         self.is_assign = is_assign
 
+    def clone(self, values=None):
+        """
+        Creates a copy of the tree rooted at this node. The copy has no parent.
+
+        :param values: if given, nodes whose name is a key of `values` get the corresponding value - a string replaces
+        the name of the node, an `ASTNode` replaces the node itself (see `PExpTemplate`)
+        :type values: Dict[str, Any] or None
+        :return: the copy
+        :rtype: ASTNode
+        """
+        node = ASTNode.__new__(ASTNode)
+        node.name = self.name
+        node.inputs = []
+        for i_name, i_value in self.inputs:
+            if values and i_value.name in values and isinstance(values[i_value.name], ASTNode):
+                value = values[i_value.name].clone()
+            else:
+                value = i_value.clone(values)
+            value.parent = node
+            value.role = i_name
+            node.inputs.append((i_name, value))
+        node.tags = [(t_name, values.get(t_value, t_value) if values else t_value) for t_name, t_value in self.tags]
+        node.parent = None
+        node.role = None
+        node.set_assign = self.set_assign
+        node.special_features = self.special_features
+        node.is_terminal = self.is_terminal
+        node.is_assign = self.is_assign
+        if values and isinstance(values.get(self.name), str):
+            node.name = values[self.name]
+        return node
+
     def __repr__(self):
         if self.is_assign:
             try:
@@ -325,11 +386,23 @@ class PExpLexer:
 
     t_ignore = " \t\n"
 
-    def __init__(self, **kwargs):
+    def __init__(self, lexer=None, **kwargs):
         """
         Creates a P-expression lexer.
+
+        :param lexer: if given, the PLY lexer to use, instead of building a new one
+        :type lexer: lex.Lexer or None
+        """
+        self.lexer = lexer if lexer is not None else lex.lex(module=self, **kwargs)
+
+    def clone(self):
         """
-        self.lexer = lex.lex(module=self, **kwargs)
+        Creates a lexer which shares the (compiled) rules of this lexer, but has its own input state.
+
+        :return: the new lexer
+        :rtype: PExpLexer
+        """
+        return PExpLexer(self.lexer.clone())
 
     def input(self, data):
         return self.lexer.input(data)
@@ -390,16 +463,29 @@ class PExpParser:
     Parser for P-expressions.
     """
 
-    def __init__(self, lexer, **kwargs):
+    def __init__(self, lexer, tables=None, **kwargs):
         """
         Creates a P-expression parser.
 
+        The parser keeps the state of the current parse, so it must not be used by more than one thread at a time (see
+        `get_parser`).
+
         :param lexer: the P-expression lexer
         :type lexer: PExpLexer
+        :param tables: if given, the (read-only) LR tables to use, instead of calling `yacc.yacc`
+        :type tables: yacc.LRTable or None
         """
         self.lexer = lexer
         self.tokens = lexer.tokens
-        self.parser = yacc.yacc(module=self, **kwargs)
+        if tables is None:
+            self.parser = yacc.yacc(module=self, **kwargs)
+            tables = yacc.LRTable()
+            tables.lr_action = self.parser.action
+            tables.lr_goto = self.parser.goto
+            tables.lr_productions = self.parser.productions
+        else:
+            self.parser = self._bind_tables(tables)
+        self.tables = tables
 
         self.parsed_trees: List[ASTNode] = []
 
@@ -424,6 +510,25 @@ class PExpParser:
 
         return value
 
+    def _bind_tables(self, tables):
+        # the action/goto tables are shared; the productions are copied, since they are bound to the methods of self
+        lr = yacc.LRTable()
+        lr.lr_action = tables.lr_action
+        lr.lr_goto = tables.lr_goto
+        lr.lr_productions = [yacc.MiniProduction(p.str, p.name, p.len, p.func, p.file, p.line)
+                             for p in tables.lr_productions]
+        lr.bind_callables({p.func: getattr(self, p.func) for p in lr.lr_productions if p.func})
+        return yacc.LRParser(lr, self.p_error)
+
+    def clone(self):
+        """
+        Creates a parser (with its own lexer) which reuses the tables of this parser.
+
+        :return: the new parser
+        :rtype: PExpParser
+        """
+        return PExpParser(self.lexer.clone(), tables=self.tables)
+
     def p_program_single(self, p):
         """program : value"""
         self.parsed_trees.append(p[1])
@@ -533,22 +638,78 @@ class PExpParser:
         # TODO: add an exception for unbalanced parentheses
 
 
-lexer = PExpLexer()
-parser = PExpParser(lexer)
+def load_parser_tables():
+    """
+    Loads the parser tables shipped with the package (`PARSER_TABLES_MODULE`), without checking the grammar.
+
+    :return: the tables, or `None` if they are missing or were written by another version of PLY
+    :rtype: yacc.LRTable or None
+    """
+    tables = yacc.LRTable()
+    try:
+        tables.read_table(PARSER_TABLES_MODULE)
+    except (ImportError, yacc.VersionError) as e:
+        logger.warning("Could not load the P-expression parser tables (%s), generating them", e)
+        return None
+    return tables
+
+
+def write_parser_tables(output_dir=os.path.dirname(__file__)):
+    """
+    Generates the parser tables from the grammar of `PExpParser`, and writes them as the module `PARSER_TABLES_MODULE`.
+
+    :param output_dir: the directory of the module
+    :type output_dir: str
+    """
+    PExpParser(PExpLexer(), tabmodule=PARSER_TABLES_MODULE.rsplit(".", 1)[-1], outputdir=output_dir, debug=False)
+
+
+def create_parser():
+    """
+    Creates a P-expression parser (and lexer). If `EnvironmentDefinition.precomputed_parser_tables` is set, the parser
+    tables shipped with the package are used; otherwise (or if they can't be loaded), `yacc.yacc` generates the tables
+    from the grammar - writing `parsetab.py` and `parser.out` next to this module.
+
+    :return: the parser
+    :rtype: PExpParser
+    """
+    tables = load_parser_tables() if environment_definitions.precomputed_parser_tables else None
+    return PExpParser(PExpLexer(), tables=tables)
+
+
+parser = create_parser()
+lexer = parser.lexer
+
+_thread_parsers = threading.local()
+_thread_parsers.parser = parser  # the thread which imports this module uses `parser`
+
+
+def get_parser():
+    """
+    Returns the P-expression parser of the current thread - created on first use, reusing the tables of `parser`.
+
+    :return: the parser
+    :rtype: PExpParser
+    """
+    thread_parser = getattr(_thread_parsers, 'parser', None)
+    if thread_parser is None:
+        thread_parser = _thread_parsers.parser = parser.clone()
+    return thread_parser
 
 
-def tokenize_p_expressions(expressions, with_lexer=lexer):
+def tokenize_p_expressions(expressions, with_lexer=None):
     """
     Tokenizes the P-expression in `expressions`.
 
     :param expressions: the P-expressions
     :type expressions: str
-    :param with_lexer: the lexer object to use
-    :type with_lexer: PExpLexer
+    :param with_lexer: the lexer object to use; if `None`, the lexer of the current thread's parser
+    :type with_lexer: PExpLexer or None
     :return: the list of tokens
     :rtype: List[Token]
     """
-
+    if with_lexer is None:
+        with_lexer = get_parser().lexer
     with_lexer.input(expressions)
     tokens = []
     token = with_lexer.token()
@@ -559,14 +720,135 @@ def tokenize_p_expressions(expressions, with_lexer=lexer):
     return tokens
 
 
-def parse_p_expressions(expressions):
+class ASTCache:
+    """
+    LRU cache of parsed P-expressions - { P-expression string : parsed trees }.
+
+    The cached trees are never handed out - callers get copies, since the construction of the graph modifies the
+    trees. Copying a tree is much cheaper than parsing its string. The cache may be shared by several threads.
+    """
+
+    def __init__(self, max_size=4096):
+        self.max_size = max_size
+        self.trees: Dict[str, List[ASTNode]] = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.lock = threading.Lock()
+
+    def parse(self, expressions):
+        """
+        Parses the `expressions`, using the cached trees if `expressions` was already parsed.
+
+        :param expressions: the P-expressions
+        :type expressions: str
+        :return: the parsed expressions
+        :rtype: List[ASTNode]
+        """
+        with self.lock:
+            trees = self.trees.get(expressions)
+            if trees is not None:
+                self.hits += 1
+                self.trees.move_to_end(expressions)
+            else:
+                self.misses += 1
+        if trees is not None:
+            return [t.clone() for t in trees]  # the cached trees are never modified, so no need to lock
+        trees = get_parser().parse(expressions)
+        if self.max_size > 0:
+            cached = [t.clone() for t in trees]
+            with self.lock:
+                self.trees[expressions] = cached
+                while len(self.trees) > self.max_size:
+                    self.trees.popitem(last=False)
+        return trees
+
+    def hit_rate(self):
+        total = self.hits + self.misses
+        return self.hits / total if total else 0.0
+
+    def info(self):
+        return {'hits': self.hits, 'misses': self.misses, 'hit_rate': self.hit_rate(), 'size': len(self.trees),
+                'max_size': self.max_size}
+
+    def clear(self):
+        with self.lock:
+            self.trees.clear()
+            self.hits = 0
+            self.misses = 0
+
+
+ast_cache = ASTCache(environment_definitions.pexp_cache_size)
+
+
+def parse_p_expressions(expressions, use_cache=True):
     """
     Parses the P-expression in `expressions`.
 
     :param expressions: the P-expressions
     :type expressions: str
+    :param use_cache: if `True`, use the cache of parsed expressions (`ast_cache`), if enabled (see
+    `EnvironmentDefinition.pexp_cache_size`)
+    :type use_cache: bool
     :return: the parsed expressions
     :rtype: List[ASTNode]
     """
+    if use_cache and environment_definitions.pexp_cache_size > 0:
+        ast_cache.max_size = environment_definitions.pexp_cache_size
+        return ast_cache.parse(expressions)
+
+    return get_parser().parse(expressions)
+
+
+def node_reference(identifier):
+    """
+    Creates a reference to an existing node of the dialog context (like `$#17` or `$name`) - e.g. to be bound to a
+    `PExpTemplate` parameter.
+
+    :param identifier: the id (or assigned name) of the node
+    :type identifier: int or str
+    :return: the reference
+    :rtype: ASTNode
+    """
+    return ASTNode(str(identifier), is_assign=True)
+
+
+class PExpTemplate:
+    """
+    A P-expression with parameters, which is parsed once - e.g.
+    `PExpTemplate("Attendee(recipient={recipient}, response={response})")`. The parameters are written as in
+    `str.format` (so literal curly brackets - e.g. `{name}` assign names - have to be doubled).
 
-    return parser.parse(expressions)
+    Binding values to the parameters (`bind`) creates a copy of the parsed trees, without lexing/parsing again. The
+    value of a parameter is used as is (no escaping needed) as the name of the node in its place; alternatively, the
+    value may be an `ASTNode` (e.g. a `node_reference`), which replaces the node in its place.
+    """
+
+    def __init__(self, template):
+        """
+        :param template: the P-expression with the parameters
+        :type template: str
+        """
+        self.template = template
+        self.params = {}  # { placeholder : parameter name }
+        placeholders = {}
+        for _, field, _, _ in string.Formatter().parse(template):
+            if field is not None and field not in placeholders:
+                placeholders[field] = '__param_%d__' % len(placeholders)
+                self.params[placeholders[field]] = field
+        self.trees = get_parser().parse(template.format(**placeholders))
+
+    def bind(self, **values):
+        """
+        Creates the parsed P-expressions, with the given values of the parameters.
+
+        :return: the parsed expressions
+        :rtype: List[ASTNode]
+        """
+        bound = {}
+        for placeholder, field in self.params.items():
+            value = values[field]
+            bound[placeholder] = value if isinstance(value, ASTNode) else str(value)
+        return [t.clone(bound) for t in self.trees]
+
+    def __repr__(self):
+        return '%s(%s)' % (type(self).__name__, self.template)
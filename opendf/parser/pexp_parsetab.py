@@ -0,0 +1,51 @@
+
+# pexp_parsetab.py
+# This file is automatically generated. Do not edit.
+# pylint: disable=W,C,R
+_tabversion = '3.10'
+
+_lr_method = 'LALR'
+
+_lr_signature = 'ASSIGN_NAME ASSIGN_NODE ASSIGN_NODE_NUMBER CLOSE_ARGUMENTS DECLARE_ASSIGN_NAME IDENTIFIER ITEM_SEPARATOR NAME_VALUE_SEPARATOR OPEN_ARGUMENTS QUOTED_STRING SPECIAL_FEATURE TAG_CHARprogram : valueprogram : program valueparameters : parameterparameters : parameters ITEM_SEPARATOR parameterparameter :parameter : tag_parameter\n                     | simple_parametersimple_parameter : valuenamed_parameter : name simple_parameter : named_parameter NAME_VALUE_SEPARATOR valuetag_parameter : TAG_CHAR simple_parametername : IDENTIFIERvalue : ASSIGN_NAMEvalue : ASSIGN_NODE_NUMBERvalue : DECLARE_ASSIGN_NAME valuevalue : SPECIAL_FEATURE valuevalue : expressionnode_name : IDENTIFIERexpression : node_name OPEN_ARGUMENTS parameters CLOSE_ARGUMENTSvalue : IDENTIFIERvalue : QUOTED_STRING'
+    
+_lr_action_items = {'ASSIGN_NAME':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[3,3,-1,-13,-14,3,3,-17,-20,-21,-2,-15,-16,3,3,-19,3,3,]),'ASSIGN_NODE_NUMBER':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[4,4,-1,-13,-14,4,4,-17,-20,-21,-2,-15,-16,4,4,-19,4,4,]),'DECLARE_ASSIGN_NAME':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[5,5,-1,-13,-14,5,5,-17,-20,-21,-2,-15,-16,5,5,-19,5,5,]),'SPECIAL_FEATURE':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[6,6,-1,-13,-14,6,6,-17,-20,-21,-2,-15,-16,6,6,-19,6,6,]),'IDENTIFIER':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[8,8,-1,-13,-14,8,8,-17,-20,-21,-2,-15,-16,22,22,-19,22,8,]),'QUOTED_STRING':([0,1,2,3,4,5,6,7,8,9,11,12,13,14,19,24,25,27,],[9,9,-1,-13,-14,9,9,-17,-20,-21,-2,-15,-16,9,9,-19,9,9,]),'$end':([1,2,3,4,7,8,9,11,12,13,24,],[0,-1,-13,-14,-17,-20,-21,-2,-15,-16,-19,]),'CLOSE_ARGUMENTS':([3,4,7,8,9,12,13,14,15,16,17,18,20,22,24,25,26,28,29,],[-13,-14,-17,-20,-21,-15,-16,-5,24,-3,-6,-7,-8,-20,-19,-5,-11,-4,-10,]),'ITEM_SEPARATOR':([3,4,7,8,9,12,13,14,15,16,17,18,20,22,24,25,26,28,29,],[-13,-14,-17,-20,-21,-15,-16,-5,25,-3,-6,-7,-8,-20,-19,-5,-11,-4,-10,]),'OPEN_ARGUMENTS':([8,10,22,],[-18,14,-18,]),'TAG_CHAR':([14,25,],[19,19,]),'NAME_VALUE_SEPARATOR':([21,22,23,],[27,-12,-9,]),}
+
+_lr_action = {}
+for _k, _v in _lr_action_items.items():
+   for _x,_y in zip(_v[0],_v[1]):
+      if not _x in _lr_action:  _lr_action[_x] = {}
+      _lr_action[_x][_k] = _y
+del _lr_action_items
+
+_lr_goto_items = {'program':([0,],[1,]),'value':([0,1,5,6,14,19,25,27,],[2,11,12,13,20,20,20,29,]),'expression':([0,1,5,6,14,19,25,27,],[7,7,7,7,7,7,7,7,]),'node_name':([0,1,5,6,14,19,25,27,],[10,10,10,10,10,10,10,10,]),'parameters':([14,],[15,]),'parameter':([14,25,],[16,28,]),'tag_parameter':([14,25,],[17,17,]),'simple_parameter':([14,19,25,],[18,26,18,]),'named_parameter':([14,19,25,],[21,21,21,]),'name':([14,19,25,],[23,23,23,]),}
+
+_lr_goto = {}
+for _k, _v in _lr_goto_items.items():
+   for _x, _y in zip(_v[0], _v[1]):
+       if not _x in _lr_goto: _lr_goto[_x] = {}
+       _lr_goto[_x][_k] = _y
+del _lr_goto_items
+_lr_productions = [
+  ("S' -> program","S'",1,None,None,None),
+  ('program -> value','program',1,'p_program_single','pexp_parser.py',533),
+  ('program -> program value','program',2,'p_program_multiple','pexp_parser.py',537),
+  ('parameters -> parameter','parameters',1,'p_parameters_single','pexp_parser.py',541),
+  ('parameters -> parameters ITEM_SEPARATOR parameter','parameters',3,'p_parameters_many','pexp_parser.py',547),
+  ('parameter -> <empty>','parameter',0,'p_parameter_empty','pexp_parser.py',552),
+  ('parameter -> tag_parameter','parameter',1,'p_parameter_simple','pexp_parser.py',556),
+  ('parameter -> simple_parameter','parameter',1,'p_parameter_simple','pexp_parser.py',557),
+  ('simple_parameter -> value','simple_parameter',1,'p_parameter_value','pexp_parser.py',561),
+  ('named_parameter -> name','named_parameter',1,'p_named_parameter','pexp_parser.py',565),
+  ('simple_parameter -> named_parameter NAME_VALUE_SEPARATOR value','simple_parameter',3,'p_parameter_name_value','pexp_parser.py',570),
+  ('tag_parameter -> TAG_CHAR simple_parameter','tag_parameter',2,'p_tag_parameter','pexp_parser.py',574),
+  ('name -> IDENTIFIER','name',1,'p_name','pexp_parser.py',581),
+  ('value -> ASSIGN_NAME','value',1,'p_value_by_name_reference','pexp_parser.py',585),
+  ('value -> ASSIGN_NODE_NUMBER','value',1,'p_value_by_number_reference','pexp_parser.py',589),
+  ('value -> DECLARE_ASSIGN_NAME value','value',2,'p_value_with_name','pexp_parser.py',593),
+  ('value -> SPECIAL_FEATURE value','value',2,'p_value_with_feature','pexp_parser.py',599),
+  ('value -> expression','value',1,'p_value_non_terminal','pexp_parser.py',605),
+  ('node_name -> IDENTIFIER','node_name',1,'p_node_name','pexp_parser.py',609),
+  ('expression -> node_name OPEN_ARGUMENTS parameters CLOSE_ARGUMENTS','expression',4,'p_expression','pexp_parser.py',614),
+  ('value -> IDENTIFIER','value',1,'p_value_terminal_identifier','pexp_parser.py',624),
+  ('value -> QUOTED_STRING','value',1,'p_value_terminal_quote','pexp_parser.py',630),
+]
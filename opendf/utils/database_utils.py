@@ -1,14 +1,22 @@
 """
 Useful function to deal with the database.
 """
+import threading
+import time
+import weakref
 from abc import ABC, abstractmethod
+from collections import OrderedDict
+from contextlib import contextmanager
 from enum import Enum
-from typing import Dict
+from typing import Any, Dict, Tuple
 
 import sqlalchemy
-from sqlalchemy import func, cast, Integer, String, Interval, Time, Date, DateTime
+from sqlalchemy import func, cast, create_engine, Integer, String, Interval, Time, Date, DateTime
+from sqlalchemy.ext.compiler import compiles
+from sqlalchemy.pool import StaticPool
+from sqlalchemy.sql.expression import Executable, ClauseElement
 
-from opendf.defs import database_connection
+from opendf.defs import database_connection, database_log, database_future, EnvironmentDefinition
 
 
 class DatabaseSystem(Enum):
@@ -323,3 +331,355 @@ def get_database_handler():
         handler = database_handlers[DatabaseSystem.SQLITE]
 
     return handler
+
+
+def create_database_engine(connection_string):
+    """
+    Creates the engine of the database.
+
+    An in-memory SQLite database exists only in its connection, so its engine keeps a single connection - otherwise
+    each connection would get a new, empty, database. The connection (and its transaction) is then shared by all the
+    threads, which must not use it at the same time: `OpenDFDialogue.run_turn_batch` runs its turns one after the other
+    while such an engine exists (see `threads_share_connection`). The pool of the other databases is configured by
+    `EnvironmentDefinition` (`database_pool_size`, `database_max_overflow`, `database_pool_pre_ping`).
+
+    :param connection_string: the database connection string
+    :type connection_string: str
+    :return: the engine
+    :rtype: sqlalchemy.engine.base.Engine
+    """
+    environment_definitions = EnvironmentDefinition.get_instance()
+    options = {}
+    if connection_string.startswith(DatabaseSystem.SQLITE.value):
+        if ':memory:' in connection_string or connection_string.endswith('://'):
+            options = {'poolclass': StaticPool, 'connect_args': {'check_same_thread': False}}
+    else:
+        # (the pool of a SQLite file does not take a size - see sqlalchemy.dialects.sqlite)
+        options = {'pool_size': environment_definitions.database_pool_size,
+                   'max_overflow': environment_definitions.database_max_overflow}
+    engine = create_engine(connection_string, echo=database_log, future=database_future,
+                           pool_pre_ping=environment_definitions.database_pool_pre_ping, **options)
+    if options.get('poolclass') is StaticPool:
+        _shared_connection_engines.add(engine)
+    return engine
+
+
+_shared_connection_engines = weakref.WeakSet()  # the engines whose single connection is shared by all the threads
+
+
+def threads_share_connection():
+    """
+    Checks if a database engine shares its single connection between the threads (an in-memory SQLite database - see
+    `create_database_engine`), in which case the threads can't use the databases in parallel.
+
+    :return: `True` if such an engine exists
+    :rtype: bool
+    """
+    return len(_shared_connection_engines) > 0
+
+
+_connection_scope = threading.local()
+
+
+@contextmanager
+def connection_scope():
+    """
+    Within the scope, the storage layers reuse one connection (and transaction) per engine - see `scoped_connection` -
+    instead of checking out a connection from the pool for each query. The connections are opened on first use, and
+    closed at the end of the scope (which rolls back what was not committed, as closing the connection of each query
+    did).
+
+    The scope is per thread (except for the engines which have a single connection - see `create_database_engine`); a
+    nested scope uses the connections of the outer one.
+    """
+    if getattr(_connection_scope, 'connections', None) is not None:
+        yield
+        return
+    connections = _connection_scope.connections = {}
+    try:
+        yield
+    finally:
+        _connection_scope.connections = None
+        for connection in connections.values():
+            connection.close()
+
+
+def current_connection_scope():
+    """
+    Gets an object which identifies the current `connection_scope` of the thread - the same object during the whole
+    scope (e.g. to do something once per turn).
+
+    :return: the object, or `None` outside of a scope
+    :rtype: Any
+    """
+    return getattr(_connection_scope, 'connections', None)
+
+
+@contextmanager
+def scoped_connection(engine):
+    """
+    Gets a connection of `engine`: the connection of the current `connection_scope`, if any; otherwise, a new connection
+    (closed on exit).
+
+    :param engine: the engine
+    :type engine: sqlalchemy.engine.base.Engine
+    :return: the connection
+    :rtype: sqlalchemy.engine.base.Connection
+    """
+    connections = getattr(_connection_scope, 'connections', None)
+    if connections is None:
+        with engine.connect() as connection:
+            yield connection
+        return
+    connection = connections.get(engine)
+    if connection is None:
+        connection = connections[engine] = engine.connect()
+    try:
+        yield connection
+    except Exception:
+        # the transaction is not usable after an error (in Postgres), and the callers may go on with other queries
+        connection.rollback()
+        raise
+
+
+class EntityCache:
+    """
+    The entities of a database (e.g. events and recipients), shared by all the dialogues of the process - keyed by
+    (entity kind, identifier). Each entity holds context-independent parts - its entry (e.g. `EventEntry`), the
+    template of its graph (see `GraphTemplate`)... The least recently used entities are evicted beyond `size`.
+
+    `invalidate` drops an entity (or all the entities of a kind) when its data changes, and changes its stamp - the
+    graphs of the entity which were already added to a dialog context (see `get_context_graph`) are not used anymore.
+
+    The cache belongs to the process: it sees the changes made through it (`invalidate`), but not the changes made by
+    other processes using the same database. If the data may be changed by other processes, the owner of the cache
+    calls `sync` with the version of the data (e.g. read from the database) before using the cache, and the cache is
+    cleared when the version changed. `ttl` (opt-in) bounds the time an entity (or a graph of a context) is used before
+    it is read again. The stamps and the graphs of the contexts are valid only in the process - they are not kept by
+    the snapshots of the contexts.
+
+    The cache is thread safe.
+    """
+
+    def __init__(self, size=None, ttl=None):
+        """
+        :param size: the maximum number of entities; if `None`, `entity_cache_size` of the environment definition
+        :type size: int or None
+        :param ttl: the number of seconds an entity is used after it was put in the cache; if `None`, until it is
+            evicted or invalidated
+        :type ttl: float or None
+        """
+        self.size = EnvironmentDefinition.get_instance().entity_cache_size if size is None else size
+        self.ttl = ttl
+        self._entities = OrderedDict()  # { (kind, identifier) : { part : (time, value) } }
+        self._epoch = 0  # incremented by clear()
+        self._version = None  # the version of the data of the cached entities - see sync()
+        self._kind_generations: Dict[str, int] = {}  # incremented by invalidate(kind)
+        self._generations: Dict[Tuple[str, Any], int] = {}  # incremented by invalidate(kind, identifier)
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+
+    def stamp(self, kind, identifier):
+        """
+        Gets the stamp of the entity - it changes when the entity is invalidated.
+
+        :return: the stamp
+        :rtype: Tuple[int, int, int]
+        """
+        return self._epoch, self._kind_generations.get(kind, 0), self._generations.get((kind, identifier), 0)
+
+    def get(self, kind, identifier, part='entry'):
+        """
+        Gets a part of a cached entity.
+
+        :return: the part, or `None` if it is not in the cache
+        :rtype: Any
+        """
+        key = (kind, identifier)
+        with self._lock:
+            parts = self._entities.get(key)
+            timed = parts.get(part) if parts is not None else None
+            if timed is None or self._expired(timed[0]):
+                self.misses += 1
+                return None
+            self._entities.move_to_end(key)
+            self.hits += 1
+            return timed[1]
+
+    def put(self, kind, identifier, value, part='entry', stamp=None):
+        """
+        Puts a part of an entity in the cache.
+
+        :param stamp: the stamp of the entity (see `stamp`) before the value was read from the database; the value is
+            not stored if the entity was invalidated since
+        :type stamp: Tuple[int, int, int] or None
+        """
+        if self.size <= 0:
+            return
+        key = (kind, identifier)
+        with self._lock:
+            if stamp is not None and stamp != self.stamp(kind, identifier):
+                return
+            parts = self._entities.get(key)
+            if parts is None:
+                parts = self._entities[key] = {}
+            else:
+                self._entities.move_to_end(key)
+            parts[part] = (time.monotonic(), value)
+            while len(self._entities) > self.size:
+                self._entities.popitem(last=False)
+                self.evictions += 1
+
+    def invalidate(self, kind, identifier=None):
+        """
+        Drops the entity `identifier` of `kind` from the cache, or all the entities of `kind` (if `identifier` is
+        `None`).
+        """
+        with self._lock:
+            if identifier is None:
+                self._kind_generations[kind] = self._kind_generations.get(kind, 0) + 1
+                for key in [k for k in self._entities if k[0] == kind]:
+                    del self._entities[key]
+            else:
+                key = (kind, identifier)
+                self._generations[key] = self._generations.get(key, 0) + 1
+                self._entities.pop(key, None)
+
+    def clear(self):
+        with self._lock:
+            self._clear()
+
+    def _clear(self):
+        self._epoch += 1
+        self._entities.clear()
+        self._generations.clear()
+
+    def sync(self, version):
+        """
+        Clears the cache if the version of the data changed since the previous call - i.e. the data was changed, maybe
+        by another process. The version must change on every change of the data (e.g. `Database.get_data_version`).
+        """
+        with self._lock:
+            if version != self._version:
+                self._clear()
+                self._version = version
+
+    def __len__(self):
+        return len(self._entities)
+
+    def _expired(self, put_time):
+        return self.ttl is not None and time.monotonic() - put_time > self.ttl
+
+    def get_context_graph(self, d_context, kind, identifier):
+        """
+        Gets the graph of the entity which was added to the dialog context by `set_context_graph`, if the entity was
+        not invalidated since, and the graph is not older than `ttl`.
+
+        :return: the graph, or `None`
+        :rtype: Node or None
+        """
+        cached = d_context.db_graphs.get((kind, identifier))
+        if cached is None:
+            return None
+        stamp, put_time, graph = cached
+        if stamp != self.stamp(kind, identifier) or self._expired(put_time) or graph.context is not d_context:
+            return None
+        return graph
+
+    def set_context_graph(self, d_context, kind, identifier, graph, stamp=None):
+        d_context.db_graphs[(kind, identifier)] = (self.stamp(kind, identifier) if stamp is None else stamp,
+                                                   time.monotonic(), graph)
+
+    def graph(self, d_context, kind, identifier, construct, external=()):
+        """
+        Gets a new graph of the entity in the dialog context: an instance of the template of the entity, if it is in the
+        cache; otherwise, the graph constructed by `construct`, whose template is added to the cache.
+
+        Templates are not used when the terminal nodes of the DB graphs are shared (`intern_leaf_nodes`) - each graph
+        then depends on the graphs constructed before it.
+
+        :param construct: constructs (and evaluates) the graph in `d_context`, and returns its root
+        :type construct: Callable[[], Node]
+        :param external: the external inputs of the graph (see `GraphTemplate`), e.g. the recipient graphs of an event
+        :type external: Sequence[Node]
+        :return: the root of the graph
+        :rtype: Node
+        """
+        if self.size <= 0 or EnvironmentDefinition.get_instance().intern_leaf_nodes:
+            return construct()
+        from opendf.graph.snapshot import GraphTemplate
+        template = self.get(kind, identifier, 'template')
+        if template is not None:
+            return template.instantiate(d_context, external)
+        stamp = self.stamp(kind, identifier)
+        graph, template = GraphTemplate.construct(d_context, construct, external)
+        if template is not None:
+            self.put(kind, identifier, template, 'template', stamp)
+        return graph
+
+
+def _explain_prefix(dialect):
+    return "EXPLAIN QUERY PLAN " if dialect.name == DatabaseSystem.SQLITE.value else "EXPLAIN "
+
+
+class Explain(Executable, ClauseElement):
+    """
+    The query plan of a statement: `EXPLAIN QUERY PLAN` in SQLite, `EXPLAIN` in the other systems (e.g. Postgres).
+    """
+
+    inherit_cache = False
+
+    def __init__(self, statement):
+        self.statement = statement
+
+
+@compiles(Explain)
+def _compile_explain(element, compiler, **kwargs):
+    return _explain_prefix(compiler.dialect) + compiler.process(element.statement, **kwargs)
+
+
+def explain_query_plan(connection, statement, parameters=None):
+    """
+    Gets the query plan of `statement`.
+
+    :param connection: the database connection
+    :type connection: sqlalchemy.engine.base.Connection
+    :param statement: the query, or the SQL string of the query (as sent to the database driver)
+    :type statement: Any or str
+    :param parameters: the parameters of the SQL string, if `statement` is a string
+    :type parameters: Optional[Any]
+    :return: the lines of the plan
+    :rtype: List[str]
+    """
+    if isinstance(statement, str):
+        rows = connection.exec_driver_sql(_explain_prefix(connection.dialect) + statement, parameters or ())
+    else:
+        rows = connection.execute(Explain(statement))
+    return [str(row[-1]) for row in rows]
+
+
+def find_full_scans(plan, tables=None):
+    """
+    Finds the steps of a query plan (see `explain_query_plan`) which scan a whole table, or a whole index.
+
+    :param plan: the lines of the plan
+    :type plan: List[str]
+    :param tables: if given, only the scans of these tables are reported (and not, e.g., of materialized subqueries)
+    :type tables: Optional[Collection[str]]
+    :return: the full scans
+    :rtype: List[str]
+    """
+    scans = []
+    for line in plan:
+        line = line.strip().lstrip("->").strip()
+        if line.startswith("SCAN "):  # SQLite
+            name = line[len("SCAN "):].split(" ")[0]
+        elif line.startswith("Seq Scan on "):  # Postgres
+            name = line[len("Seq Scan on "):].split(" ")[0]
+        else:
+            continue
+        if name != "CONSTANT" and not name.startswith("(") and (tables is None or name in tables):
+            scans.append(line)
+    return scans
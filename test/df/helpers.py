@@ -0,0 +1,251 @@
+"""
+Helpers shared by the tests.
+"""
+import random
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import select
+
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import get_system_date, posname
+from opendf.graph.nodes.node import Node
+from opendf.main import OpenDFDialogue
+from opendf.utils.database_utils import explain_query_plan, find_full_scans
+
+# turns of the SMCalFlow application, on the stub database
+SAMPLE_TURNS = ['FindEvents(Event?(subject=LIKE(Str(meeting))))', 'refer(Event?())',
+                'CreateEvent(AND(has_subject(Str(party)), starts_at(Tomorrow())))']
+
+# constraints on the events of the SMCalFlow stub database, for the matching tests and benchmarks
+EVENT_CONSTRAINTS = [
+    'Event?()',
+    'Event?(subject=LIKE(Str(meeting)))',
+    'Event?(subject=Str(party))',
+    'Event?(attendees=ANY(Attendee?(recipient=Recipient?(name=LIKE(PersonName(Smith))))))',
+    'Event?(attendees=ALL(SET(Attendee?(recipient=Recipient?(firstName=Str(John))), '
+    'Attendee?(recipient=Recipient?(firstName=Str(Dan))))))',
+    'Event?(start=DateTime?(time=GT(Time(hour=10))))',
+    'Event?(end=DateTime?(time=LE(Time(hour=12))))',
+    'AND(Event?(subject=LIKE(Str(meeting))), NOT(Event?(location=LocationKeyphrase(room1))))',
+    'OR(Event?(subject=Str(party)), Event?(attendees=ANY(Attendee?(recipient=Recipient?(lastName=Str(Doe))))))',
+]
+
+
+def run_turns(d_context, p_exps):
+    gl = None
+    for p_exp in p_exps:
+        gl, _, d_context, _ = OpenDFDialogue().run_single_turn(p_exp, d_context, False, gl)
+    return d_context
+
+
+@contextmanager
+def overridden(target, name, value):
+    """
+    Sets the attribute `name` of `target` (e.g. a flag of the environment definition) to `value` in the `with` block,
+    and restores it afterwards.
+    """
+    previous = getattr(target, name)
+    setattr(target, name, value)
+    try:
+        yield
+    finally:
+        setattr(target, name, previous)
+
+
+@contextmanager
+def counted_events(target, name):
+    """
+    Counts the SQLAlchemy events `name` of `target` (e.g. the queries of an engine) in the `with` block.
+
+    :return: a list, which gets an item for each event
+    :rtype: List[None]
+    """
+    events = []
+    listener = lambda *args: events.append(None)
+    sqlalchemy.event.listen(target, name, listener)
+    try:
+        yield events
+    finally:
+        sqlalchemy.event.remove(target, name, listener)
+
+
+def describe_context(d_context):
+    return ([(n.id, n.typename(), n.data, n.tags, [(k, v.id) for k, v in n.inputs.items()],
+              [(k, v.id) for k, v in n.outputs], n.result.id, n.evaluated) for n in d_context.idx_to_node.values()],
+            [g.id for g in d_context.goals], [e.message for e in d_context.exceptions], d_context.messages,
+            d_context.get_next_node_id())
+
+
+def make_random_graph(n_nodes, n_goals=40, max_inputs=3, p_result=0.05, seed=0):
+    """
+    Creates a random DAG of (plain) `Node`s. Each node takes its inputs from earlier nodes, some nodes get a result
+    pointer to an earlier node, and the goals are spread over the graph (like goals added turn after turn).
+
+    :return: the list of goals
+    :rtype: List[Node]
+    """
+    rnd = random.Random(seed)
+    nodes = []
+    for i in range(n_nodes):
+        nd = Node()
+        nd.id = i
+        if nodes:
+            for j in range(rnd.randint(0, max_inputs)):
+                inp = nodes[rnd.randrange(max(0, i - 200), i)]  # mostly local connections, like turn graphs
+                inp.connect_in_out(posname(j + 1), nd)
+            if rnd.random() < p_result:
+                nd.set_result(nodes[rnd.randrange(i)])
+        nodes.append(nd)
+    step = max(1, n_nodes // n_goals)
+    return [nodes[i] for i in range(step - 1, n_nodes, step)]
+
+
+def make_chain_graph(n_nodes):
+    """
+    Creates a single chain of `n_nodes` nodes - the worst case for recursion depth.
+
+    :return: the list of goals (just the top of the chain)
+    :rtype: List[Node]
+    """
+    prev = None
+    for i in range(n_nodes):
+        nd = Node()
+        nd.id = i
+        if prev:
+            prev.connect_in_out(posname(1), nd)
+        prev = nd
+    return [prev]
+
+
+def prepare_graph(goals):
+    """
+    Sets the creation turn (needed by `compr_tree`), and some data and tags, on the nodes of a synthetic graph.
+    """
+    for nd in Node.collect_nodes(goals):
+        nd.created_turn = 0
+        if not nd.inputs:
+            nd.data = 'v%d' % (nd.id % 7)
+        if nd.id % 5 == 0:
+            nd.tags['t%d' % (nd.id % 3)] = ''
+    return goals
+
+
+def constraint_suite():
+    """
+    The constraints whose `generate_sql` queries are checked.
+
+    :return: the P-expressions of the constraints, and whether their queries are expected to be searched in indexes
+    :rtype: List[Tuple[str, bool]]
+    """
+    d = get_system_date()
+    day = f"Date(year={d.year}, month={d.month}, day={d.day})"
+    d = d + timedelta(days=1)
+    next_day = f"Date(year={d.year}, month={d.month}, day={d.day})"
+    return [
+        (f"Event?(start=DateTime?(date={day}))", True),
+        (f"Event?(start=GT(DateTime?(date={day})))", True),
+        (f"Event?(slot=TimeSlot(start=GE(DateTime?(date={day})), end=LE(DateTime?(date={next_day}))))", True),
+        ("Event?(attendees=ANY(Attendee?(recipient=Recipient?(id=1001))))", True),
+        (f"Event?(start=DateTime?(date={day}), attendees=ANY(Attendee?(recipient=Recipient?(id=1001))))", True),
+        ("Attendee?(recipient=Recipient?(id=1001))", True),
+        ("Recipient?(id=1001)", True),
+        ("Event?(subject=LIKE(Str(sync)))", False),
+        ("Event?(location=LocationKeyphrase(room))", False),
+        ("Event?(start=DateTime?(time=Time(hour=10, minute=30)))", False),
+        ("Recipient?(name=LIKE(PersonName(John)))", False),
+    ]
+
+
+def database_suite(database):
+    """
+    The hot `Database` methods whose queries are checked.
+
+    :return: the names of the methods, functions calling them, and whether their queries are expected to be searched
+        in indexes
+    :rtype: List[Tuple[str, Callable, bool]]
+    """
+    with database.engine.connect() as connection:
+        location = connection.execute(select(Database.LOCATION_TABLE.columns.name)).first().name
+    start = datetime.combine(get_system_date(), datetime.min.time()) + timedelta(hours=10)
+    end = start + timedelta(hours=1)
+    user = database.get_current_recipient_id()
+    return [
+        ("get_time_overlap_events", lambda: database.get_time_overlap_events(start, end, []), True),
+        ("get_time_overlap_events (attendees)", lambda: database.get_time_overlap_events(start, end, [user, 1001]),
+         True),
+        ("get_location_overlap_events", lambda: database.get_location_overlap_events(location, start, end), True),
+        ("is_recipient_free", lambda: database.is_recipient_free(user, start, end), True),
+        ("is_location_free", lambda: database.is_location_free(location, start, end), True),
+        ("get_events (subject)", lambda: database.get_events(subject="sync"), True),
+    ]
+
+
+def run_queries(database, func):
+    """
+    Runs `func`, and captures the SQL queries it sends to the database.
+
+    :return: the best time (over 3 runs), and the SQL queries with their parameters
+    :rtype: Tuple[float, List[Tuple[str, Any]]]
+    """
+    queries = []
+
+    def listener(conn, cursor, statement, parameters, context, executemany):
+        queries.append((statement, parameters))
+
+    sqlalchemy.event.listen(database.engine, 'before_cursor_execute', listener)
+    try:
+        best = None
+        for _ in range(3):
+            queries.clear()
+            database.clear_cache()
+            start = time.perf_counter()
+            func()
+            t = time.perf_counter() - start
+            best = t if best is None or t < best else best
+        return best, list(queries)
+    finally:
+        sqlalchemy.event.remove(database.engine, 'before_cursor_execute', listener)
+
+
+def fetch_all(database, selection):
+    with database.engine.connect() as connection:
+        return connection.execute(selection).fetchall()
+
+
+def constraint_workloads(database, d_context):
+    """
+    The workloads running the `generate_sql` queries of `constraint_suite`.
+
+    :return: the workloads, as `database_suite`
+    :rtype: List[Tuple[str, Callable, bool]]
+    """
+    workloads = []
+    for p_exp, indexed in constraint_suite():
+        selection = Node.call_construct(p_exp, d_context)[0].generate_sql()
+        workloads.append((p_exp, lambda s=selection: fetch_all(database, s), indexed))
+    return workloads
+
+
+def check_plans(database, workloads, explain=True):
+    """
+    Gets the time of each workload (see `database_suite`), and the full scans of its queries.
+
+    :return: for each workload, its name, time and full scans
+    :rtype: List[Tuple[str, float, List[str]]]
+    """
+    tables = set(Database.metadata.tables)
+    results = []
+    for name, func, _ in workloads:
+        t, queries = run_queries(database, func)
+        scans = []
+        if explain:
+            with database.engine.connect() as connection:
+                for statement, parameters in queries:
+                    for scan in find_full_scans(explain_query_plan(connection, statement, parameters), tables):
+                        if scan not in scans:
+                            scans.append(scan)
+        results.append((name, t, scans))
+    return results
@@ -0,0 +1,311 @@
+"""
+The original implementations of the functions which were optimized, kept as references: the tests check that the
+current implementations give the same results, and the benchmarks in `benchmarks` compare their speed.
+"""
+from contextlib import contextmanager
+from functools import partial
+
+from sqlalchemy import select
+
+from opendf.applications.smcalflow.database import Database, create_recipient_from_row
+from opendf.applications.smcalflow.domain import event_to_values
+from opendf.applications.smcalflow.storage import AttendeeEntry, RecipientEntry, EventEntry
+from opendf.defs import is_pos, posname_idx, show_prm_nm, NODE_COLOR_DB, DB_NODE_TAG
+from opendf.graph.nodes.node import Node
+from opendf.parser.pexp_parser import escape_string
+from opendf.utils.utils import id_sexp, is_assign_name, to_list
+
+
+def legacy_topological_order(node, nodes=None, parents=None, follow_res=True, exclude_neg=False,
+                             follow_res_trans=False, summarize=None, follow_detached=False, follow_view=False,
+                             res_only=False):
+    """
+    The original (recursive) implementation of `Node.topological_order`, kept as a reference.
+    """
+    nodes = nodes if nodes else []
+    parents = parents if parents else []
+    parents.append(node)
+    for n in node.follow_nodes(parents, follow_res, summarize=summarize, follow_detached=follow_detached,
+                               follow_view=follow_view, res_only=res_only):
+        if n not in nodes and (not exclude_neg or n.typename() not in ['NEQ', 'NOT', 'NONE']):
+            nodes = legacy_topological_order(n, nodes, parents, follow_res, exclude_neg, follow_res_trans,
+                                             summarize, follow_detached, follow_view, res_only)
+    if node not in nodes:
+        nodes.append(node)
+    return nodes
+
+
+def legacy_collect_nodes(goals, follow_res=True, exclude_neg=False, follow_res_trans=False,
+                         summarize=None, follow_detached=False, follow_view=False):
+    """
+    The original implementation of `Node.collect_nodes`, kept as a reference.
+    """
+    nodes = []
+    for gl in to_list(goals):
+        nodes = legacy_topological_order(gl, nodes, None, follow_res, exclude_neg, follow_res_trans, summarize,
+                                         follow_detached, follow_view)
+    return nodes
+
+
+def legacy_print_tree(node, parent, ind=None, seen=None, with_id=True, with_pos=True, trim_leaf=True,
+                      trim_sugar=True, mark_val=True, assg=True, with_res=False, sort_inps=False):
+    """
+    The original (recursive) implementation of `Node.print_tree`, kept as a reference.
+    """
+    seen = seen if seen else []
+    if node.id in seen:
+        return id_sexp(node), seen
+    seen.append(node.id)
+    inputs = list(node.inputs.keys())
+    if sort_inps:
+        inputs = sorted(inputs)
+    s = '%d:' % node.id if with_id and node.id is not None else ''
+    ii = ind + 4 if ind else None
+    t1 = ' ' * ind if ind else ''
+    t2 = ' ' * ii if ii else ''
+    if trim_leaf and not with_id and node.is_base_type() and node.dat is not None:
+        inps = []
+    elif trim_sugar and node.typename() == 'getattr':
+        ss, seen = legacy_print_tree(node.inputs['pos2'], node, ii, seen, with_id, with_pos, trim_leaf, trim_sugar,
+                                     mark_val, assg, with_res, sort_inps)
+        return ':%s(%s)' % (node.get_dat('pos1'), ss), seen
+    else:
+        tn = node.typename()
+        if assg and is_assign_name(node.typename()) and (not parent or parent.typename() != 'let'):
+            tn = '$' + tn
+        s += tn + '?' * node.constraint_level
+        inps = []
+        for i in inputs:
+            ss, seen = legacy_print_tree(node.inputs[i], node, ii, seen, with_id, with_pos, trim_leaf, trim_sugar,
+                                         mark_val, assg, with_res, sort_inps)
+            inps.append('%s%s%s' % (t2, show_prm_nm(i, with_pos, node.signature), ss))
+        if with_res and node.result != node:
+            ss, seen = legacy_print_tree(node.result, node, ii, seen, with_id, with_pos, trim_leaf, trim_sugar,
+                                         mark_val, assg, with_res, sort_inps)
+            inps.append('%sresult=%s' % (t2, ss))
+    if inps:
+        b = '(\n' if ind else '('
+        e = '\n%s)' % t1 if ind else ')'
+        d = ',\n' if ind else ','
+        s += b + d.join(inps) + e
+    elif node.data is not None or (trim_leaf and node.dat is not None):
+        if with_id:
+            s += '(%s)' % node.data
+        else:
+            ss = str(node.data)
+            if mark_val and parent:
+                nm = [n for (n, m) in node.outputs if m == parent][0]
+                if node.typename()[:3].lower() == 'str':
+                    ss = escape_string(ss)
+                ss = ss.replace('#', '')
+            s += ss if trim_leaf else '(%s)' % ss
+    else:
+        if s[0] != '$':
+            s += '()'
+    return s, seen
+
+
+def legacy_compr_tree(node, seen=None):
+    """
+    The original (recursive) implementation of `Node.compr_tree`, kept as a reference.
+    """
+    seen = seen if seen else []
+    if node.id in seen:
+        return id_sexp(node), seen
+    seen.append(node.id)
+    feats = node.get_feat_str()
+    s = '<' + feats + '>' if feats else ''
+    tn = node.typename()
+    s += tn + '?' * node.constraint_level
+    inps = []
+    show_pos = False
+    nn = len(node.inputs)
+    inp_nms = list(node.inputs.keys())
+    for i in range(nn):
+        for j in range(i + 1, nn):
+            if is_pos(inp_nms[i]) and is_pos(inp_nms[j]) and posname_idx(inp_nms[i]) > posname_idx(inp_nms[j]):
+                show_pos = True
+    for i in node.inputs:
+        ss, seen = legacy_compr_tree(node.inputs[i], seen)
+        inps.append('%s%s' % (show_prm_nm(i, show_pos, node.signature), ss))
+    t = node.get_tags_str()
+    if t:
+        inps.append(t)
+    if inps:
+        s += '(' + ','.join(inps) + ')'
+    elif node.data is not None:
+        s += '(%s)' % node.data
+    else:
+        s += '()'
+    return s, seen
+
+
+def legacy_merge_equivalent(nodes):
+    """
+    The original deduplication of `get_refer_match` (`merge_equiv`), kept as a reference.
+    """
+    m = []
+    for i in nodes:
+        if not any([i.equivalent_obj(j) for j in m]):
+            m.append(i)
+    return m
+
+
+def legacy_compare_graphs(node, other, sort_inps=True):
+    """
+    The original implementation of `Node.compare_graphs`, kept as a reference.
+    """
+    return node.print_tree(None, ind=None, with_id=False, with_pos=False,
+                           trim_leaf=True, trim_sugar=True, mark_val=False, sort_inps=True)[0] == \
+        other.print_tree(None, ind=None, with_id=False, with_pos=False,
+                         trim_leaf=True, trim_sugar=True, mark_val=False, sort_inps=sort_inps)[0]
+
+
+def legacy_get_event_entries(database, identifiers):
+    """
+    The original implementation of `Database._get_event_entries` (a query for the attendees of each event), kept as a
+    reference.
+    """
+    if not identifiers:
+        return []
+
+    def get_attendees_from_event(event_id):
+        attendees = []
+        with database.engine.connect() as connection:
+            selection = select(Database.EVENT_HAS_ATTENDEE_TABLE, Database.RECIPIENT_TABLE).join(
+                Database.RECIPIENT_TABLE).where(Database.EVENT_HAS_ATTENDEE_TABLE.columns.event_id == event_id)
+            for row in connection.execute(selection):
+                attendees.append(AttendeeEntry(event_id, create_recipient_from_row(row), row.show_as_status,
+                                               row.response_status))
+        return attendees
+
+    with database.engine.connect() as connection:
+        selection = select(Database.EVENT_TABLE, Database.LOCATION_TABLE, Database.RECIPIENT_TABLE).join(
+            Database.LOCATION_TABLE, Database.EVENT_TABLE.columns.location_id == Database.LOCATION_TABLE.columns.id,
+            isouter=True).join(Database.RECIPIENT_TABLE)
+        if identifiers != 'all':
+            selection = selection.where(Database.EVENT_TABLE.columns.id.in_(identifiers))
+        events = []
+        for row in connection.execute(selection):
+            attendees = get_attendees_from_event(row.id)
+            organizer = RecipientEntry(row.id_2, row.full_name, row.first_name, row.last_name,
+                                       row.phone_number, row.email_address, row.manager_id)
+            location = database._location_entry_from_row(row)
+            events.append(EventEntry(row.id, row.subject, row.starts_at, row.ends_at, location, organizer, attendees))
+
+    return events
+
+
+def legacy_get_event_graphs(database, identifiers, d_context, update_cache=True):
+    """
+    The original way of getting the event graphs of a query - `get_event_graph` for each event, which reads the event
+    entry, and the entries of the recipients which are not in the cache.
+    """
+    graphs = []
+    for identifier in identifiers:
+        event_graph = database.entity_cache.get_context_graph(d_context, 'event', identifier)
+        if event_graph is None:
+            event_entry = database.get_event_entry(identifier)
+            recipient_nodes = [database.get_recipient_graph(attendee.recipient.identifier, d_context)
+                               for attendee in event_entry.attendees]
+            event_graph, _ = Node.call_construct_values_eval(*event_to_values(event_entry, recipient_nodes), d_context,
+                                                             constr_tag=NODE_COLOR_DB)
+            event_graph.tags[DB_NODE_TAG] = 0
+            if update_cache:
+                database.entity_cache.set_context_graph(d_context, 'event', identifier, event_graph)
+        graphs.append(event_graph)
+    return graphs
+
+
+@contextmanager
+def legacy_database(database):
+    database._get_event_entries = partial(legacy_get_event_entries, database)
+    database.get_event_graphs = partial(legacy_get_event_graphs, database)
+    try:
+        yield database
+    finally:
+        del database._get_event_entries
+        del database.get_event_graphs
+
+
+def legacy_find_elements_that_match(database, operator, d_context, match_miss=False, maximum_number_of_elements=20):
+    """
+    The original implementation of `MultiWozSqlDB.find_elements_that_match` for the domains with custom matching (a
+    graph for each row of the query, then the first `maximum_number_of_elements` graphs are matched), kept as a
+    reference.
+    """
+    selection = operator.generate_sql()
+    with database.connect() as connection:
+        values = [database._graph_from_row(operator, row, d_context) for row in connection.execute(selection)]
+    filtered_values = []
+    matcher = operator.compile_match(match_miss=match_miss)
+    for i, value in enumerate(values):
+        if maximum_number_of_elements and i >= maximum_number_of_elements:
+            break
+        if matcher(value):
+            filtered_values.append(value)
+    return filtered_values, len(values)
+
+
+def legacy_parent_res(node):
+    """
+    The original implementation of `Node.parent_res`, kept as a reference.
+    """
+    q = [node]
+    depths = {}
+    while q:
+        n = q.pop()
+        d = depths[n] if depths else 0
+        for o in n.res_out:
+            if o not in depths:
+                depths[o] = d + 1
+                q.insert(0, o)
+    return depths
+
+
+def legacy_parent_nodes(node, res=False):
+    """
+    The original implementation of `Node.parent_nodes`, kept as a reference.
+    """
+    q = [node]
+    depths = {node: 0}
+    orig = {}
+    while q:
+        n = q.pop()
+        d = depths[n]
+        if res:
+            rdep = legacy_parent_res(n)
+            for r in rdep:
+                if r not in depths:
+                    depths[r] = d + 0.01 * rdep[r]
+                    q.insert(0, r)
+                    if r not in orig:
+                        orig[r] = ('RES', n)
+        for m, o in n.outputs:
+            if o not in depths:
+                depths[o] = d + 1 + 0.0001 * o.get_key_index(m)
+                if o not in orig:
+                    orig[o] = (m, n)
+                q.insert(0, o)
+    return depths, orig
+
+
+def legacy_score_by_order(node, goals, follow_res, exc=-50):
+    """
+    The original implementation of `Node.score_by_order` (one BFS from each node), kept as a reference.
+    """
+    depths, orig = legacy_parent_nodes(node, res=follow_res)
+    b = 999999
+    cturn = node.context.turn_num
+    for ig, g in enumerate(reversed(goals)):
+        if g in depths:
+            s = ig * 100 + depths[g]
+            s += 10 * (cturn - g.created_turn)
+            path = node.get_path(g, orig)
+            for p in path:
+                s += p.order_score_offset(path)
+            if s < b:
+                b = s
+    if node in node.context.exception_nodes + node.context.copied_exceptions:
+        b += exc
+    return b
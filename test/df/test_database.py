@@ -0,0 +1,112 @@
+"""
+Tests the SMCalFlow database.
+"""
+import time
+import unittest
+from datetime import datetime, timedelta
+
+import sqlalchemy
+from sqlalchemy import update
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.utils.database_utils import connection_scope, EntityCache
+from test.df.helpers import SAMPLE_TURNS, run_turns, describe_context, overridden, counted_events, \
+    constraint_workloads, database_suite, check_plans
+from test.df.legacy import legacy_get_event_entries
+
+
+class TestDatabase(unittest.TestCase):
+
+    def test_event_entries(self):
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            with connection_scope(), counted_events(database.engine, 'before_cursor_execute') as queries:
+                entries = database._get_event_entries('all')
+                self.assertEqual(len(queries), 3)  # the version of the data (once per scope), the events and attendees
+                self.assertEqual([repr(e) for e in entries],
+                                 [repr(e) for e in legacy_get_event_entries(database, 'all')])
+                identifiers = [e.identifier for e in entries][::-1]
+                self.assertEqual([repr(e) for e in database._get_event_entries(identifiers)],
+                                 [repr(e) for e in legacy_get_event_entries(database, identifiers)])
+                database.clear_cache()
+                queries.clear()
+                graphs = database.get_event_graphs(identifiers, environment.get_new_context())
+                self.assertEqual([g.get_dat('id') for g in graphs], identifiers)
+                self.assertEqual(len(queries), 2)
+
+    def test_query_plans(self):
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            workloads = constraint_workloads(database, environment.get_new_context()) + database_suite(database)
+            for (name, _, scans), (_, _, indexed) in zip(check_plans(database, workloads), workloads):
+                if indexed:
+                    self.assertEqual(scans, [], name)
+
+    def test_connection_scope(self):
+        with SMCalFlowEnvironment():
+            database = Database.get_instance()
+            with counted_events(database.engine.pool, 'checkout') as checkouts:
+                start = datetime(2022, 1, 3, 10)
+                expected = [database.is_recipient_free(1001, start, start + timedelta(hours=1)) for _ in range(3)]
+                events = [e.identifier for e in database.get_events()]
+                self.assertEqual(len(checkouts), 6)  # (get_events also reads the version of the data)
+                checkouts.clear()
+                with connection_scope():
+                    with connection_scope():
+                        self.assertEqual([database.is_recipient_free(1001, start, start + timedelta(hours=1))
+                                          for _ in range(3)], expected)
+                    with self.assertRaises(sqlalchemy.exc.OperationalError):
+                        with database.connect() as connection:
+                            connection.exec_driver_sql('SELECT * FROM no_such_table')
+                    self.assertEqual([e.identifier for e in database.get_events()], events)
+                self.assertEqual(len(checkouts), 1)
+
+    def test_entity_cache(self):
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            cache = database.entity_cache
+            identifiers = [e.identifier for e in database._get_event_entries('all')]
+            contexts = {}
+            for enabled in [False, True]:
+                with overridden(cache, 'size', cache.size if enabled else 0):
+                    database.clear_cache()
+                    database.get_event_graphs(identifiers, environment.get_new_context())  # fills the cache
+                    hits = cache.hits
+                    contexts[enabled] = run_turns(environment.get_new_context(), SAMPLE_TURNS)
+                    self.assertEqual(cache.hits > hits, enabled)
+            self.assertEqual(describe_context(contexts[True]), describe_context(contexts[False]))
+
+            d_context = environment.get_new_context()
+            graph = database.get_event_graph(identifiers[0], d_context)
+            self.assertIs(database.get_event_graph(identifiers[0], d_context), graph)
+            entry = database.get_event_entry(identifiers[0])
+            database.update_event(entry.identifier, 'renamed', entry.starts_at, entry.ends_at, entry.location.name,
+                                  [a.recipient.identifier for a in entry.attendees])
+            self.assertEqual(database.get_event_entry(identifiers[0]).subject, 'renamed')
+            self.assertEqual(database.get_event_graph(identifiers[0], d_context).get_dat('subject'), 'renamed')
+
+            # a change made by another process (which also increments the version of the data) is seen at once
+            with database.engine.connect() as connection:
+                connection.execute(update(Database.EVENT_TABLE).where(Database.EVENT_TABLE.columns.id == identifiers[0])
+                                   .values(subject='changed'))
+                database._increment_data_version(connection)
+                connection.commit()
+            self.assertEqual(database.get_event_entry(identifiers[0]).subject, 'changed')
+            self.assertEqual(database.get_event_graph(identifiers[0], d_context).get_dat('subject'), 'changed')
+
+        lru = EntityCache(2)
+        for i in range(3):
+            lru.put('event', i, str(i))
+        self.assertIsNone(lru.get('event', 0))
+        self.assertEqual(lru.get('event', 1), '1')
+        lru.put('event', 3, '3')
+        self.assertEqual((lru.get('event', 2), lru.get('event', 3), lru.evictions), (None, '3', 2))
+        stamp = lru.stamp('event', 1)
+        lru.invalidate('event', 1)
+        lru.put('event', 1, 'stale', stamp=stamp)
+        self.assertIsNone(lru.get('event', 1))
+        timed = EntityCache(2, ttl=0.05)
+        timed.put('event', 1, '1')
+        time.sleep(0.1)
+        self.assertIsNone(timed.get('event', 1))  # changes made by other processes are seen after ttl
@@ -0,0 +1,291 @@
+"""
+Tests the evaluation of the graph.
+"""
+import pickle
+import threading
+import time
+import unittest
+from concurrent.futures import Future
+from datetime import datetime, timedelta
+
+from sqlalchemy import update, insert
+
+import opendf.graph.eval
+from opendf.applications import SMCalFlowEnvironment, MultiWOZEnvironment_2_2
+from opendf.applications.multiwoz_2_2.multiwoz_db import MultiWozSqlDB
+from opendf.applications.smcalflow.database import Database
+from opendf.applications.smcalflow.domain import event_to_str_node, event_to_values
+from opendf.defs import posname, NODE_COLOR_DB, EnvironmentDefinition
+from opendf.exceptions.df_exception import InvalidValueException
+from opendf.graph.dialog_context import DialogContext
+from opendf.graph.eval import evaluate_graph, recursive_eval
+from opendf.graph.eval_profile import EvalProfile
+from opendf.graph.node_factory import NodeFactory, SampleNodes
+from opendf.graph.nodes.node import Node
+from opendf.main import OpenDFDialogue
+from opendf.utils.database_utils import threads_share_connection
+from test.df.helpers import SAMPLE_TURNS, run_turns, overridden, make_chain_graph, counted_events
+
+
+class TestEval(unittest.TestCase):
+
+    def test_deep_graph(self):
+        goals = make_chain_graph(20000)
+        profile = EvalProfile()
+        ok, exs = recursive_eval(goals[-1], [], [], profile)
+        self.assertTrue(ok)
+        self.assertEqual(exs, [])
+        self.assertTrue(all(n.evaluated for n in goals[-1].topological_order()))
+        stats = profile.stats['Node']
+        self.assertEqual((stats.visits, stats.evals, stats.exceptions), (20000, 20000, 0))
+
+    def test_eval_profile(self):
+        d_context = DialogContext()
+        self.assertIsNone(d_context.get_eval_profile(turn=3))
+        profile = d_context.get_eval_profile()
+        self.assertIs(d_context.get_eval_profile(turn=0), profile)
+        start = profile.start()
+        inner = profile.start()
+        profile.stop('Inner', inner)
+        profile.stop('Outer', start, exception=True)
+        self.assertEqual(profile.stats['Outer'].exceptions, 1)
+        self.assertLessEqual(profile.stats['Outer'].own, profile.stats['Outer'].total)
+        self.assertAlmostEqual(profile.total_time(), profile.stats['Outer'].total)
+        self.assertIn('Outer', profile.report())
+
+    def test_reuse_dup_result(self):
+        with SMCalFlowEnvironment() as environment:
+            d_context = environment.get_new_context()
+            find, _ = Node.call_construct_eval('FindEvents(Event?(subject=LIKE(Str(meeting))))', d_context)
+            dup = duplicate_find(find)
+            self.assertFalse(evaluate_graph(dup))
+            self.assertIs(dup.res, find.res)  # same constraint - the search is not repeated
+            start = datetime(2022, 1, 3, 10)
+            Database.get_instance().add_event('meeting', start, start + timedelta(hours=1), 'room1', [])
+            dup = duplicate_find(dup)
+            self.assertFalse(evaluate_graph(dup))
+            self.assertIsNot(dup.res, find.res)  # the DB changed
+            self.assertEqual(len(dup.res.get_op_objects()), len(find.res.get_op_objects()) + 1)
+            # a change made by another process is seen through the version stored in the DB
+            database = Database.get_instance()
+            with database.engine.connect() as connection:
+                connection.execute(update(database.EVENT_TABLE).values(subject='renamed meeting'))
+                database._increment_data_version(connection)
+                connection.commit()
+            database.clear_cache()
+            previous = dup
+            dup = duplicate_find(dup)
+            self.assertFalse(evaluate_graph(dup))
+            self.assertIsNot(dup.res, previous.res)
+
+    def test_compact_nodes(self):
+        with SMCalFlowEnvironment() as environment:
+            d_context = environment.get_new_context()
+            g1, _ = Node.call_construct_eval('FindEvents(Event?(subject=LIKE(Str(meeting))))', d_context)
+            g2, _ = Node.call_construct('FindEvents(Event?(subject=Str(party)))', d_context)
+            self.assertIs(g1.signature, g2.signature)
+            self.assertIs(g1.inputs[posname(1)].signature, g2.inputs[posname(1)].signature)
+            self.assertEqual(g1.counters, {'dup': 1})
+            copy = pickle.loads(pickle.dumps(d_context)).get_node(g1.id)
+            self.assertEqual((copy.typename(), copy.evaluated, copy.res.id), (g1.typename(), True, g1.res.id))
+
+    def test_shared_signatures(self):
+        with SMCalFlowEnvironment():
+            for cls in NodeFactory.get_instance().node_types.values():
+                shared = cls().signature
+                self.assertIs(cls().signature, shared)
+                # the signature doesn't depend on the node - it's built again the same
+                with overridden(cls, '_shared_signature', None):
+                    self.assertTrue(cls().signature.same_as(shared), cls.__name__)
+
+    def test_construct_values(self):
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            for event in database.find_events_that_match(None, environment.get_new_context()):
+                entry = database.get_event_entry(event.res.get_dat('id'))
+                graphs = []
+                for construct, args in [(Node.call_construct_eval, [event_to_str_node(entry)]),
+                                        (Node.call_construct_values_eval, event_to_values(entry))]:
+                    g, _ = construct(*args, environment.get_new_context(), constr_tag=NODE_COLOR_DB)
+                    graphs.append([(n.id, n.typename(), n.data, n.tags, list(n.inputs), n.evaluated)
+                                   for n in g.topological_order()])
+                self.assertEqual(graphs[0], graphs[1])
+
+    def test_lazy_sample_nodes(self):
+        node_fact = NodeFactory.get_instance()
+        types = {}
+        for lazy in [False, True]:
+            with overridden(EnvironmentDefinition.get_instance(), 'lazy_sample_nodes', lazy):
+                SMCalFlowEnvironment().load_node_factory()
+                if lazy:
+                    self.assertIsInstance(node_fact.sample_nodes, SampleNodes)
+                    self.assertIn('Event', node_fact.sample_nodes)
+                    self.assertFalse(node_fact.sample_nodes.nodes)
+                    self.assertIs(node_fact.sample_nodes['Event'], node_fact.sample_nodes['Event'])
+                types[lazy] = list(node_fact.sample_nodes), node_fact.leaf_types, node_fact.leaf_in_type
+        self.assertEqual(types[False], types[True])
+
+    def test_intern_leaf_nodes(self):
+        results = {}
+        for intern in [False, True]:
+            with overridden(EnvironmentDefinition.get_instance(), 'intern_leaf_nodes', intern), \
+                    SMCalFlowEnvironment() as environment:
+                d_context = run_turns(environment.get_new_context(),
+                                      SAMPLE_TURNS + ['refer(role=day)', 'FindEvents(Event?())'])
+                shared = [n for n, _ in d_context.interned_nodes.values() if len(n.outputs) > 1]
+                self.assertEqual(bool(shared), intern)
+                for n in shared:
+                    self.assertEqual(len({(nm, o.typename()) for nm, o in n.outputs}), 1)
+                results[intern] = len(d_context.idx_to_node), [g.show() for g in d_context.goals]
+        self.assertLess(results[True][0], results[False][0])
+        self.assertEqual(results[True][1], results[False][1])
+
+    def test_turn_batch(self):
+        hypotheses = SAMPLE_TURNS + ['FindEvents(Event?(', 'refer(Event?())']
+        with SMCalFlowEnvironment() as environment:
+            d_context = run_turns(environment.get_new_context(), ['FindEvents(Event?())'])
+            expected = []
+            for p_exp in hypotheses:
+                copy = d_context.make_copy_with_pack()
+                try:
+                    _, ex, _, answers = OpenDFDialogue().run_single_turn(p_exp, copy, False, copy.goals[-1])
+                except Exception as e:
+                    ex, answers = e, []
+                expected.append((type(ex) if ex else None, answers))
+            run_single_turn = OpenDFDialogue.run_single_turn
+            turn_threads = set()
+
+            def run_turn(*args, **kwargs):
+                turn_threads.add(threading.get_ident())
+                return run_single_turn(*args, **kwargs)
+
+            for workers in [1, 3]:
+                copies = OpenDFDialogue.copy_contexts(d_context, len(hypotheses))
+                with overridden(OpenDFDialogue, 'run_single_turn', run_turn):
+                    results = OpenDFDialogue().run_turn_batch(list(zip(copies, hypotheses)), workers=workers)
+                self.assertEqual([(type(ex) if ex else None, answers) for _, ex, _, answers in results], expected)
+                self.assertTrue(all(c is copy for (_, _, c, _), copy in zip(results, copies)))
+            # the in-memory DB has a single connection, which the threads can't share
+            self.assertTrue(threads_share_connection())
+            self.assertEqual(turn_threads, {threading.get_ident()})
+
+    def test_parallel_eval(self):
+        results = []
+        for parallel in [False, True]:
+            d_context, root = make_lookup_graph()
+            fetch_threads.clear()
+            with overridden(opendf.graph.eval, 'threads_share_connection', lambda: False):
+                ok, exs = recursive_eval(root, [], [], parallel=parallel)
+            evaluated = sorted((n.id, n.typename(), n.data) for n in d_context.idx_to_node.values() if n.evaluated)
+            results.append((ok, [(e.node.id, e.message) for e in exs], [e.node.id for e in d_context.exceptions],
+                            evaluated))
+            # each lookup was fetched once - in other threads if parallel (and the exec used the fetched data)
+            self.assertEqual(len(fetch_threads), 4)
+            self.assertEqual(len(set(fetch_threads) - {threading.get_ident()}) > 1, parallel)
+        self.assertEqual(results[0], results[1])
+        # the exceptions of the names (in the threads) and of the lookups (in exec) are merged in the input order
+        self.assertEqual([m for _, m in results[1][1]], ['bad name', 'no such name', 'bad name'])
+        # with a DB connection shared by the threads, the evaluation is sequential
+        fetch_threads.clear()
+        d_context, root = make_lookup_graph()
+        with overridden(opendf.graph.eval, 'threads_share_connection', lambda: True):
+            recursive_eval(root, [], [], parallel=True)
+        self.assertEqual(set(fetch_threads), {threading.get_ident()})
+
+    def test_parallel_fetch_multiwoz(self):
+        environment = MultiWOZEnvironment_2_2()
+        environment.load_node_factory()
+        database = MultiWozSqlDB.get_instance()
+        database.clear_database()
+        try:
+            with database.engine.connect() as connection:
+                connection.execute(insert(MultiWozSqlDB.HOTEL_TABLE), [
+                    {'id': 0, 'name': 'acorn house', 'area': 'north'},
+                    {'id': 1, 'name': 'alpha lodge', 'area': 'north'},
+                    {'id': 2, 'name': 'city hotel', 'area': 'centre'}])
+                connection.execute(insert(MultiWozSqlDB.RESTAURANT_TABLE), [
+                    {'id': 0, 'name': 'golden wok', 'food': 'chinese'},
+                    {'id': 1, 'name': 'pizza hut', 'food': 'italian'}])
+                connection.commit()
+            database.clear_cache()
+            p_exp = 'AND(FindHotel(Hotel?(area=Area(north))), FindRestaurant(Restaurant?(food=LIKE(Food(chinese)))), ' \
+                    'FindHotel(Hotel?(name=LIKE(Name(lodge)), area=Area(centre))))'
+            results = []
+            for parallel in [False, True]:
+                d_context = environment.get_new_context()
+                graph, _ = Node.call_construct(p_exp, d_context)
+                # the in-memory DB can't be used by several threads - the "threads" are run at once
+                with overridden(opendf.graph.eval, 'threads_share_connection', lambda: False), \
+                        overridden(opendf.graph.eval, '_get_executor', lambda: ImmediateExecutor()), \
+                        counted_events(database.engine, 'before_cursor_execute') as queries:
+                    ok, exs = recursive_eval(graph, [], [], parallel=parallel)
+                self.assertEqual(len(queries), 3)  # the exec of the Find nodes used the fetched rows
+                results.append((ok, [(e.node.id, e.message) for e in exs], len(d_context.idx_to_node),
+                                [(n.id, n.res.id, n.res.show()) for n in graph.inputs.values()]))
+            self.assertEqual(results[0], results[1])
+        finally:
+            database.clear_database()
+
+
+def duplicate_find(find):
+    dup = Node.duplicate_tree(find, set_dup=True)[-1]
+    if 'tmp' in dup.inputs:  # like revise - debug inputs are not duplicated
+        dup.disconnect_input('tmp')
+    return dup
+
+
+class ImmediateExecutor:
+    """
+    Runs the tasks at once, in the calling thread.
+    """
+
+    def submit(self, fn, *args):
+        future = Future()
+        future.set_result(fn(*args))
+        return future
+
+
+fetch_threads = []
+
+
+class CheckedName(Node):
+    pure_eval = True
+
+    def valid_input(self):
+        if self.data == 'bad':
+            raise InvalidValueException('bad name', self)
+
+
+class SlowLookup(Node):
+    parallel_fetch = True
+
+    def fetch(self):
+        fetch_threads.append(threading.get_ident())
+        time.sleep(0.02)
+        name = self.inputs['name'].data
+        return ['entry of %s' % name] if name != 'missing' else []
+
+    def exec(self, all_nodes=None, goals=None):
+        rows = self.fetched()
+        if rows is None:
+            rows = self.fetch()
+        if not rows:
+            raise InvalidValueException('no such name', self)
+        result = CheckedName()
+        self.context.register_node(result)
+        result.data = rows[0]
+        self.set_result(result)
+
+
+def make_lookup_graph():
+    d_context = DialogContext()
+    root = Node()
+    d_context.register_node(root)
+    for i, name in enumerate(['a', 'bad', 'c', 'missing', 'e', 'bad']):
+        lookup, name_node = SlowLookup(), CheckedName()
+        d_context.register_node(lookup)
+        d_context.register_node(name_node)
+        name_node.data = name
+        name_node.connect_in_out('name', lookup)
+        lookup.connect_in_out(posname(i + 1), root)
+    return d_context, root
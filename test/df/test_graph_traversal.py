@@ -0,0 +1,171 @@
+"""
+Tests the graph traversal functions of the nodes.
+"""
+import io
+import random
+import unittest
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.graph.constr_graph import check_constr_graph
+from opendf.graph.dialog_context import DialogContext
+from opendf.graph.eval import check_dangling_nodes
+from opendf.graph.nodes.framework_functions import merge_equivalent
+from opendf.graph.nodes.node import Node
+from test.df.helpers import SAMPLE_TURNS, run_turns, overridden, make_random_graph, make_chain_graph, prepare_graph
+from test.df.legacy import legacy_collect_nodes, legacy_topological_order, legacy_print_tree, legacy_compr_tree, \
+    legacy_compare_graphs, legacy_merge_equivalent, legacy_score_by_order
+
+
+class TestGraphTraversal(unittest.TestCase):
+
+    def test_collect_nodes_same_order(self):
+        for seed in range(5):
+            goals = make_random_graph(2000, n_goals=20, seed=seed)
+            for follow_res in [True, False]:
+                expected = legacy_collect_nodes(goals, follow_res=follow_res)
+                value = Node.collect_nodes(goals, follow_res=follow_res)
+                self.assertEqual([n.id for n in value], [n.id for n in expected],
+                                 f"Different order for seed {seed}, follow_res={follow_res}")
+
+    def test_topological_order_same_order(self):
+        goals = make_random_graph(1000, n_goals=10, seed=7)
+        for g in goals:
+            expected = legacy_topological_order(g)
+            value = g.topological_order()
+            self.assertEqual([n.id for n in value], [n.id for n in expected])
+
+    def test_deep_graph(self):
+        goals = make_chain_graph(20000)
+        nodes = Node.collect_nodes(goals)
+        self.assertEqual([n.id for n in nodes], list(range(20000)))
+
+    def test_print_tree_same_output(self):
+        goals = prepare_graph(make_random_graph(1000, n_goals=10, seed=5))
+        for kwargs in [{}, {'with_id': False, 'with_res': True}, {'ind': 2, 'sort_inps': True, 'trim_leaf': False}]:
+            seen, legacy_seen = None, None
+            for g in goals:
+                s, seen = g.print_tree(None, seen=seen, **kwargs)
+                expected, legacy_seen = legacy_print_tree(g, None, seen=legacy_seen, **kwargs)
+                self.assertEqual(s, expected)
+        seen, legacy_seen = None, None
+        for g in goals:
+            s, seen = g.compr_tree(seen)
+            expected, legacy_seen = legacy_compr_tree(g, legacy_seen)
+            self.assertEqual(s, expected)
+        self.assertEqual(seen, set(legacy_seen))
+
+    def test_print_tree_deep_graph(self):
+        goals = prepare_graph(make_chain_graph(20000))
+        s, seen = goals[0].compr_tree()
+        self.assertEqual(len(seen), 20000)
+        f = io.StringIO()
+        self.assertEqual(goals[0].write_compr_tree(f), seen)
+        self.assertEqual(f.getvalue(), s)
+        f = io.StringIO()
+        goals[0].write_tree(f, ind=2)
+        self.assertEqual(f.getvalue(), goals[0].print_tree(None, ind=2)[0])
+
+    def test_struct_id(self):
+        d_context = DialogContext()
+        graphs = [prepare_graph(make_random_graph(300, n_goals=5, seed=seed)) for seed in [1, 1, 2, 1]]
+        for nd in Node.collect_nodes(graphs[0] + graphs[1] + graphs[2]):
+            nd.context = d_context
+        for g1, g2, g3, g4 in zip(*graphs):  # (the nodes of g4 have no context)
+            self.assertEqual(g1.struct_id(), g2.struct_id())
+            for other in [g1, g2, g3, g4]:
+                self.assertEqual(g1.compare_graphs(other), legacy_compare_graphs(g1, other))
+                self.assertEqual(g1.compare_graphs(other, sort_inps=False),
+                                 legacy_compare_graphs(g1, other, sort_inps=False))
+        g1, g2 = graphs[0][-1], graphs[1][-1]
+        self.assertTrue(g1.compare_graphs(g2))
+        leaf = next(n for n in g1.topological_order() if not n.inputs)
+        data = leaf.data
+        leaf.set_data('changed')
+        self.assertNotEqual(g1.struct_id(), g2.struct_id())
+        self.assertFalse(g1.compare_graphs(g2))
+        leaf.set_data(data)
+        self.assertTrue(g1.compare_graphs(g2))
+
+        # graphs which show each node once are not written out when their structure ids are equal
+        chains = [prepare_graph(make_chain_graph(50))[0] for _ in range(3)]
+        for nd in Node.collect_nodes(chains):
+            nd.context = d_context
+        leaf = next(n for n in chains[2].topological_order() if not n.inputs)
+        leaf.set_data('changed')
+        with overridden(Node, 'emit_tree', None):
+            self.assertTrue(chains[0].compare_graphs(chains[1]))
+            self.assertFalse(chains[0].compare_graphs(chains[2]))
+        self.assertEqual(chains[0].compare_graphs(chains[2]), legacy_compare_graphs(chains[0], chains[2]))
+
+        nodes = Node.collect_nodes(graphs[0]) * 2
+        self.assertEqual(merge_equivalent(nodes), legacy_merge_equivalent(nodes))
+
+    def test_reachable_nodes_incremental(self):
+        goals = make_random_graph(2000, n_goals=20, seed=3)
+        nodes = Node.collect_nodes(goals, follow_detached=True)
+        context = DialogContext()
+        for n in nodes:
+            n.context = context
+        rnd = random.Random(3)
+        for step in range(30):
+            if step % 3 == 0:
+                context.goals = goals[:rnd.randint(1, len(goals))]
+            elif step % 3 == 1:
+                a, b = rnd.sample(nodes, 2)
+                if a not in b.topological_order():  # avoid cycles
+                    b.set_result(a)
+            else:
+                a, b = rnd.sample(nodes, 2)
+                if b not in a.topological_order():
+                    b.connect_in_out('extra%d' % step, a)
+            expected = Node.collect_nodes(context.goals)
+            value = context.reachable_nodes()
+            self.assertEqual([n.id for n in value], [n.id for n in expected], f"Different nodes at step {step}")
+            self.assertTrue(all(n in value for n in expected))
+
+    def check_score_by_order(self, d_context, nodes):
+        for follow_res in [True, False]:
+            for goals in [d_context.goals, d_context.goals[:1], d_context.goals[1::2]]:
+                expected = [legacy_score_by_order(n, goals, follow_res) for n in nodes]
+                value = [n.score_by_order(goals, follow_res) for n in nodes]
+                self.assertEqual(value, expected, f"Different scores, follow_res={follow_res}")
+                self.assertEqual(Node.rank_by_order(nodes, goals, follow_res),
+                                 sorted(nodes, key=lambda n: legacy_score_by_order(n, goals, follow_res)))
+
+    def test_score_by_order_same_scores(self):
+        for seed in range(3):
+            goals = prepare_graph(make_random_graph(1000, n_goals=20, seed=seed))
+            d_context = DialogContext()
+            nodes = Node.collect_nodes(goals, follow_detached=True)
+            for nd in sorted(nodes, key=lambda n: n.id):
+                nd.id = None
+                d_context.register_node(nd)
+            d_context.goals = goals
+            d_context.turn_num = 1
+            for i, g in enumerate(goals):
+                g.created_turn = i % 3
+            d_context.exception_nodes = nodes[::50]
+            self.check_score_by_order(d_context, nodes)
+
+        with SMCalFlowEnvironment() as environment:
+            d_context = run_turns(environment.get_new_context(), SAMPLE_TURNS + ['refer(role=day)'])
+            self.check_score_by_order(d_context, list(d_context.idx_to_node.values()))
+
+    def test_check_constr_graph_deep(self):
+        goals = make_chain_graph(20000)
+        check_constr_graph(goals[-1])
+
+    def test_check_dangling_nodes_incremental(self):
+        context = DialogContext()
+        a, b = Node(), Node()
+        context.register_node(a)
+        context.register_node(b)
+        a.connect_in_out('x', b)
+        context.add_goal(b)
+        self.assertEqual(context.unchecked_nodes(), [a, b])
+        b.inputs['y'] = a  # no output link, no view mode
+        b.mark_changed()
+        with self.assertLogs('opendf.graph.eval', level='DEBUG') as logs:
+            check_dangling_nodes(context)
+        self.assertEqual(len(logs.output), 2)
+        self.assertEqual(context.unchecked_nodes(), [])
@@ -0,0 +1,28 @@
+"""
+Tests the compiled matchers of the constraints.
+"""
+import unittest
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import VIEW
+from opendf.graph.nodes.node import Node
+from test.df.helpers import EVENT_CONSTRAINTS
+
+
+class TestMatch(unittest.TestCase):
+
+    def test_compiled_match(self):
+        with SMCalFlowEnvironment() as environment:
+            d_context = environment.get_new_context()
+            events = Database.get_instance().find_events_that_match(None, d_context)
+            candidates = Node.collect_nodes(events)
+            for sexp in EVENT_CONSTRAINTS:
+                constr, _ = Node.call_construct_eval(sexp, d_context)
+                for check_level in [True, False]:
+                    for match_miss in [True, False]:
+                        matcher = constr.compile_match(oview=VIEW.INT, check_level=check_level, match_miss=match_miss)
+                        expected = [n for n in candidates if
+                                    constr.match(n, oview=VIEW.INT, check_level=check_level, match_miss=match_miss)]
+                        value = [n for n in candidates if matcher(n)]
+                        self.assertEqual(value, expected, f"Different matches for {sexp}")
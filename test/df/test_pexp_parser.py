@@ -3,8 +3,14 @@ Test cases for the P-expression parser.
 """
 import json
 import unittest
+from concurrent.futures import ThreadPoolExecutor
 
-from opendf.parser.pexp_parser import parse_p_expressions, ASTNode
+# noinspection PyPackageRequirements
+import ply.yacc as yacc
+
+from opendf.parser import pexp_parsetab
+from opendf.parser.pexp_parser import parse_p_expressions, ASTNode, ASTCache, PExpTemplate, node_reference, \
+    get_parser, parser
 
 
 class TestPExpParser(unittest.TestCase):
@@ -187,3 +193,46 @@ class TestPExpParser(unittest.TestCase):
         expression = "{other_date}<-?'>Date(year=Int(2022), month=12, 25, ^holiday=\"* Christmas *\", ^is_holiday)"
         trees = parse_p_expressions(expression)
         self.assertEqual(expression.strip(), str(trees[0]))
+
+    def test_ast_cache(self):
+        cache = ASTCache(max_size=2)
+        expression = "Event?(subject=LIKE(Str(meeting)), ^tag=1)"
+        first = cache.parse(expression)
+        second = cache.parse(expression)
+        self.assertEqual(parse_p_expressions(expression, use_cache=False), second)
+        second[0].inputs.clear()  # the construction changes the trees - the cached ones are not affected
+        self.assertEqual(first, cache.parse(expression))
+        cache.parse("Int(1)")
+        cache.parse("Int(2)")
+        self.assertNotIn(expression, cache.trees)
+        self.assertEqual((cache.hits, cache.misses), (2, 3))
+
+    def test_template(self):
+        template = PExpTemplate("{{att}}Attendee(recipient={recipient}, response={response}, ^tag={response})")
+        trees = template.bind(recipient=node_reference(12), response="Accepted")
+        self.assertEqual(parse_p_expressions("{att}Attendee(recipient=$#12, response=Accepted, ^tag=Accepted)"), trees)
+        trees = template.bind(recipient=node_reference("me"), response="Not, (really)")
+        self.assertEqual(trees[0].inputs[1][1].name, "Not, (really)")
+        self.assertIs(trees[0].inputs[0][1].parent, trees[0])
+
+    def test_threads(self):
+        expressions = [f"Event?(subject=LIKE(Str(meeting {i})), starts=Date(day={i % 28 + 1}), {{x{i}}}Int({i}))"
+                       for i in range(200)]
+        expected = [str(parse_p_expressions(e, use_cache=False)) for e in expressions]
+
+        def parse(expression):
+            return str(parse_p_expressions(expression, use_cache=False)), get_parser()
+
+        with ThreadPoolExecutor(max_workers=8) as executor:
+            results = list(executor.map(parse, expressions * 5))
+        self.assertEqual(expected * 5, [r for r, _ in results])
+        parsers = {id(p) for _, p in results}
+        self.assertNotIn(id(parser), parsers)
+        self.assertIs(get_parser(), parser)
+
+    def test_parser_tables(self):
+        # the tables shipped with the package must match the grammar - otherwise, run `write_parser_tables`
+        reflect = yacc.ParserReflect({name: getattr(parser, name) for name in dir(parser)})
+        reflect.get_all()
+        self.assertEqual(reflect.signature(), pexp_parsetab._lr_signature)
+        self.assertEqual(parser.tables.lr_action, pexp_parsetab._lr_action)
@@ -0,0 +1,112 @@
+"""
+Tests the snapshots and the checkpoints of the dialog context.
+"""
+import unittest
+
+from opendf.applications import SMCalFlowEnvironment
+from opendf.applications.smcalflow.database import Database
+from opendf.defs import EnvironmentDefinition, posname
+from opendf.exceptions.python_exception import SemanticException
+from opendf.graph import snapshot
+from opendf.graph.nodes.node import Node
+from opendf.graph.snapshot import snapshot_context, restore_context, ContextCheckpointer, restore_checkpoints
+from opendf.utils.database_utils import EntityCache
+from test.df.helpers import SAMPLE_TURNS, run_turns, describe_context, overridden
+
+
+class TestSnapshot(unittest.TestCase):
+
+    def test_snapshot(self):
+        with SMCalFlowEnvironment() as environment:
+            d_context = run_turns(environment.get_new_context(), SAMPLE_TURNS)
+            for compress in [False, True]:
+                snapshot = snapshot_context(d_context, compress=compress)
+                restored = restore_context(snapshot, environment.get_new_context())
+                self.assertEqual(describe_context(restored), describe_context(d_context))
+            with self.assertRaises(SemanticException):
+                restore_context(b'ODFS\x00\x00' + snapshot[6:], environment.get_new_context())
+
+    def test_checkpoints(self):
+        warnings = []
+        with SMCalFlowEnvironment() as environment, \
+                overridden(EnvironmentDefinition.get_instance(), 'check_checkpoints', True), \
+                overridden(snapshot.logger, 'warning', lambda *args: warnings.append(args)):
+            d_context = environment.get_new_context()
+            checkpointer = ContextCheckpointer(d_context)
+            checkpoints = []
+            for p_exp in SAMPLE_TURNS:
+                d_context = run_turns(d_context, [p_exp])
+                checkpoints.append(checkpointer.checkpoint())
+                restored = restore_checkpoints(checkpoints, environment.get_new_context())
+                self.assertEqual(describe_context(restored), describe_context(d_context))
+            self.assertLess(len(checkpoints[-1]), len(snapshot_context(d_context)))
+            with self.assertRaises(SemanticException):
+                restore_context(checkpoints[-1], environment.get_new_context())
+
+            # resume from the checkpoints, as a new process would - the DB graphs are read again
+            restored = restore_checkpoints(checkpoints, environment.get_new_context())
+            self.assertEqual(restored.db_graphs, {})
+            checkpointer = ContextCheckpointer(restored, stored=True)
+            restored = run_turns(restored, ['FindEvents(Event?())'])
+            d_context = run_turns(d_context, ['FindEvents(Event?())'])
+            checkpoints.append(checkpointer.checkpoint())
+            self.assertEqual(describe_context(restore_checkpoints(checkpoints, environment.get_new_context())),
+                             describe_context(restored))
+            self.assertEqual([e.get_dat('id') for e in restored.goals[-1].res.get_op_objects()],
+                             [e.get_dat('id') for e in d_context.goals[-1].res.get_op_objects()])
+        self.assertEqual(warnings, [])  # all the changes were notified
+
+    def test_checkpoint_changes(self):
+        warnings = []
+        with SMCalFlowEnvironment() as environment, \
+                overridden(EnvironmentDefinition.get_instance(), 'check_checkpoints', True), \
+                overridden(snapshot.logger, 'warning', lambda *args: warnings.append(args)):
+            d_context = run_turns(environment.get_new_context(), SAMPLE_TURNS[:1])
+            checkpointer = ContextCheckpointer(d_context)
+            checkpoints = [checkpointer.checkpoint()]
+            leaf = d_context.goals[-1].input_view('constraint').input_view('subject').input_view(posname(1))
+            for notify in [True, False]:
+                leaf.data = 'party' if notify else 'lunch'
+                if notify:
+                    leaf.mark_changed()
+                checkpoints.append(checkpointer.checkpoint())
+                self.assertEqual(len(warnings), 0 if notify else 1)
+                # a change which was not notified is added to the delta by the check
+                self.assertEqual(describe_context(restore_checkpoints(checkpoints, environment.get_new_context())),
+                                 describe_context(d_context))
+
+    def test_restore_into_used_context(self):
+        with SMCalFlowEnvironment() as environment:
+            d_context = run_turns(environment.get_new_context(), SAMPLE_TURNS[:1])
+            snapshot = snapshot_context(d_context)
+            expected = describe_context(d_context)
+            d_context = run_turns(d_context, SAMPLE_TURNS[1:])
+            d_context.reachable_nodes()
+            restored = restore_context(snapshot, d_context)
+            self.assertEqual(describe_context(restored), expected)
+            self.assertEqual(list(restored.reachable_nodes()), Node.collect_nodes(restored.goals))
+            registered = set(restored.idx_to_node.values())
+            for typenames in [['Event'], ['FindEvents', 'refer', 'CreateEvent'], ['Str']]:
+                self.assertEqual(restored.nodes_of_types(typenames),
+                                 {n for n in registered if n.typename() in typenames})
+
+    def test_snapshot_db_graphs(self):
+        with SMCalFlowEnvironment() as environment:
+            database = Database.get_instance()
+            entry = database.get_events()[0]
+            cache = database.entity_cache
+            try:
+                database.entity_cache = EntityCache()
+                d_context = environment.get_new_context()
+                self.assertEqual(database.get_event_graph(entry.identifier, d_context).get_dat('subject'),
+                                 entry.subject)
+                snapshot = snapshot_context(d_context)
+                database.update_event(entry.identifier, 'renamed', entry.starts_at, entry.ends_at,
+                                      entry.location.name, [a.recipient.identifier for a in entry.attendees])
+
+                # the context is restored by another process, with a cache of its own
+                database.entity_cache = EntityCache()
+                restored = restore_context(snapshot, environment.get_new_context())
+                self.assertEqual(database.get_event_graph(entry.identifier, restored).get_dat('subject'), 'renamed')
+            finally:
+                database.entity_cache = cache